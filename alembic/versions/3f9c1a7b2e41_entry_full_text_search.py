@@ -0,0 +1,71 @@
+"""entry full text search
+
+Revision ID: 3f9c1a7b2e41
+Revises: d7ad90d3a0ff
+Create Date: 2026-10-19 09:12:31.502113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c1a7b2e41'
+down_revision: Union[str, None] = 'd7ad90d3a0ff'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.execute(
+            "ALTER TABLE entry ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(text, ''))) STORED"
+        )
+        op.create_index(
+            'ix_entry_search_vector',
+            'entry',
+            ['search_vector'],
+            unique=False,
+            postgresql_using='gin',
+        )
+    elif dialect == "sqlite":
+        # External content table: the index stores no copy of the text.
+        op.execute(
+            "CREATE VIRTUAL TABLE entry_fts USING fts5("
+            "text, content='entry', content_rowid='id')"
+        )
+        op.execute(
+            "CREATE TRIGGER entry_fts_ai AFTER INSERT ON entry BEGIN "
+            "INSERT INTO entry_fts(rowid, text) VALUES (new.id, new.text); "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER entry_fts_ad AFTER DELETE ON entry BEGIN "
+            "INSERT INTO entry_fts(entry_fts, rowid, text) "
+            "VALUES ('delete', old.id, old.text); "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER entry_fts_au AFTER UPDATE OF text ON entry BEGIN "
+            "INSERT INTO entry_fts(entry_fts, rowid, text) "
+            "VALUES ('delete', old.id, old.text); "
+            "INSERT INTO entry_fts(rowid, text) VALUES (new.id, new.text); "
+            "END"
+        )
+        op.execute("INSERT INTO entry_fts(entry_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.drop_index('ix_entry_search_vector', table_name='entry')
+        op.drop_column('entry', 'search_vector')
+    elif dialect == "sqlite":
+        op.execute("DROP TRIGGER IF EXISTS entry_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS entry_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS entry_fts_ai")
+        op.execute("DROP TABLE IF EXISTS entry_fts")
@@ -0,0 +1,38 @@
+"""retention
+
+Revision ID: 5c7e9a2d4b16
+Revises: 8b2d4e6f1a93
+Create Date: 2026-10-19 13:26:05.847192
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c7e9a2d4b16'
+down_revision: Union[str, None] = '8b2d4e6f1a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'entry',
+        sa.Column('hidden_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index(op.f('ix_entry_hidden_at'), 'entry', ['hidden_at'], unique=False)
+    op.add_column(
+        'topic',
+        sa.Column('archived_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    # Entries hidden before this revision get the full retention period.
+    op.execute("UPDATE entry SET hidden_at = CURRENT_TIMESTAMP WHERE hidden")
+
+
+def downgrade() -> None:
+    op.drop_column('topic', 'archived_at')
+    op.drop_index(op.f('ix_entry_hidden_at'), table_name='entry')
+    op.drop_column('entry', 'hidden_at')
@@ -0,0 +1,30 @@
+"""author avatar
+
+Revision ID: 8b2d4e6f1a93
+Revises: 3f9c1a7b2e41
+Create Date: 2026-10-19 11:03:47.218305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2d4e6f1a93'
+down_revision: Union[str, None] = '3f9c1a7b2e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'author',
+        sa.Column('avatar', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('author', 'avatar')
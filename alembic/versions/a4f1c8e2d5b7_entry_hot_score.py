@@ -0,0 +1,83 @@
+"""entry hot score
+
+Revision ID: a4f1c8e2d5b7
+Revises: 5c7e9a2d4b16
+Create Date: 2026-10-19 14:02:18.390471
+
+"""
+import datetime
+import math
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4f1c8e2d5b7'
+down_revision: Union[str, None] = '5c7e9a2d4b16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same as `rx_shout.ranking`, at the time of this revision.
+HOT_DECAY_SECONDS = float(os.environ.get("HOT_DECAY_SECONDS", "45000"))
+EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def hot_score(likes: int, ts: datetime.datetime) -> float:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=datetime.timezone.utc)
+    return (
+        math.log10(max(likes, 1))
+        + (ts - EPOCH).total_seconds() / HOT_DECAY_SECONDS
+    )
+
+
+def upgrade() -> None:
+    op.add_column(
+        'entry',
+        sa.Column('likes', sa.Integer(), server_default='0', nullable=False),
+    )
+    op.add_column(
+        'entry',
+        sa.Column('hot_score', sa.Float(), server_default='0', nullable=False),
+    )
+    op.execute(
+        "UPDATE entry SET likes = (SELECT COUNT(*) FROM entryflags "
+        "WHERE entryflags.entry_id = entry.id AND entryflags.type = 'like')"
+    )
+    entry = sa.table(
+        'entry',
+        sa.column('id', sa.Integer()),
+        sa.column('ts', sa.DateTime(timezone=True)),
+        sa.column('likes', sa.Integer()),
+        sa.column('hot_score', sa.Float()),
+    )
+    conn = op.get_bind()
+    last_id = 0
+    while rows := conn.execute(
+        sa.select(entry.c.id, entry.c.ts, entry.c.likes)
+        .where(entry.c.id > last_id)
+        .order_by(entry.c.id)
+        .limit(1000)
+    ).all():
+        conn.execute(
+            entry.update()
+            .where(entry.c.id == sa.bindparam('entry_id'))
+            .values(hot_score=sa.bindparam('score')),
+            [
+                {'entry_id': id_, 'score': hot_score(likes, ts)}
+                for id_, ts, likes in rows
+            ],
+        )
+        last_id = rows[-1][0]
+    op.create_index(
+        'ix_entry_topic_id_hot_score', 'entry', ['topic_id', 'hot_score'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_entry_topic_id_hot_score', table_name='entry')
+    op.drop_column('entry', 'hot_score')
+    op.drop_column('entry', 'likes')
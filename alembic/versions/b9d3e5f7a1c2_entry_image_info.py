@@ -0,0 +1,37 @@
+"""entry image info
+
+Revision ID: b9d3e5f7a1c2
+Revises: f7a2c4e6b8d1
+Create Date: 2026-10-19 17:21:09.448213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9d3e5f7a1c2'
+down_revision: Union[str, None] = 'f7a2c4e6b8d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Filled in for existing images by `python -m rx_shout.imageinfo`.
+    op.add_column('entry', sa.Column('image_width', sa.Integer(), nullable=True))
+    op.add_column('entry', sa.Column('image_height', sa.Integer(), nullable=True))
+    op.add_column(
+        'entry',
+        sa.Column(
+            'image_placeholder', sqlmodel.sql.sqltypes.AutoString(), nullable=True
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('entry', 'image_placeholder')
+    op.drop_column('entry', 'image_height')
+    op.drop_column('entry', 'image_width')
@@ -0,0 +1,30 @@
+"""entry video
+
+Revision ID: c3e5a7b9d1f4
+Revises: b9d3e5f7a1c2
+Create Date: 2026-10-19 18:04:37.120554
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e5a7b9d1f4'
+down_revision: Union[str, None] = 'b9d3e5f7a1c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'entry',
+        sa.Column('video', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('entry', 'video')
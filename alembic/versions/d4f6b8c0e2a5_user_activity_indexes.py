@@ -0,0 +1,54 @@
+"""user activity indexes
+
+Revision ID: d4f6b8c0e2a5
+Revises: c3e5a7b9d1f4
+Create Date: 2026-10-19 21:36:12.804317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f6b8c0e2a5'
+down_revision: Union[str, None] = 'c3e5a7b9d1f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The new indexes start with the columns of the ones they replace.
+    op.create_index(
+        'ix_entry_author_id_ts',
+        'entry',
+        ['author_id', 'ts'],
+        unique=False,
+    )
+    op.drop_index('ix_entry_author_id', table_name='entry')
+    # Likes are ordered by time, so those of several shards can be merged.
+    op.add_column(
+        'entryflags', sa.Column('ts', sa.DateTime(timezone=True), nullable=True)
+    )
+    # When earlier reactions were made is unknown, but not before their entry.
+    op.execute(
+        "UPDATE entryflags SET ts = COALESCE("
+        "(SELECT entry.ts FROM entry WHERE entry.id = entryflags.entry_id), "
+        "CURRENT_TIMESTAMP)"
+    )
+    op.create_index(
+        'ix_entryflags_user_id_type_ts',
+        'entryflags',
+        ['user_id', 'type', 'ts', 'id'],
+        unique=False,
+    )
+    op.drop_index('ix_entryflags_user_id', table_name='entryflags')
+
+
+def downgrade() -> None:
+    op.create_index('ix_entryflags_user_id', 'entryflags', ['user_id'], unique=False)
+    op.drop_index('ix_entryflags_user_id_type_ts', table_name='entryflags')
+    op.drop_column('entryflags', 'ts')
+    op.create_index('ix_entry_author_id', 'entry', ['author_id'], unique=False)
+    op.drop_index('ix_entry_author_id_ts', table_name='entry')
@@ -0,0 +1,114 @@
+"""moderation queue
+
+Revision ID: e3b6d9f0c2a8
+Revises: a4f1c8e2d5b7
+Create Date: 2026-10-19 15:17:42.661039
+
+"""
+import datetime
+import math
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b6d9f0c2a8'
+down_revision: Union[str, None] = 'a4f1c8e2d5b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same as `rx_shout.ranking`, at the time of this revision.
+HOT_DECAY_SECONDS = float(os.environ.get("HOT_DECAY_SECONDS", "45000"))
+EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def hot_score(likes: int, ts: datetime.datetime) -> float:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=datetime.timezone.utc)
+    return (
+        math.log10(max(likes, 1))
+        + (ts - EPOCH).total_seconds() / HOT_DECAY_SECONDS
+    )
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    # Concurrent reactions could store the same one twice, keep the first.
+    liked_twice = conn.execute(
+        sa.text(
+            "SELECT DISTINCT entry_id FROM entryflags WHERE type = 'like' "
+            "GROUP BY user_id, entry_id, type HAVING COUNT(*) > 1"
+        )
+    ).scalars().all()
+    op.execute(
+        "DELETE FROM entryflags WHERE id NOT IN "
+        "(SELECT MIN(id) FROM entryflags GROUP BY user_id, entry_id, type)"
+    )
+    op.create_index(
+        'ix_entryflags_user_id_entry_id_type',
+        'entryflags',
+        ['user_id', 'entry_id', 'type'],
+        unique=True,
+    )
+    # The likes were counted with the duplicates.
+    entry = sa.table(
+        'entry',
+        sa.column('id', sa.Integer()),
+        sa.column('ts', sa.DateTime(timezone=True)),
+        sa.column('likes', sa.Integer()),
+        sa.column('hot_score', sa.Float()),
+    )
+    entryflags = sa.table(
+        'entryflags',
+        sa.column('entry_id', sa.Integer()),
+        sa.column('type', sa.String()),
+    )
+    for entry_id in liked_twice:
+        likes = conn.execute(
+            sa.select(sa.func.count())
+            .select_from(entryflags)
+            .where(entryflags.c.entry_id == entry_id, entryflags.c.type == 'like')
+        ).scalar_one()
+        ts = conn.execute(
+            sa.select(entry.c.ts).where(entry.c.id == entry_id)
+        ).scalar_one_or_none()
+        if ts is None:
+            continue
+        conn.execute(
+            sa.update(entry)
+            .where(entry.c.id == entry_id)
+            .values(likes=likes, hot_score=hot_score(likes, ts))
+        )
+
+    op.add_column(
+        'entry',
+        sa.Column('flags', sa.Integer(), server_default='0', nullable=False),
+    )
+    op.add_column(
+        'entry',
+        sa.Column('last_flagged_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.execute(
+        "UPDATE entry SET flags = (SELECT COUNT(*) FROM entryflags "
+        "WHERE entryflags.entry_id = entry.id AND entryflags.type = 'flag')"
+    )
+    # Flags were not timestamped, assume they came in when the entry was posted.
+    op.execute("UPDATE entry SET last_flagged_at = ts WHERE flags > 0")
+    op.create_index(
+        'ix_entry_flagged',
+        'entry',
+        ['hidden', 'flags', 'last_flagged_at'],
+        unique=False,
+        postgresql_where=sa.text('flags > 0'),
+        sqlite_where=sa.text('flags > 0'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_entry_flagged', table_name='entry')
+    op.drop_column('entry', 'last_flagged_at')
+    op.drop_column('entry', 'flags')
+    op.drop_index('ix_entryflags_user_id_entry_id_type', table_name='entryflags')
@@ -0,0 +1,40 @@
+"""topic summary
+
+Revision ID: f7a2c4e6b8d1
+Revises: e3b6d9f0c2a8
+Create Date: 2026-10-19 16:08:55.120734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a2c4e6b8d1'
+down_revision: Union[str, None] = 'e3b6d9f0c2a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'topicsummary',
+        sa.Column('topic_id', sa.Integer(), nullable=False),
+        sa.Column('entries', sa.Integer(), nullable=False),
+        sa.Column('likes', sa.Integer(), nullable=False),
+        sa.Column('last_activity_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['topic_id'], ['topic.id'], ),
+        sa.PrimaryKeyConstraint('topic_id')
+    )
+    op.execute(
+        "INSERT INTO topicsummary (topic_id, entries, likes, last_activity_at) "
+        "SELECT topic.id, COUNT(entry.id), COALESCE(SUM(entry.likes), 0), MAX(entry.ts) "
+        "FROM topic LEFT JOIN entry ON entry.topic_id = topic.id AND NOT entry.hidden "
+        "GROUP BY topic.id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('topicsummary')
@@ -0,0 +1,42 @@
+// Upload an image straight to S3-compatible storage using a presigned POST
+// issued by the backend (see UploadState.request_direct_upload).
+
+// Remember the file selected in the input and describe it to the backend.
+// Images are downscaled first when upload_resize.js is loaded.
+window.rxShoutSelectedFile = async (inputId, maxDimension) => {
+  const input = document.getElementById(inputId);
+  let file = input?.files?.[0];
+  if (!file) {
+    return null;
+  }
+  // Allow selecting the same file again later.
+  input.value = "";
+  if (window.rxShoutResizeImage) {
+    file = await window.rxShoutResizeImage(file, maxDimension);
+  }
+  window.rxShoutPendingFile = file;
+  return { name: file.name, size: file.size, type: file.type };
+};
+
+// POST the pending file to the bucket; resolves to {ok, status}.
+window.rxShoutDirectUpload = (post) =>
+  new Promise((resolve) => {
+    const file = window.rxShoutPendingFile;
+    window.rxShoutPendingFile = null;
+    if (!file) {
+      resolve({ ok: false, status: 0 });
+      return;
+    }
+    const form = new FormData();
+    for (const [name, value] of Object.entries(post.fields)) {
+      form.append(name, value);
+    }
+    // The file must be the last field of the form.
+    form.append("file", file);
+    const xhr = new XMLHttpRequest();
+    xhr.open("POST", post.url);
+    xhr.onload = () =>
+      resolve({ ok: xhr.status >= 200 && xhr.status < 300, status: xhr.status });
+    xhr.onerror = () => resolve({ ok: false, status: xhr.status });
+    xhr.send(form);
+  });
@@ -0,0 +1,107 @@
+// Blurred previews of feed images, decoded from the BlurHash stored with each
+// entry (see rx_shout/imageinfo.py) and shown as the image's background until
+// it has loaded.
+
+const BASE83 =
+  "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~";
+const PLACEHOLDER_SIZE = 32;
+const placeholderCache = new Map();
+
+const decode83 = (str) => {
+  let value = 0;
+  for (const c of str) {
+    value = value * 83 + BASE83.indexOf(c);
+  }
+  return value;
+};
+
+const toLinear = (value) => {
+  const v = value / 255;
+  return v <= 0.04045 ? v / 12.92 : Math.pow((v + 0.055) / 1.055, 2.4);
+};
+
+const toSrgb = (value) => {
+  const v = Math.max(0, Math.min(1, value));
+  return v <= 0.0031308
+    ? Math.round(v * 12.92 * 255)
+    : Math.round((1.055 * Math.pow(v, 1 / 2.4) - 0.055) * 255);
+};
+
+const signPow = (value, exp) => Math.sign(value) * Math.pow(Math.abs(value), exp);
+
+const decodeBlurhash = (hash, width, height) => {
+  const sizeFlag = decode83(hash[0]);
+  const nx = (sizeFlag % 9) + 1;
+  const ny = Math.floor(sizeFlag / 9) + 1;
+  if (hash.length !== 4 + 2 * nx * ny) {
+    return null;
+  }
+  const maxValue = (decode83(hash[1]) + 1) / 166;
+  const dc = decode83(hash.slice(2, 6));
+  const colors = [[toLinear(dc >> 16), toLinear((dc >> 8) & 255), toLinear(dc & 255)]];
+  for (let ix = 1; ix < nx * ny; ix++) {
+    const value = decode83(hash.slice(4 + ix * 2, 6 + ix * 2));
+    colors.push([
+      signPow((Math.floor(value / (19 * 19)) - 9) / 9, 2) * maxValue,
+      signPow(((Math.floor(value / 19) % 19) - 9) / 9, 2) * maxValue,
+      signPow(((value % 19) - 9) / 9, 2) * maxValue,
+    ]);
+  }
+  const pixels = new Uint8ClampedArray(width * height * 4);
+  for (let y = 0; y < height; y++) {
+    for (let x = 0; x < width; x++) {
+      let r = 0;
+      let g = 0;
+      let b = 0;
+      for (let j = 0; j < ny; j++) {
+        for (let i = 0; i < nx; i++) {
+          const basis =
+            Math.cos((Math.PI * x * i) / width) * Math.cos((Math.PI * y * j) / height);
+          const color = colors[i + j * nx];
+          r += color[0] * basis;
+          g += color[1] * basis;
+          b += color[2] * basis;
+        }
+      }
+      const offset = 4 * (x + y * width);
+      pixels[offset] = toSrgb(r);
+      pixels[offset + 1] = toSrgb(g);
+      pixels[offset + 2] = toSrgb(b);
+      pixels[offset + 3] = 255;
+    }
+  }
+  return pixels;
+};
+
+// A CSS background-image value for the hash, "none" if there is none.
+window.rxShoutPlaceholder = (hash) => {
+  if (!hash) {
+    return "none";
+  }
+  if (!placeholderCache.has(hash)) {
+    let url = "none";
+    const pixels = decodeBlurhash(hash, PLACEHOLDER_SIZE, PLACEHOLDER_SIZE);
+    if (pixels) {
+      const canvas = document.createElement("canvas");
+      canvas.width = PLACEHOLDER_SIZE;
+      canvas.height = PLACEHOLDER_SIZE;
+      canvas
+        .getContext("2d")
+        .putImageData(new ImageData(pixels, PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), 0, 0);
+      url = `url(${canvas.toDataURL()})`;
+    }
+    placeholderCache.set(hash, url);
+  }
+  return placeholderCache.get(hash);
+};
+
+// Remove the preview once the image (or video) has loaded, so it does not show
+// through transparent images. Load events don't bubble, so listen while
+// capturing.
+const removePlaceholder = (event) => {
+  if (event.target.dataset?.placeholder !== undefined) {
+    event.target.style.backgroundImage = "none";
+  }
+};
+document.addEventListener("load", removePlaceholder, true);
+document.addEventListener("loadeddata", removePlaceholder, true);
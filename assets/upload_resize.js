@@ -0,0 +1,57 @@
+// Downscale images in the browser before they are uploaded.
+
+const RESIZABLE_TYPES = ["image/jpeg", "image/png", "image/webp"];
+const EXTENSIONS = { "image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp" };
+
+// Resize the image so neither side exceeds maxDimension pixels.
+// Returns the original file if it is small enough, not resizable (GIFs keep
+// their animation) or if re-encoding would not make it smaller.
+window.rxShoutResizeImage = async (file, maxDimension) => {
+  if (!maxDimension || !RESIZABLE_TYPES.includes(file.type)) {
+    return file;
+  }
+  let bitmap;
+  try {
+    bitmap = await createImageBitmap(file);
+  } catch {
+    return file;
+  }
+  const scale = maxDimension / Math.max(bitmap.width, bitmap.height);
+  if (scale >= 1) {
+    bitmap.close();
+    return file;
+  }
+  const canvas = document.createElement("canvas");
+  canvas.width = Math.round(bitmap.width * scale);
+  canvas.height = Math.round(bitmap.height * scale);
+  canvas.getContext("2d").drawImage(bitmap, 0, 0, canvas.width, canvas.height);
+  bitmap.close();
+  // PNG screenshots and photos compress far better as WebP, keeping alpha.
+  const type = file.type === "image/png" ? "image/webp" : file.type;
+  const blob = await new Promise((resolve) => canvas.toBlob(resolve, type, 0.85));
+  if (!blob || blob.size >= file.size) {
+    return file;
+  }
+  const name = file.name.replace(/\.[^.]*$/, "") + (EXTENSIONS[blob.type] || "");
+  return new File([blob], name, { type: blob.type, lastModified: file.lastModified });
+};
+
+// Replacement for react-dropzone's `getFilesFromEvent` that resizes images.
+window.rxShoutFilesFromEvent = async (event, maxDimension) => {
+  let files;
+  if (Array.isArray(event)) {
+    // File handles from the file system access API.
+    files = await Promise.all(event.map((handle) => handle.getFile()));
+  } else if (event.dataTransfer) {
+    if (event.type !== "drop") {
+      // While dragging only the types of the items are available.
+      return Array.from(event.dataTransfer.items || []).filter(
+        (item) => item.kind === "file",
+      );
+    }
+    files = Array.from(event.dataTransfer.files);
+  } else {
+    files = Array.from(event.target?.files || []);
+  }
+  return Promise.all(files.map((file) => window.rxShoutResizeImage(file, maxDimension)));
+};
@@ -0,0 +1,529 @@
+"""Seed a database and benchmark the shoutbox event handlers.
+
+Run from the repository root:
+
+    # Create (and migrate) a database with a reproducible data set.
+    python -m benchmarks.shoutbox seed --db-url sqlite:///bench.db --entries 20000
+
+    # Drive the handlers in-process through reflex's event processing.
+    python -m benchmarks.shoutbox direct --db-url sqlite:///bench.db --json out.json
+
+    # Drive a running backend through simulated websocket clients.
+    python -m benchmarks.shoutbox ws --url http://localhost:8000 --clients 50
+
+`direct` signs in simulated users by replacing Google token verification with
+a stand-in, so every handler (posting, reacting, uploading) can be exercised.
+`ws` talks to a real server and can therefore only load feeds anonymously;
+it needs `aiohttp` installed for python-socketio's asyncio client.
+
+Pass `--baseline previous.json` to exit non-zero when p50 latency of any
+action regressed by more than `--tolerance`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import datetime
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+
+# 1x1 transparent PNG used for upload benchmarks.
+PNG_BYTES = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+ACTIONS = ("load_entries", "handle_submit", "like_entry", "handle_upload")
+
+
+def async_url(db_url: str) -> str:
+    if db_url.startswith("sqlite:"):
+        return db_url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    return db_url
+
+
+def configure_environment(db_url: str | None) -> None:
+    """Point reflex at the benchmark database and disable rate limiting."""
+    if db_url:
+        os.environ["REFLEX_DB_URL"] = db_url
+        os.environ["REFLEX_ASYNC_DB_URL"] = async_url(db_url)
+    for action in ("POST", "REACT", "UPLOAD"):
+        os.environ[f"RATE_LIMIT_{action}"] = "off"
+
+
+@dataclass
+class ActionStats:
+    latencies: list[float] = field(default_factory=list)
+    state_bytes: list[int] = field(default_factory=list)
+    queries: int = 0
+    elapsed: float = 0.0
+
+    def report(self) -> dict:
+        latencies = sorted(self.latencies)
+        n = len(latencies)
+        if not n:
+            return {"ops": 0}
+        return {
+            "ops": n,
+            "throughput": round(n / self.elapsed, 2) if self.elapsed else None,
+            "p50_ms": round(latencies[n // 2] * 1000, 3),
+            "p99_ms": round(latencies[min(n - 1, int(n * 0.99))] * 1000, 3),
+            "queries_per_op": round(self.queries / n, 2),
+            "state_bytes_per_op": round(statistics.fmean(self.state_bytes)),
+        }
+
+
+class QueryCounter:
+    """Count every statement executed against any SQLAlchemy engine."""
+
+    def __init__(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        self.count = 0
+        event.listen(Engine, "after_cursor_execute", self._count)
+
+    def _count(self, *args, **kwargs):
+        self.count += 1
+
+
+# --- seeding ---------------------------------------------------------------
+
+
+def seed(args) -> None:
+    configure_environment(args.db_url)
+    import reflex as rx
+    import sqlalchemy
+
+    from rx_shout.models import Author, Entry, EntryFlags, Topic, UserInfo
+
+    rx.Model.migrate()
+    rng = random.Random(args.seed)
+    engine = sqlalchemy.create_engine(args.db_url)
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    def batched(table, rows):
+        with engine.begin() as conn:
+            for start in range(0, len(rows), args.batch_size):
+                conn.execute(
+                    sqlalchemy.insert(table),
+                    rows[start : start + args.batch_size],
+                )
+
+    batched(
+        UserInfo.__table__,
+        [
+            {"id": i, "ext_id": f"bench:{i}", "email": f"user{i}@example.com"}
+            for i in range(1, args.users + 1)
+        ],
+    )
+    batched(
+        Author.__table__,
+        [
+            {
+                "user_id": i,
+                "name": f"User {i}",
+                "picture": f"https://example.com/avatar/{i}.png",
+            }
+            for i in range(1, args.users + 1)
+        ],
+    )
+    batched(
+        Topic.__table__,
+        [
+            {"id": i, "name": f"/bench/{i}", "description": f"Topic {i}"}
+            for i in range(1, args.topics + 1)
+        ],
+    )
+    # A configurable share of all entries lands in the first ("hot") topic.
+    batched(
+        Entry.__table__,
+        [
+            {
+                "id": i,
+                "ts": now - datetime.timedelta(seconds=rng.randrange(365 * 86400)),
+                "author_id": rng.randint(1, args.users),
+                "topic_id": (
+                    1 if rng.random() < args.hot_share else rng.randint(1, args.topics)
+                ),
+                "text": f"Benchmark entry {i} " + "lorem ipsum " * rng.randint(1, 20),
+                "hidden": rng.random() < 0.01,
+            }
+            for i in range(1, args.entries + 1)
+        ],
+    )
+    # Users react at most once of each type to an entry.
+    flags = dict.fromkeys(
+        (
+            rng.randint(1, args.users),
+            rng.randint(1, args.entries),
+            "flag" if rng.random() < 0.1 else "like",
+        )
+        for _ in range(args.flags)
+    )
+    batched(
+        EntryFlags.__table__,
+        [
+            {"user_id": user_id, "entry_id": entry_id, "type": type_}
+            for user_id, entry_id, type_ in flags
+        ],
+    )
+    if engine.dialect.name == "postgresql":
+        # Explicit ids bypass the sequences; move them past the seeded rows.
+        with engine.begin() as conn:
+            for table in ("userinfo", "topic", "entry", "entryflags"):
+                conn.execute(
+                    sqlalchemy.text(
+                        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                        f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"
+                    )
+                )
+    print(
+        f"Seeded {args.users} users, {args.topics} topics, "
+        f"{args.entries} entries and {len(flags)} flags into {args.db_url}"
+    )
+
+
+# --- in-process driver ----------------------------------------------------
+
+
+def fake_google_tokens() -> None:
+    """Accept `bench:<n>` credentials as a signed-in seeded user.
+
+    Their avatars are never downloaded, so signing in doesn't reach out to
+    the network (or write to the upload directory).
+    """
+    from rx_shout import avatars
+
+    def fetch_avatar(user_id: int, picture_url: str) -> None:
+        return None
+
+    def verify(credential, *args, **kwargs):
+        if not credential.startswith("bench:"):
+            raise ValueError("Not a benchmark credential")
+        n = credential.partition(":")[2]
+        return {
+            "sub": credential,
+            "email": f"user{n}@example.com",
+            "name": f"User {n}",
+            "picture": f"https://example.com/avatar/{n}.png",
+            "exp": time.time() + 3600,
+        }
+
+    for name, module in list(sys.modules.items()):
+        if name.startswith("reflex_google_auth") and hasattr(
+            module, "verify_oauth2_token"
+        ):
+            module.verify_oauth2_token = verify
+    avatars.fetch_avatar = fetch_avatar
+
+
+class RecordingNamespace:
+    """Stands in for the websocket namespace, keeping the updates per client."""
+
+    def __init__(self):
+        self.updates: dict[str, list] = {}
+
+    async def emit_update(self, update, token: str) -> None:
+        self.updates.setdefault(token, []).append(update)
+
+
+class DirectClient:
+    """A simulated browser session processed in-process by the reflex app."""
+
+    def __init__(
+        self, processor, namespace: RecordingNamespace, topic: str, user: int
+    ):
+        self.processor = processor
+        self.namespace = namespace
+        self.token = str(uuid.uuid4())
+        self.sid = f"bench-{self.token}"
+        self.user = user
+        self.headers = {"host": "localhost", "x-forwarded-for": f"10.0.{user % 256}.1"}
+        self.router_data = {
+            "pathname": "/",
+            "asPath": f"/?topic={topic}",
+            "query": {"topic": topic},
+            "token": self.token,
+            "sid": self.sid,
+            "headers": self.headers,
+            "ip": "127.0.0.1",
+        }
+        # Events sent to the browser, such as toasts and scripts to run.
+        self.events: list = []
+        # State changes sent to the browser, by state name.
+        self.deltas: list[dict] = []
+
+    async def emit(self, name: str, payload: dict | None = None) -> tuple[float, int]:
+        """Process the event, the events it chains to and any redirect."""
+        from reflex.event import Event
+        from reflex.state import serialize_state_update
+        from reflex.utils.format import json_dumps
+
+        from rx_shout.state import State
+
+        pending = [(name, payload or {})]
+        nbytes = 0
+        start = time.perf_counter()
+        while pending:
+            name, payload = pending.pop(0)
+            event = Event(name=name, payload=payload, router_data=dict(self.router_data))
+            future = await self.processor.enqueue(self.token, event)
+            # Also waits for the backend events chained by the handler.
+            await future.wait_all()
+            for update in self.namespace.updates.pop(self.token, []):
+                nbytes += len(json_dumps(serialize_state_update(update)))
+                self.events.extend(update.events)
+                self.deltas.append(update.delta)
+                for chained in update.events:
+                    if chained.name == "_redirect":
+                        # The browser reloads the page, which fires on_load.
+                        pending.append((handler_name(State, "load_entries"), {}))
+        return time.perf_counter() - start, nbytes
+
+    async def sign_in(self) -> None:
+        import reflex_google_auth
+
+        from rx_shout.state import State
+
+        await self.emit(
+            handler_name(reflex_google_auth.GoogleAuthState, "on_success"),
+            {"response": {"credential": f"bench:{self.user}"}},
+        )
+        await self.emit(handler_name(State, "reload_after_login"))
+
+
+def handler_name(state_cls, handler: str) -> str:
+    return f"{state_cls.get_full_name()}.{handler}"
+
+
+async def drive_direct(args) -> dict[str, dict]:
+    configure_environment(args.db_url)
+    import reflex as rx
+    import sqlalchemy
+    from reflex_base.event.processor.base_state_processor import (
+        BaseStateEventProcessor,
+    )
+
+    from rx_shout.components.image_upload import UploadState
+    from rx_shout.models import Entry, Topic
+    from rx_shout.rx_shout import app
+    from rx_shout.state import State
+
+    fake_google_tokens()
+    if getattr(app, "_state_manager", None) is None:
+        app._enable_state()
+    namespace = RecordingNamespace()
+    processor = BaseStateEventProcessor(middleware=app).configure(
+        state_manager=app.state_manager, event_namespace=namespace
+    )
+    async with processor:
+        queries = QueryCounter()
+        rng = random.Random(args.seed)
+        topic = f"/bench/{args.topic}"
+        with rx.session() as session:
+            entry_ids = session.execute(
+                sqlalchemy.select(Entry.id).join(Topic).where(Topic.name == topic)
+            ).scalars().all() or [1]
+        clients = [
+            DirectClient(processor, namespace, topic, user=rng.randint(1, args.users))
+            for _ in range(args.clients)
+        ]
+        for client in clients:
+            await client.sign_in()
+
+        def make_event(action: str) -> tuple[str, dict]:
+            if action == "load_entries":
+                return handler_name(State, "load_entries"), {}
+            if action == "handle_submit":
+                return handler_name(State, "handle_submit"), {
+                    "form_data": {"text": f"bench post {uuid.uuid4()}"}
+                }
+            if action == "like_entry":
+                return handler_name(State, "like_entry"), {
+                    "entry_id": rng.choice(entry_ids)
+                }
+            return handler_name(UploadState, "handle_upload"), {
+                "files": [
+                    rx.UploadFile(file=io.BytesIO(PNG_BYTES), path=Path("bench.png"))
+                ]
+            }
+
+        results = {}
+        for action in args.actions:
+            stats = ActionStats()
+            queries.count = 0
+            start = time.perf_counter()
+
+            async def run(client: DirectClient):
+                for _ in range(args.iterations):
+                    latency, nbytes = await client.emit(*make_event(action))
+                    stats.latencies.append(latency)
+                    stats.state_bytes.append(nbytes)
+
+            await asyncio.gather(*(run(client) for client in clients))
+            stats.elapsed = time.perf_counter() - start
+            stats.queries = queries.count
+            results[action] = stats.report()
+        return results
+
+
+# --- websocket driver -----------------------------------------------------
+
+
+def feed_loaded(update: dict) -> bool:
+    """Whether the update ends `load_entries`, which clears the loading flag."""
+    return any(
+        name.startswith("loading") and value.get("posts") is False
+        for delta in update.get("delta", {}).values()
+        for name, value in delta.items()
+        if isinstance(value, dict)
+    )
+
+
+async def drive_ws(args) -> dict[str, dict]:
+    import socketio
+
+    from rx_shout.state import State
+
+    name = handler_name(State, "load_entries")
+    # The reflex frontend connects to the `/_event` namespace at `/_event`.
+    namespace = "/_event"
+    stats = ActionStats()
+
+    async def run_client(n: int):
+        sio = socketio.AsyncClient()
+        token = str(uuid.uuid4())
+        done = asyncio.Queue()
+        nbytes = 0
+
+        @sio.on("event", namespace=namespace)
+        async def on_event(data):
+            nonlocal nbytes
+            update = json.loads(data) if isinstance(data, str) else data
+            nbytes += len(json.dumps(update))
+            if feed_loaded(update):
+                await done.put(nbytes)
+
+        await sio.connect(
+            f"{args.url}?token={token}",
+            namespaces=[namespace],
+            socketio_path=namespace,
+            transports=["websocket"],
+        )
+        topic = f"/bench/{args.topic}"
+        router_data = {
+            "pathname": "/",
+            "asPath": f"/?topic={topic}",
+            "query": {"topic": topic},
+        }
+        try:
+            for _ in range(args.iterations):
+                nbytes = 0
+                start = time.perf_counter()
+                await sio.emit(
+                    "event",
+                    {"name": name, "payload": {}, "router_data": router_data},
+                    namespace=namespace,
+                )
+                stats.state_bytes.append(await done.get())
+                stats.latencies.append(time.perf_counter() - start)
+        finally:
+            await sio.disconnect()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(n) for n in range(args.clients)))
+    stats.elapsed = time.perf_counter() - start
+    return {"load_entries": stats.report()}
+
+
+# --- reporting ------------------------------------------------------------
+
+
+def print_report(results: dict[str, dict]) -> None:
+    columns = (
+        "ops",
+        "throughput",
+        "p50_ms",
+        "p99_ms",
+        "queries_per_op",
+        "state_bytes_per_op",
+    )
+    print(f"{'action':<16}" + "".join(f"{c:>20}" for c in columns))
+    for action, report in results.items():
+        print(
+            f"{action:<16}"
+            + "".join(f"{str(report.get(c, '-')):>20}" for c in columns)
+        )
+
+
+def check_baseline(results: dict, baseline_path: str, tolerance: float) -> bool:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    ok = True
+    for action, report in results.items():
+        before = baseline.get(action, {}).get("p50_ms")
+        after = report.get("p50_ms")
+        if before and after and after > before * (1 + tolerance):
+            print(f"REGRESSION {action}: p50 {before}ms -> {after}ms")
+            ok = False
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = subparsers.add_parser("seed", help="Populate a database.")
+    seed_parser.add_argument("--db-url", default="sqlite:///bench.db")
+    seed_parser.add_argument("--topics", type=int, default=100)
+    seed_parser.add_argument("--users", type=int, default=1000)
+    seed_parser.add_argument("--entries", type=int, default=10000)
+    seed_parser.add_argument("--flags", type=int, default=50000)
+    seed_parser.add_argument("--hot-share", type=float, default=0.2)
+    seed_parser.add_argument("--batch-size", type=int, default=5000)
+    seed_parser.add_argument("--seed", type=int, default=0)
+
+    for command, help_text in (
+        ("direct", "Drive handlers in-process."),
+        ("ws", "Drive a running backend over websockets."),
+    ):
+        sub = subparsers.add_parser(command, help=help_text)
+        sub.add_argument("--clients", type=int, default=10)
+        sub.add_argument("--iterations", type=int, default=20)
+        sub.add_argument("--topic", type=int, default=1)
+        sub.add_argument("--json", help="Write the results to this file.")
+        sub.add_argument("--baseline", help="Compare against a previous --json.")
+        sub.add_argument("--tolerance", type=float, default=0.2)
+    subparsers.choices["direct"].add_argument("--db-url", default="sqlite:///bench.db")
+    subparsers.choices["direct"].add_argument("--users", type=int, default=1000)
+    subparsers.choices["direct"].add_argument("--seed", type=int, default=0)
+    subparsers.choices["direct"].add_argument(
+        "--actions", nargs="+", choices=ACTIONS, default=list(ACTIONS)
+    )
+    subparsers.choices["ws"].add_argument("--url", default="http://localhost:8000")
+
+    args = parser.parse_args()
+    if args.command == "seed":
+        seed(args)
+        return
+    driver = drive_direct if args.command == "direct" else drive_ws
+    results = asyncio.run(driver(args))
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline and not check_baseline(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Check that importing the app stays within its startup-time budget.
+
+Imports `rx_shout.rx_shout` in a fresh interpreter with `-X importtime` and
+exits non-zero when:
+
+* the cumulative import time exceeds ``--budget`` seconds, or
+* an optional subsystem that should be loaded lazily (S3, image processing,
+  export formats) was imported by the app itself. Subsystems imported by
+  dependencies, like reflex loading Pillow when it is installed, don't count.
+
+    python -m benchmarks.startup --budget 4
+
+`tests/test_startup.py` runs the same checks with the test suite; this script
+also lists the slowest imports.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+APP_MODULE = "rx_shout.rx_shout"
+# Top-level packages that must only be imported on first use.
+LAZY_MODULES = ("boto3", "botocore", "PIL", "pyarrow")
+BUDGET_SECONDS = float(os.environ.get("STARTUP_BUDGET_SECONDS", "4"))
+
+
+def profile_imports(
+    module: str,
+) -> tuple[dict[str, tuple[int, int]], dict[str, str]]:
+    """Map each imported module to its (self, cumulative) import time in us.
+
+    Also returns the module that first imported each module.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if result.returncode:
+        sys.exit(f"Importing {module} failed:\n{result.stderr}")
+    timings = {}
+    importers = {}
+    # Modules are listed after the modules they import, indented one level
+    # deeper: (depth, name) of the modules whose importer is not listed yet.
+    pending = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        depth = len(name) - len(name.lstrip())
+        name = name.strip()
+        timings[name] = (int(self_us), int(cumulative_us))
+        while pending and pending[-1][0] > depth:
+            importers[pending.pop()[1]] = name
+        pending.append((depth, name))
+    return timings, importers
+
+
+def _first_importer(name: str, importers: dict[str, str]) -> str:
+    """Top-level package of the first module outside `name` importing it."""
+    importer = importers.get(name, "")
+    # `import PIL.Image` lists the package `PIL` under `PIL.Image`.
+    while importer.partition(".")[0] == name:
+        importer = importers.get(importer, "")
+    return importer.partition(".")[0]
+
+
+def eager_imports(importers: dict[str, str]) -> list[str]:
+    """The `LAZY_MODULES` that the app imported at startup itself."""
+    return sorted(
+        name
+        for name in LAZY_MODULES
+        if name in importers and _first_importer(name, importers) == "rx_shout"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=BUDGET_SECONDS,
+        help="Maximum cumulative import time of the app in seconds.",
+    )
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    timings, importers = profile_imports(APP_MODULE)
+    total = timings[APP_MODULE][1] / 1e6
+    print(f"Slowest imports (cumulative) for {APP_MODULE}:")
+    for name, (_, cumulative) in sorted(
+        timings.items(), key=lambda item: item[1][1], reverse=True
+    )[: args.top]:
+        print(f"{cumulative / 1e6:8.3f}s  {name}")
+
+    failed = False
+    eager = eager_imports(importers)
+    if eager:
+        print(f"FAIL: imported at startup but should be lazy: {', '.join(eager)}")
+        failed = True
+    if total > args.budget:
+        print(f"FAIL: startup took {total:.3f}s, budget is {args.budget:.3f}s")
+        failed = True
+    else:
+        print(f"OK: startup took {total:.3f}s, budget is {args.budget:.3f}s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
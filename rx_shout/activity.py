@@ -0,0 +1,78 @@
+"""Keyset-paginated history of a user: their posts and the posts they liked.
+
+Posts are read from the `(author_id, ts DESC)` index on `entry` and likes from
+the `(user_id, type, ts DESC, id DESC)` index on `entryflags`. Each page
+continues after the key of the last row of the previous one instead of
+skipping rows with an offset, so every page is a short range scan of the index
+however long the history is. Keys start with the time of the post or like, so
+the pages of several shards can be merged. Admins review a user's history at
+`/activity?user=<id>`.
+"""
+
+from typing import Any
+
+import sqlalchemy
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .models import Entry, EntryFlags
+
+PAGE_SIZE = 20
+KINDS = ("posts", "likes")
+
+
+def _ts_key(asession: AsyncSession, column: Any = Entry.ts) -> Any:
+    """The timestamp column as compared in keys.
+
+    SQLite stores timestamps as text, with or without microseconds, so keys
+    hold and compare the text as stored rather than re-formatted datetimes.
+    """
+    if asession.bind.dialect.name == "sqlite":
+        return sqlalchemy.type_coerce(column, sqlalchemy.String)
+    return column
+
+
+async def post_keys(
+    asession: AsyncSession,
+    user_id: int,
+    after: tuple | None = None,
+    include_hidden: bool = False,
+    limit: int = PAGE_SIZE,
+) -> list[tuple[tuple, int]]:
+    """Keys and ids of the posts of the user, newest first, after the key."""
+    ts = _ts_key(asession)
+    criteria = [Entry.author_id == user_id]
+    if not include_hidden:
+        criteria.append(Entry.hidden == False)  # noqa: E712
+    if after is not None:
+        criteria.append(sqlalchemy.tuple_(ts, Entry.id) < after)
+    rows = await asession.execute(
+        sqlalchemy.select(ts, Entry.id)
+        .where(*criteria)
+        .order_by(Entry.ts.desc(), Entry.id.desc())
+        .limit(limit)
+    )
+    return [((ts_, entry_id), entry_id) for ts_, entry_id in rows.all()]
+
+
+async def like_keys(
+    asession: AsyncSession,
+    user_id: int,
+    after: tuple | None = None,
+    include_hidden: bool = False,
+    limit: int = PAGE_SIZE,
+) -> list[tuple[tuple, int]]:
+    """Keys and entry ids of the likes of the user, latest first, after the key."""
+    ts = _ts_key(asession, EntryFlags.ts)
+    criteria = [EntryFlags.user_id == user_id, EntryFlags.type == "like"]
+    if after is not None:
+        criteria.append(sqlalchemy.tuple_(ts, EntryFlags.id) < after)
+    statement = sqlalchemy.select(ts, EntryFlags.id, EntryFlags.entry_id)
+    if not include_hidden:
+        statement = statement.join(Entry, Entry.id == EntryFlags.entry_id)
+        criteria.append(Entry.hidden == False)  # noqa: E712
+    rows = await asession.execute(
+        statement.where(*criteria)
+        .order_by(EntryFlags.ts.desc(), EntryFlags.id.desc())
+        .limit(limit)
+    )
+    return [((ts_, flag_id), entry_id) for ts_, flag_id, entry_id in rows.all()]
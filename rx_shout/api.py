@@ -0,0 +1,115 @@
+"""Plain HTTP endpoints served by the backend next to the reflex event API."""
+
+import hashlib
+import json
+import os
+from collections import defaultdict
+from urllib.parse import parse_qsl
+
+import sqlalchemy
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+from . import metrics, shards
+from .models import Topic, TopicSummary
+
+# Topics per summary request, keeps the query reasonably small.
+MAX_SUMMARY_TOPICS = 500
+# Topics per GET summary request: the request line must fit in the 16 KiB
+# that h11 accepts, which leaves about 150 characters per (quoted) name.
+MAX_SUMMARY_GET_TOPICS = 100
+# Bodies of POST summary requests, enough for MAX_SUMMARY_TOPICS long names.
+MAX_SUMMARY_BODY = 256 * 1024
+SUMMARY_MAX_AGE = int(os.environ.get("SUMMARY_MAX_AGE", "60"))
+
+
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """Prometheus scrape target; not routed through Caddy."""
+    return PlainTextResponse(
+        metrics.render(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+async def topic_summary_endpoint(request: Request) -> Response:
+    """Entry count, like total and last activity of each `topic` requested.
+
+        GET /api/topics/summary?topic=/blog/post-1&topic=/blog/post-2
+
+    More topics than fit in a url are POSTed with the same parameters as an
+    `application/x-www-form-urlencoded` body, which browsers send across
+    origins without a preflight request. Topics that don't exist are left
+    out of the response.
+    """
+    if request.method == "POST":
+        body = b""
+        async for chunk in request.stream():
+            body += chunk
+            if len(body) > MAX_SUMMARY_BODY:
+                return JSONResponse(
+                    {"error": "Request body too large."}, status_code=413
+                )
+        params = parse_qsl(body.decode(errors="replace"))
+        names = sorted({value for key, value in params if key == "topic"})
+        max_topics = MAX_SUMMARY_TOPICS
+    else:
+        names = sorted(set(request.query_params.getlist("topic")))
+        max_topics = MAX_SUMMARY_GET_TOPICS
+    if not names or len(names) > max_topics:
+        return JSONResponse(
+            {"error": f"Pass between 1 and {max_topics} topic parameters."},
+            status_code=400,
+        )
+    # One query per shard storing any of the topics, see `rx_shout.shards`.
+    by_shard = defaultdict(list)
+    for name in names:
+        by_shard[shards.shard_for(name)].append(name)
+    topics = {}
+    for shard, shard_names in sorted(by_shard.items()):
+        async with shards.asession(shard) as asession:
+            rows = await asession.execute(
+                sqlalchemy.select(
+                    Topic.name,
+                    TopicSummary.entries,
+                    TopicSummary.likes,
+                    TopicSummary.last_activity_at,
+                )
+                .outerjoin(TopicSummary, TopicSummary.topic_id == Topic.id)
+                .where(Topic.name.in_(shard_names))
+            )
+            topics.update(
+                {
+                    name: {
+                        "entries": entries or 0,
+                        "likes": likes or 0,
+                        "last_activity": (
+                            last_activity_at.replace(microsecond=0).isoformat()
+                            if last_activity_at
+                            else None
+                        ),
+                    }
+                    for name, entries, likes, last_activity_at in rows.all()
+                }
+            )
+    body = json.dumps({"topics": topics}, sort_keys=True).encode()
+    headers = {
+        "Cache-Control": f"public, max-age={SUMMARY_MAX_AGE}",
+        "ETag": f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+        # Summaries are public, pages on other sites may fetch them.
+        "Access-Control-Allow-Origin": "*",
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+api = Starlette(
+    routes=[
+        Route("/metrics", metrics_endpoint),
+        Route(
+            "/api/topics/summary", topic_summary_endpoint, methods=["GET", "POST"]
+        ),
+    ],
+)
@@ -0,0 +1,140 @@
+"""Locally cached, resized copies of author avatars.
+
+Instead of hotlinking the full size Google profile picture of every author, a
+small copy (``AVATAR_SIZE`` pixels, default 96) is fetched once per picture
+and stored in the upload store as `avatars/<user_id>-<hash>.<ext>`, or in the
+S3 bucket when it is configured. The name changes with the picture, so the
+files are served with immutable cache headers.
+
+Pictures are re-encoded as WebP when Pillow is installed; otherwise Google is
+asked for a small version of the picture and it is stored as-is.
+
+Cache the avatars of existing authors with:
+
+    python -m rx_shout.avatars
+"""
+
+import hashlib
+import io
+import logging
+import os
+import re
+from urllib.parse import urlparse
+
+import httpx
+
+from . import s3, storage
+
+logger = logging.getLogger(__name__)
+
+AVATAR_SIZE = int(os.environ.get("AVATAR_SIZE", "96"))
+AVATAR_DIR = "avatars"
+MAX_PICTURE_BYTES = 2 * 1024**2
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+# Google profile picture urls end with a size option like `=s96-c`.
+_GOOGLE_SIZE_OPTION = re.compile(r"=s\d+(-c)?$")
+
+
+def _sized_url(picture_url: str) -> str:
+    """Ask Google's image server for a small version of the picture."""
+    if urlparse(picture_url).netloc.endswith(".googleusercontent.com"):
+        return _GOOGLE_SIZE_OPTION.sub("", picture_url) + f"=s{AVATAR_SIZE}-c"
+    return picture_url
+
+
+def _download(url: str) -> tuple[bytes, str] | None:
+    """The picture and its content type, if it is an image of sane size."""
+    with httpx.stream("GET", url, timeout=5, follow_redirects=True) as response:
+        response.raise_for_status()
+        content_type = response.headers.get("content-type", "").split(";")[0]
+        if content_type not in _EXTENSIONS:
+            return None
+        data = bytearray()
+        for chunk in response.iter_bytes():
+            data += chunk
+            if len(data) > MAX_PICTURE_BYTES:
+                return None
+    return bytes(data), content_type
+
+
+def _resize(data: bytes, content_type: str) -> tuple[bytes, str]:
+    """Scale down the picture and re-encode it, if Pillow is available."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return data, content_type
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((AVATAR_SIZE, AVATAR_SIZE))
+        out = io.BytesIO()
+        image.save(out, "WEBP", quality=80)
+    return out.getvalue(), "image/webp"
+
+
+def fetch_avatar(user_id: int, picture_url: str) -> str | None:
+    """Cache a small copy of the picture, returning the new `Author.avatar`.
+
+    Like `Entry.image`, the value is either a path relative to the upload
+    directory or an S3 url. Returns None if the picture could not be cached.
+    """
+    try:
+        picture = _download(_sized_url(picture_url))
+        if picture is None:
+            logger.warning("Not caching avatar of user %s: not an image", user_id)
+            return None
+        data, content_type = _resize(*picture)
+    except (httpx.HTTPError, OSError) as exc:
+        logger.warning("Could not cache avatar of user %s: %r", user_id, exc)
+        return None
+    digest = hashlib.sha256(picture_url.encode()).hexdigest()[:16]
+    relative_path = f"{AVATAR_DIR}/{user_id}-{digest}{_EXTENSIONS[content_type]}"
+    path = storage.upload_path(relative_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    if s3.endpoint_url:
+        return s3.upload_image(
+            relative_path,
+            delete_original=True,
+            extra_args={"ContentType": content_type, "CacheControl": CACHE_CONTROL},
+        )
+    return relative_path
+
+
+def remove_avatar(avatar: str) -> None:
+    """Delete a cached avatar that was replaced."""
+    if avatar.startswith("http"):
+        if s3.endpoint_url:
+            s3.delete_object(avatar.removeprefix(s3.public_url("")))
+        return
+    storage.upload_path(avatar).unlink(missing_ok=True)
+
+
+def backfill() -> None:
+    """Cache the avatars of all authors that don't have one yet.
+
+    This also retries the pictures that failed when their authors logged in.
+    """
+    import reflex as rx
+    from sqlmodel import or_, select
+
+    from .models import Author
+
+    with rx.session() as session:
+        missing = or_(Author.avatar == None, Author.avatar == "")  # noqa: E711
+        authors = session.exec(select(Author).where(missing)).all()
+        for author in authors:
+            author.avatar = fetch_avatar(author.user_id, author.picture)
+            if author.avatar:
+                session.add(author)
+                session.commit()
+    print(f"Cached {sum(bool(author.avatar) for author in authors)} avatars.")
+
+
+if __name__ == "__main__":
+    backfill()
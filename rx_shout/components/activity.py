@@ -0,0 +1,202 @@
+"""The posts and likes of a user across all topics."""
+
+from typing import Any
+
+import reflex as rx
+import sqlalchemy
+
+from .. import activity, metrics, shards
+from ..models import Entry, Topic
+from ..state import FeedEntry, State
+from .entry import entry_content
+
+
+class ActivityState(State):
+    """A user's history, one keyset page at a time, see `rx_shout.activity`."""
+
+    # Key of `activity.KINDS`.
+    activity_kind: str = "posts"
+    activity_user_name: str = ""
+    activity: list[FeedEntry] = []
+    # Topic of each entry in `activity` by position, as entry ids are only
+    # unique within a shard (see `rx_shout.shards`).
+    activity_topics: list[str] = []
+    # Like count of each entry in `activity` by position, as above.
+    activity_likes: list[int] = []
+    activity_has_more: bool = False
+    # Key of the last row shown from each shard, none before the first page.
+    _activity_cursors: dict[int, Any] = {}
+    # Shards without further rows.
+    _activity_done: list[int] = []
+
+    def _activity_user_id(self) -> int:
+        """The user in the url for admins, the signed in user otherwise."""
+        user = self.router.url.query_parameters.get("user", "")
+        if self.is_admin and user.isdigit():
+            return int(user)
+        return self.user_info.id
+
+    @rx.event
+    @metrics.instrument
+    async def load_activity(self):
+        self.activity = []
+        self.activity_topics = []
+        self.activity_likes = []
+        self.activity_has_more = False
+        self.activity_user_name = ""
+        self._activity_cursors = {}
+        self._activity_done = []
+        user_id = self._activity_user_id()
+        if user_id < 0:
+            return
+        async with rx.asession() as asession:
+            await self._load_authors(asession, {user_id}, view="activity")
+        if user_id in self.authors:
+            self.activity_user_name = self.authors[user_id].name
+        await self._load_activity_page(user_id)
+
+    @rx.event
+    @metrics.instrument
+    async def set_activity_kind(self, kind: str | list[str]):
+        # The segmented control can also report multiple selected items.
+        if isinstance(kind, str) and kind in activity.KINDS:
+            self.activity_kind = kind
+            await self.load_activity()
+
+    @rx.event
+    @metrics.instrument
+    async def load_more_activity(self):
+        user_id = self._activity_user_id()
+        if user_id > 0 and self.activity_has_more:
+            await self._load_activity_page(user_id)
+
+    async def _load_activity_page(self, user_id: int):
+        """Append the next page, merging the rows of all shards by their keys."""
+        fetch = (
+            activity.post_keys if self.activity_kind == "posts" else activity.like_keys
+        )
+        # (key, shard, entry id) of the next rows of each shard.
+        candidates = []
+        fetched = {}
+        for shard in range(shards.COUNT):
+            if shard in self._activity_done:
+                continue
+            async with shards.asession(shard) as asession:
+                # Fetch one extra row to find out whether there is a next page.
+                keys = await fetch(
+                    asession,
+                    user_id,
+                    after=self._activity_cursors.get(shard),
+                    include_hidden=self.is_admin,
+                    limit=activity.PAGE_SIZE + 1,
+                )
+            fetched[shard] = len(keys)
+            candidates.extend((key, shard, entry_id) for key, entry_id in keys)
+        page = sorted(candidates, key=lambda row: row[0], reverse=True)[
+            : activity.PAGE_SIZE
+        ]
+        shown = {shard: 0 for shard in fetched}
+        for key, shard, _ in page:
+            shown[shard] += 1
+            self._activity_cursors[shard] = key
+        for shard, count in fetched.items():
+            if count <= activity.PAGE_SIZE and shown[shard] == count:
+                self._activity_done.append(shard)
+        self.activity_has_more = len(self._activity_done) < shards.COUNT
+
+        rows = {}
+        likes = {}
+        topics = {}
+        for shard in sorted({shard for _, shard, _ in page}):
+            ids = [entry_id for _, s, entry_id in page if s == shard]
+            async with shards.asession(shard) as asession:
+                feed, reactions = await self._load_feed(
+                    asession, Entry.id.in_(ids), view="activity", append=True
+                )
+                for row in feed:
+                    rows[shard, row.id] = row
+                    likes[shard, row.id] = reactions[row.id].likes
+                names = await asession.execute(
+                    sqlalchemy.select(Entry.id, Topic.name)
+                    .outerjoin(Topic, Topic.id == Entry.topic_id)
+                    .where(Entry.id.in_(ids))
+                )
+                topics.update(
+                    {(shard, entry_id): name or "" for entry_id, name in names.all()}
+                )
+        # Entries removed since their key was read are skipped.
+        order = [(shard, entry_id) for _, shard, entry_id in page]
+        self.activity = [*self.activity, *(rows[k] for k in order if k in rows)]
+        self.activity_topics = [
+            *self.activity_topics,
+            *(topics.get(k, "") for k in order if k in rows),
+        ]
+        self.activity_likes = [
+            *self.activity_likes,
+            *(likes[k] for k in order if k in rows),
+        ]
+
+
+def activity_entry_view(e: FeedEntry, ix: rx.Var[int]) -> rx.Component:
+    topic = ActivityState.activity_topics[ix]
+    likes = ActivityState.activity_likes[ix]
+    return rx.card(
+        rx.vstack(
+            entry_content(e),
+            rx.hstack(
+                rx.badge(rx.icon("heart", size=14), likes, color_scheme="gray"),
+                rx.link(rx.cond(topic, topic, "/"), href="/?topic=" + topic),
+                align="center",
+                width="100%",
+            ),
+            width="100%",
+        ),
+        width="100%",
+    )
+
+
+def activity_page() -> rx.Component:
+    return rx.center(
+        rx.vstack(
+            rx.hstack(
+                rx.link(rx.icon("arrow-left"), href="/"),
+                rx.heading("Activity", size="5"),
+                rx.text(ActivityState.activity_user_name, size="2"),
+                rx.spacer(),
+                rx.segmented_control.root(
+                    rx.segmented_control.item("Posts", value="posts"),
+                    rx.segmented_control.item("Likes", value="likes"),
+                    value=ActivityState.activity_kind,
+                    on_change=ActivityState.set_activity_kind,
+                ),
+                align="center",
+                width="100%",
+            ),
+            rx.cond(
+                State.token_is_valid,
+                rx.vstack(
+                    rx.cond(
+                        ActivityState.activity,
+                        rx.foreach(ActivityState.activity, activity_entry_view),
+                        rx.text("Nothing here yet."),
+                    ),
+                    rx.cond(
+                        ActivityState.activity_has_more,
+                        rx.button(
+                            "Load More",
+                            on_click=ActivityState.load_more_activity,
+                            color_scheme="gray",
+                            width="100%",
+                        ),
+                    ),
+                    gap="1em",
+                    width="100%",
+                ),
+                rx.text("Sign in to see your activity."),
+            ),
+            gap="1em",
+            margin_y="2em",
+            width=["100vw", "75vw", "75vw", "50vw", "50vw"],
+        ),
+        width="100%",
+    )
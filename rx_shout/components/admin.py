@@ -0,0 +1,434 @@
+"""Pages for admins."""
+
+import datetime
+import functools
+
+import reflex as rx
+import sqlalchemy
+
+from .. import metrics, moderation, profiler, shards, slowlog
+from ..models import Entry, Topic, UserInfo
+from ..state import FeedEntry, State
+from .entry import entry_content
+
+
+class ModerationState(State):
+    """The queue of flagged entries across all topics."""
+
+    queue: list[FeedEntry] = []
+    # Name of the topic of each entry in the queue, by entry id.
+    queue_topics: dict[int, str] = {}
+    # Flag count of each entry in the queue, by entry id.
+    queue_flags: dict[int, int] = {}
+    # Review the entries that were hidden instead of the visible ones.
+    queue_hidden: bool = False
+    queue_page: int = 0
+    queue_has_more: bool = False
+    # The queue is read from one shard at a time, see `rx_shout.shards`.
+    queue_shard: int = 0
+
+    @rx.event
+    @metrics.instrument
+    async def load_queue(self):
+        if not self.is_admin:
+            self.queue = []
+            return
+        async with shards.asession(self.queue_shard) as asession:
+            # Fetch one extra id to find out whether there is a next page.
+            ids = await moderation.flagged_entry_ids(
+                asession,
+                hidden=self.queue_hidden,
+                limit=moderation.PAGE_SIZE + 1,
+                offset=self.queue_page * moderation.PAGE_SIZE,
+            )
+            self.queue_has_more = len(ids) > moderation.PAGE_SIZE
+            ids = ids[: moderation.PAGE_SIZE]
+            rank = {entry_id: ix for ix, entry_id in enumerate(ids)}
+            rows, reactions = await self._load_feed(
+                asession, Entry.id.in_(ids), view="queue"
+            )
+            topics = (
+                await asession.execute(
+                    sqlalchemy.select(Entry.id, Topic.name)
+                    .join(Topic, Topic.id == Entry.topic_id)
+                    .where(Entry.id.in_(ids))
+                )
+            ).all()
+        self.queue = sorted(rows, key=lambda row: rank[row.id])
+        self.queue_topics = dict(topics)
+        self.queue_flags = {
+            entry_id: reaction.flags for entry_id, reaction in reactions.items()
+        }
+
+    @rx.event
+    @metrics.instrument
+    async def set_queue_hidden(self, value: bool):
+        self.queue_hidden = value
+        self.queue_page = 0
+        await self.load_queue()
+
+    @rx.event
+    @metrics.instrument
+    async def set_queue_shard(self, shard: str):
+        if shard.isdigit() and int(shard) < shards.COUNT:
+            self.queue_shard = int(shard)
+            self.queue_page = 0
+            await self.load_queue()
+
+    @rx.event
+    @metrics.instrument
+    async def change_queue_page(self, delta: int):
+        self.queue_page = max(0, self.queue_page + delta)
+        await self.load_queue()
+
+    @rx.event
+    @metrics.instrument
+    async def set_entry_hidden(self, entry_id: int, hidden: bool):
+        """Hide a visible entry, or restore a hidden one."""
+        if not self.is_admin:
+            return
+        async with shards.asession(self.queue_shard) as asession:
+            await moderation.set_hidden(asession, Entry.id == entry_id, hidden=hidden)
+            await asession.commit()
+        await self.load_queue()
+
+    @rx.event
+    @metrics.instrument
+    async def dismiss_flags(self, entry_id: int):
+        if not self.is_admin:
+            return
+        async with shards.asession(self.queue_shard) as asession:
+            await moderation.dismiss_flags(asession, entry_id)
+            await asession.commit()
+        await self.load_queue()
+
+    @rx.event
+    @metrics.instrument
+    async def ban_and_hide(self, user_id: int):
+        """Ban the author and hide all of their entries at once."""
+        if not self.is_admin:
+            return
+        async with rx.asession() as asession:
+            await asession.execute(
+                sqlalchemy.update(UserInfo)
+                .where(UserInfo.id == user_id)
+                .values(enabled=False)
+            )
+            await asession.commit()
+        # Their entries may be in any shard.
+        hidden = 0
+        for shard in range(shards.COUNT):
+            async with shards.asession(shard) as asession:
+                hidden += await moderation.set_hidden(
+                    asession, Entry.author_id == user_id, hidden=True
+                )
+                await asession.commit()
+        await self.load_queue()
+        return rx.toast(f"Banned the author and hid {hidden} posts.")
+
+
+class SlowQueryState(State):
+    """The slow queries recorded by the backend worker of this client."""
+
+    slow_queries: list[slowlog.SlowQuery] = []
+
+    @rx.var
+    def slow_query_log_enabled(self) -> bool:
+        return slowlog.SLOW_QUERY_MS > 0
+
+    @rx.event
+    @metrics.instrument
+    def load_slow_queries(self):
+        self.slow_queries = slowlog.recent() if self.is_admin else []
+
+    @rx.event
+    @metrics.instrument
+    def clear_slow_queries(self):
+        if self.is_admin:
+            slowlog.clear()
+            self.slow_queries = []
+
+
+# Lengths of a profile, in seconds, capped by `profiler.PROFILE_MAX_SECONDS`.
+PROFILE_DURATIONS = ("5", "10", "30", "60")
+
+
+class ProfileState(State):
+    """Sampling profiles of the backend worker of this client."""
+
+    profile_seconds: str = "10"
+    profiling: bool = False
+
+    @rx.event
+    @metrics.instrument
+    def set_profile_seconds(self, seconds: str | list[str]):
+        # The segmented control can also report multiple selected items.
+        if isinstance(seconds, str) and seconds in PROFILE_DURATIONS:
+            self.profile_seconds = seconds
+
+    # A profile outlasts the state lock, so it runs as a background task.
+    @rx.event(background=True)
+    @metrics.instrument
+    async def run_profile(self):
+        async with self:
+            if not self.is_admin or self.profiling:
+                return
+            self.profiling = True
+            seconds = float(self.profile_seconds)
+        try:
+            stacks = await rx._x.run_in_thread(
+                functools.partial(profiler.profile, seconds)
+            )
+        except profiler.ProfileRunningError as exc:
+            yield rx.toast(str(exc))
+            return
+        finally:
+            async with self:
+                self.profiling = False
+        if not stacks:
+            yield rx.toast("No busy threads were sampled.")
+            return
+        now = datetime.datetime.now(datetime.timezone.utc)
+        yield rx.download(
+            data=stacks,
+            filename=f"profile-{now:%Y%m%d-%H%M%S}.folded",
+            mime_type="text/plain",
+        )
+
+
+def queue_entry_view(e: FeedEntry) -> rx.Component:
+    return rx.card(
+        rx.vstack(
+            entry_content(e),
+            rx.hstack(
+                rx.badge(
+                    rx.icon("flag", size=14),
+                    ModerationState.queue_flags[e.id],
+                    color_scheme="orange",
+                ),
+                rx.cond(
+                    ModerationState.queue_topics.contains(e.id),
+                    rx.link(
+                        ModerationState.queue_topics[e.id],
+                        href="/?topic=" + ModerationState.queue_topics[e.id],
+                    ),
+                ),
+                rx.tooltip(
+                    rx.link(
+                        rx.icon("history", size=16),
+                        href="/activity?user=" + e.author_id.to_string(),
+                    ),
+                    content="Author's History",
+                ),
+                rx.spacer(),
+                rx.cond(
+                    ModerationState.queue_hidden,
+                    rx.button(
+                        "Restore",
+                        on_click=ModerationState.set_entry_hidden(e.id, False),
+                        color_scheme="green",
+                    ),
+                    rx.button(
+                        "Hide",
+                        on_click=ModerationState.set_entry_hidden(e.id, True),
+                        color_scheme="red",
+                    ),
+                ),
+                rx.button(
+                    "Dismiss Flags",
+                    on_click=ModerationState.dismiss_flags(e.id),
+                    color_scheme="gray",
+                ),
+                rx.button(
+                    "Ban and Hide All",
+                    on_click=ModerationState.ban_and_hide(e.author_id),
+                    color_scheme="red",
+                    variant="soft",
+                ),
+                align="center",
+                width="100%",
+            ),
+            width="100%",
+        ),
+        width="100%",
+    )
+
+
+def moderation_page() -> rx.Component:
+    return rx.center(
+        rx.vstack(
+            rx.hstack(
+                rx.link(rx.icon("arrow-left"), href="/"),
+                rx.heading("Moderation Queue", size="5"),
+                rx.spacer(),
+                rx.link(rx.icon("timer", size=16), href="/slow-queries"),
+                rx.link(rx.icon("flame", size=16), href="/profile"),
+                (
+                    rx.select(
+                        [str(shard) for shard in range(shards.COUNT)],
+                        value=ModerationState.queue_shard.to_string(),
+                        on_change=ModerationState.set_queue_shard,
+                        size="1",
+                    )
+                    if shards.enabled
+                    else rx.fragment()
+                ),
+                rx.text("Hidden", size="2"),
+                rx.switch(
+                    checked=ModerationState.queue_hidden,
+                    on_change=ModerationState.set_queue_hidden,
+                ),
+                align="center",
+                width="100%",
+            ),
+            rx.cond(
+                State.is_admin,
+                rx.vstack(
+                    rx.cond(
+                        ModerationState.queue,
+                        rx.foreach(ModerationState.queue, queue_entry_view),
+                        rx.text("No flagged posts."),
+                    ),
+                    rx.hstack(
+                        rx.button(
+                            rx.icon("chevron-left"),
+                            on_click=ModerationState.change_queue_page(-1),
+                            disabled=ModerationState.queue_page == 0,
+                            color_scheme="gray",
+                        ),
+                        rx.spacer(),
+                        rx.button(
+                            rx.icon("chevron-right"),
+                            on_click=ModerationState.change_queue_page(1),
+                            disabled=~ModerationState.queue_has_more,
+                            color_scheme="gray",
+                        ),
+                        width="100%",
+                    ),
+                    gap="1em",
+                    width="100%",
+                ),
+                rx.text("Only admins can moderate posts."),
+            ),
+            gap="1em",
+            margin_y="2em",
+            width=["100vw", "75vw", "75vw", "50vw", "50vw"],
+        ),
+        width="100%",
+    )
+
+
+def slow_query_view(q: slowlog.SlowQuery) -> rx.Component:
+    return rx.card(
+        rx.vstack(
+            rx.hstack(
+                rx.badge(q.duration_ms.to_string() + " ms", color_scheme="orange"),
+                rx.text(q.handler, size="2", weight="bold"),
+                rx.spacer(),
+                rx.text(q.ts, size="1"),
+                align="center",
+                width="100%",
+            ),
+            rx.code(q.statement, white_space="pre-wrap", width="100%"),
+            rx.text(q.parameters, size="1", color_scheme="gray"),
+            rx.code(
+                q.plan,
+                white_space="pre",
+                overflow_x="auto",
+                color_scheme="gray",
+                width="100%",
+            ),
+            width="100%",
+        ),
+        width="100%",
+    )
+
+
+def slow_queries_page() -> rx.Component:
+    return rx.center(
+        rx.vstack(
+            rx.hstack(
+                rx.link(rx.icon("arrow-left"), href="/moderation"),
+                rx.heading("Slow Queries", size="5"),
+                rx.spacer(),
+                rx.icon_button(
+                    rx.icon("refresh-cw"),
+                    on_click=SlowQueryState.load_slow_queries,
+                    color_scheme="gray",
+                ),
+                rx.button(
+                    "Clear",
+                    on_click=SlowQueryState.clear_slow_queries,
+                    color_scheme="gray",
+                ),
+                align="center",
+                width="100%",
+            ),
+            rx.cond(
+                State.is_admin,
+                rx.cond(
+                    SlowQueryState.slow_queries,
+                    rx.foreach(SlowQueryState.slow_queries, slow_query_view),
+                    rx.text(
+                        rx.cond(
+                            SlowQueryState.slow_query_log_enabled,
+                            "No slow queries recorded by this worker.",
+                            "Set SLOW_QUERY_MS to record slow queries.",
+                        )
+                    ),
+                ),
+                rx.text("Only admins can view slow queries."),
+            ),
+            gap="1em",
+            margin_y="2em",
+            width=["100vw", "75vw", "75vw", "50vw", "50vw"],
+        ),
+        width="100%",
+    )
+
+
+def profile_page() -> rx.Component:
+    return rx.center(
+        rx.vstack(
+            rx.hstack(
+                rx.link(rx.icon("arrow-left"), href="/moderation"),
+                rx.heading("Profile", size="5"),
+                align="center",
+                width="100%",
+            ),
+            rx.cond(
+                State.is_admin,
+                rx.vstack(
+                    rx.text(
+                        "Samples the stacks of the backend worker serving this page "
+                        "and downloads them as collapsed stacks, for flamegraph.pl "
+                        "or speedscope.",
+                        size="2",
+                    ),
+                    rx.hstack(
+                        rx.segmented_control.root(
+                            *(
+                                rx.segmented_control.item(f"{seconds}s", value=seconds)
+                                for seconds in PROFILE_DURATIONS
+                            ),
+                            value=ProfileState.profile_seconds,
+                            on_change=ProfileState.set_profile_seconds,
+                        ),
+                        rx.button(
+                            "Start Profile",
+                            on_click=ProfileState.run_profile,
+                            loading=ProfileState.profiling,
+                        ),
+                        align="center",
+                    ),
+                    gap="1em",
+                    width="100%",
+                ),
+                rx.text("Only admins can profile the backend."),
+            ),
+            gap="1em",
+            margin_y="2em",
+            width=["100vw", "75vw", "75vw", "50vw", "50vw"],
+        ),
+        width="100%",
+    )
@@ -1,21 +1,21 @@
 """Frontend components for displaying entries."""
 
 import reflex as rx
+from reflex.vars.function import FunctionStringVar
 
-from ..models import Author, Entry
-from ..state import State
+from ..state import FeedAuthor, FeedEntry, State
 
 
-def ban_button(author: Author) -> rx.Component:
-    """The button to ban a user."""
+def ban_button(e: FeedEntry) -> rx.Component:
+    """The button to ban the author of an entry."""
     return rx.cond(
         State.is_admin,
         rx.cond(
-            author.user_info.enabled,
+            State.authors[e.author_id].enabled,
             rx.tooltip(
                 rx.icon_button(
                     rx.icon("user"),
-                    on_click=State.set_enabled(author.user_id, False),
+                    on_click=State.set_enabled(e.author_id, False),
                     color_scheme="green",
                     size="1",
                 ),
@@ -24,7 +24,7 @@ def ban_button(author: Author) -> rx.Component:
             rx.tooltip(
                 rx.icon_button(
                     rx.icon("user_x"),
-                    on_click=State.set_enabled(author.user_id, True),
+                    on_click=State.set_enabled(e.author_id, True),
                     color_scheme="red",
                     size="1",
                 ),
@@ -34,24 +34,38 @@ def ban_button(author: Author) -> rx.Component:
     )
 
 
-def entry_metadata(e: Entry) -> rx.Component:
+def avatar_src(author: FeedAuthor) -> rx.Var:
+    """The cached avatar of the author, falling back to their picture."""
+    return rx.cond(
+        author.avatar,
+        rx.cond(
+            author.avatar.startswith("http"),
+            author.avatar,
+            rx.get_upload_url(author.avatar),
+        ),
+        author.picture,
+    )
+
+
+def entry_metadata(e: FeedEntry) -> rx.Component:
     """Rendered above the entry text and next to the icon."""
+    author = State.authors[e.author_id]
     return rx.hstack(
         rx.avatar(
-            src=e.author.picture,
+            src=avatar_src(author),
             size="1",
-            alt=e.author.name,
+            alt=author.name,
             margin_right="0.5em",
         ),
-        rx.text.strong(e.author.name),
-        ban_button(e.author),
+        rx.text.strong(author.name),
+        ban_button(e),
         rx.spacer(),
         rx.text(e.ts, font_size="0.75em"),
         width="100%",
     )
 
 
-def entry_content(e: Entry) -> rx.Component:
+def entry_content(e: FeedEntry) -> rx.Component:
     """The icon, metadata, and textual content of an entry."""
     return rx.hstack(
         rx.cond(
@@ -70,19 +84,18 @@ def entry_content(e: Entry) -> rx.Component:
     )
 
 
-def like_badge(e: Entry) -> rx.Component:
+def like_badge(e: FeedEntry) -> rx.Component:
     """The badge for the like count."""
-    entry_flags = State.entry_flag_counts[e.id.to(str)]
-    user_flags = State.user_entry_flags[e.id.to(str)]
+    reactions = State.reactions[e.id]
     children = [
         rx.icon("heart"),
         rx.cond(
-            entry_flags & entry_flags["like"],
-            rx.text(entry_flags["like"]),
+            reactions.likes,
+            rx.text(reactions.likes),
         ),
     ]
     return rx.cond(
-        user_flags & user_flags["like"],
+        reactions.liked,
         rx.tooltip(
             rx.button(
                 *children,
@@ -104,16 +117,15 @@ def like_badge(e: Entry) -> rx.Component:
     )
 
 
-def flag_badge(e: Entry) -> rx.Component:
+def flag_badge(e: FeedEntry) -> rx.Component:
     """The badge for the flag count."""
-    entry_flags = State.entry_flag_counts[e.id.to(str)]
-    user_flags = State.user_entry_flags[e.id.to(str)]
+    reactions = State.reactions[e.id]
     flag_count = rx.cond(
-        State.is_admin & entry_flags & entry_flags["flag"],
-        rx.text(entry_flags["flag"]),
+        State.is_admin & reactions.flags,
+        rx.text(reactions.flags),
     )
     return rx.cond(
-        user_flags & user_flags["flag"] | entry_flags & entry_flags["flag"],
+        reactions.flagged | reactions.flags,
         rx.tooltip(
             rx.button(
                 rx.icon("flag", color="red"),
@@ -155,7 +167,7 @@ def flag_badge(e: Entry) -> rx.Component:
     )
 
 
-def trash_badge(e: Entry) -> rx.Component:
+def trash_badge(e: FeedEntry) -> rx.Component:
     """The badge for the delete button."""
     return rx.cond(
         State.is_admin,
@@ -171,7 +183,7 @@ def trash_badge(e: Entry) -> rx.Component:
     )
 
 
-def entry_footer(e: Entry) -> rx.Component:
+def entry_footer(e: FeedEntry) -> rx.Component:
     return rx.hstack(
         like_badge(e),
         rx.spacer(),
@@ -181,18 +193,63 @@ def entry_footer(e: Entry) -> rx.Component:
     )
 
 
-def entry_view(e: Entry) -> rx.Component:
+def _upload_src(path: rx.Var[str]) -> rx.Var[str]:
+    """Url of a file in the bucket (stored as a full url) or the upload dir."""
+    return rx.cond(path.startswith("http"), path, rx.get_upload_url(path))
+
+
+def _media_props(e: FeedEntry) -> dict:
+    """Take up the final size of the image while it loads."""
+    return dict(
+        width="100%",
+        # Entries from before the dimensions were stored take up no space.
+        aspect_ratio=rx.cond(
+            e.image_width,
+            e.image_width.to_string() + " / " + e.image_height.to_string(),
+            "auto",
+        ),
+        # Defined in `assets/placeholder.js`, which may not have loaded yet.
+        background_image=FunctionStringVar.create("window.rxShoutPlaceholder?.").call(
+            e.image_placeholder
+        ),
+        background_size="cover",
+        custom_attrs={"data-placeholder": ""},
+    )
+
+
+def entry_image(e: FeedEntry) -> rx.Component:
+    """The image of an entry, loaded once it is scrolled into view."""
+    return rx.image(
+        src=_upload_src(e.image),
+        loading="lazy",
+        decoding="async",
+        **_media_props(e),
+    )
+
+
+def entry_video(e: FeedEntry) -> rx.Component:
+    """An animated GIF as video, falling back to the GIF itself."""
+    return rx.el.video(
+        rx.el.source(src=_upload_src(e.video), type="video/mp4"),
+        entry_image(e),
+        auto_play=True,
+        muted=True,
+        loop=True,
+        plays_inline=True,
+        preload="metadata",
+        **_media_props(e),
+    )
+
+
+def entry_view(e: FeedEntry) -> rx.Component:
     """The entire entry, including the image if present."""
     return rx.card(
         rx.vstack(
             entry_content(e),
             rx.cond(
-                e.image,
-                rx.cond(
-                    e.image.startswith("http"),
-                    rx.image(src=e.image, width="100%"),
-                    rx.image(src=rx.get_upload_url(e.image), width="100%"),
-                ),
+                e.video,
+                entry_video(e),
+                rx.cond(e.image, entry_image(e)),
             ),
             entry_footer(e),
         ),
@@ -1,26 +1,41 @@
 """Frontend components for handling image upload."""
 
-import uuid
-from pathlib import Path
+import functools
+import json
 
 import reflex as rx
+from reflex.components.core.upload import Upload
 
-from ..state import State, UPLOAD_ID
+from .. import drain, imageinfo, metrics, s3, storage, video
+from ..state import DRAINING_MESSAGE, RATE_LIMITED_MESSAGE, State, UPLOAD_ID
+from ..storage import ACCEPTED_IMAGE_TYPES, MAX_FILE_SIZE, MAX_IMAGE_DIMENSION
 
 
-MAX_FILE_SIZE = 5 * 1024**2  # 5 MB
+# The file input used when uploading directly to the S3 bucket.
+DIRECT_UPLOAD_INPUT_ID = "direct_upload_image"
+
+
+class ResizingUpload(Upload):
+    """An upload dropzone that can transform files before they are accepted."""
+
+    # react-dropzone's `getFilesFromEvent`, returning the (resized) files.
+    get_files_from_event: rx.Var[rx.vars.FunctionVar]
 
 
 class UploadProgressState(rx.State):
     upload_progress: int
     is_uploading: bool = False
     is_cancelled: bool = False
+    # Direct uploads to the bucket do not report progress to the backend.
+    is_direct: bool = False
 
     @rx.event
+    @metrics.instrument
     def set_is_cancelled(self, value: bool):
         self.is_cancelled = value
 
     @rx.event
+    @metrics.instrument
     def on_upload_progress(self, prog: dict):
         """Handle interim progress updates while waiting for upload."""
         if not self.is_cancelled and prog["progress"] < 1:
@@ -30,6 +45,7 @@ class UploadProgressState(rx.State):
         self.upload_progress = round(prog["progress"] * 100)
 
     @rx.event
+    @metrics.instrument
     def cancel_upload(self, upload_id: str):
         """Cancel the upload before it is complete."""
         self.is_cancelled = True
@@ -40,7 +56,11 @@ class UploadProgressState(rx.State):
 class UploadState(State):
     """State for handling file uploads."""
 
+    # Key reserved by the presigned POST of a pending direct upload.
+    _direct_upload_key: str = ""
+
     @rx.event
+    @metrics.instrument
     async def handle_upload(self, files: list[rx.UploadFile] = []):
         """Write the file bytes to disk and update the filename in base state."""
         if not self._is_valid_user():
@@ -50,12 +70,28 @@ class UploadState(State):
             return
         yield rx.clear_selected_files(UPLOAD_ID)
         try:
+            if await self._is_rate_limited("upload"):
+                yield rx.toast(RATE_LIMITED_MESSAGE)
+                return
+            if drain.draining:
+                yield rx.toast(DRAINING_MESSAGE)
+                return
             for file in files:
                 upload_data = await file.read()
-                filename = f"{uuid.uuid4()}_{file.name}"
-                outfile = rx.get_upload_dir() / filename
+                filename = storage.new_upload_path(file.name)
+                outfile = storage.upload_path(filename)
                 outfile.parent.mkdir(parents=True, exist_ok=True)
-                outfile.write_bytes(upload_data)
+                await drain.shielded(
+                    rx._x.run_in_thread(
+                        functools.partial(outfile.write_bytes, upload_data)
+                    )
+                )
+                self._image_info = await rx._x.run_in_thread(
+                    functools.partial(imageinfo.inspect, upload_data)
+                )
+                self._video_relative_path = await drain.shielded(
+                    video.transcode(upload_data, filename)
+                )
                 self.image_relative_path = filename
                 break  # only allow one upload
         finally:
@@ -63,19 +99,109 @@ class UploadState(State):
             progress_state.is_uploading = False
 
     @rx.event
-    def delete_uploaded_image(self):
+    @metrics.instrument
+    async def request_direct_upload(self, file_info: dict | None):
+        """Issue a presigned POST for the file selected in the browser."""
+        if not self._is_valid_user() or not file_info or not s3.direct_upload:
+            return
+        if await self._is_rate_limited("upload"):
+            return rx.toast(RATE_LIMITED_MESSAGE)
+        if drain.draining:
+            return rx.toast(DRAINING_MESSAGE)
+        content_type = file_info.get("type", "")
+        if content_type not in ACCEPTED_IMAGE_TYPES or not (
+            0 < int(file_info.get("size", 0)) <= MAX_FILE_SIZE
+        ):
+            return rx.toast("File size too large or invalid format")
+        key = storage.new_upload_path(file_info.get("name") or "image")
+        post = await rx._x.run_in_thread(
+            functools.partial(s3.presigned_post, key, content_type, MAX_FILE_SIZE)
+        )
+        self._direct_upload_key = key
+        progress_state = await self.get_state(UploadProgressState)
+        progress_state.is_uploading = True
+        progress_state.is_direct = True
+        return rx.call_script(
+            f"rxShoutDirectUpload({json.dumps(post)})",
+            callback=UploadState.finish_direct_upload,
+        )
+
+    @rx.event
+    @metrics.instrument
+    async def finish_direct_upload(self, result: dict | None):
+        """Verify that the browser's upload landed in the bucket."""
+        key, self._direct_upload_key = self._direct_upload_key, ""
+        progress_state = await self.get_state(UploadProgressState)
+        progress_state.is_uploading = False
+        progress_state.is_direct = False
+        if not key or not result or not result.get("ok"):
+            return rx.toast("Upload failed, please try again.")
+        size = await rx._x.run_in_thread(functools.partial(s3.object_size, key))
+        if not size or size > MAX_FILE_SIZE:
+            return rx.toast("Upload failed, please try again.")
+        # The header has the dimensions, the whole image is only read for a
+        # placeholder or to transcode a GIF.
+        upload_data = await rx._x.run_in_thread(
+            functools.partial(s3.read_object, key, imageinfo.HEADER_BYTES)
+        )
+        if len(upload_data) < size and (
+            imageinfo.has_placeholders
+            or (video.enabled and upload_data.startswith(b"GIF"))
+            or imageinfo.image_size(upload_data) is None
+        ):
+            upload_data = await rx._x.run_in_thread(
+                functools.partial(s3.read_object, key)
+            )
+        self._image_info = await rx._x.run_in_thread(
+            functools.partial(imageinfo.inspect, upload_data)
+        )
+        self._video_relative_path = await drain.shielded(
+            video.transcode(upload_data, key)
+        )
+        self.image_relative_path = key
+        self.image_in_bucket = True
+
+    @rx.var
+    def direct_upload_enabled(self) -> bool:
+        # Decided by the backend, the frontend is compiled without S3 settings.
+        return s3.direct_upload
+
+    @rx.var
+    def image_bucket_url(self) -> str:
+        if self.image_in_bucket and self.image_relative_path:
+            return s3.public_url(self.image_relative_path)
+        return ""
+
+    @rx.event
+    @metrics.instrument
+    async def delete_uploaded_image(self):
         """If the user wants to delete the image before making a post."""
         if self.image_relative_path:
-            try:
-                (Path(rx.get_upload_dir()) / self.image_relative_path).unlink()
-            except FileNotFoundError:
-                pass
+            if self.image_in_bucket:
+                await rx._x.run_in_thread(
+                    functools.partial(s3.delete_object, self.image_relative_path)
+                )
+            else:
+                try:
+                    storage.upload_path(self.image_relative_path).unlink()
+                except FileNotFoundError:
+                    pass
+            if self._video_relative_path:
+                storage.upload_path(self._video_relative_path).unlink(missing_ok=True)
             self.image_relative_path = ""
+            self.image_in_bucket = False
+            self._image_info = None
+            self._video_relative_path = ""
 
 
 def upload_form() -> rx.Component:
     """The dropzone and button for selecting an image to upload."""
-    return rx.upload.root(
+    resize_props = {}
+    if MAX_IMAGE_DIMENSION:
+        resize_props["get_files_from_event"] = rx.Var(
+            f"((event) => window.rxShoutFilesFromEvent(event, {MAX_IMAGE_DIMENSION}))"
+        )
+    return ResizingUpload.create(
         rx.vstack(
             rx.button(
                 "Select or Drop Image",
@@ -89,12 +215,7 @@ def upload_form() -> rx.Component:
         ),
         id=UPLOAD_ID,
         multiple=False,
-        accept={
-            "image/png": [".png"],
-            "image/jpeg": [".jpg", ".jpeg"],
-            "image/gif": [".gif"],
-            "image/webp": [".webp"],
-        },
+        accept=ACCEPTED_IMAGE_TYPES,
         max_size=MAX_FILE_SIZE,
         on_drop=[
             UploadProgressState.set_is_cancelled(False),
@@ -119,6 +240,37 @@ def upload_form() -> rx.Component:
                 },
             }
         ),
+        **resize_props,
+    )
+
+
+def direct_upload_form() -> rx.Component:
+    """Select an image and upload it straight to the S3 bucket."""
+    return rx.vstack(
+        rx.script(src="/direct_upload.js"),
+        rx.el.input(
+            type="file",
+            id=DIRECT_UPLOAD_INPUT_ID,
+            accept=",".join(ACCEPTED_IMAGE_TYPES),
+            display="none",
+            on_change=rx.call_script(
+                f"rxShoutSelectedFile({json.dumps(DIRECT_UPLOAD_INPUT_ID)}, "
+                f"{MAX_IMAGE_DIMENSION})",
+                callback=UploadState.request_direct_upload,
+            ),
+        ),
+        rx.button(
+            "Select Image",
+            rx.icon("image", size=20),
+            type="button",
+            on_click=rx.call_script(
+                f"document.getElementById({json.dumps(DIRECT_UPLOAD_INPUT_ID)}).click()"
+            ),
+        ),
+        align="center",
+        border=f"1px dashed {rx.color("gray", 8, alpha=True)}",
+        padding="1em",
+        width="100%",
     )
 
 
@@ -141,7 +293,11 @@ def uploaded_image_view() -> rx.Component:
             box_shadow="rgba(0, 0, 0, 0.3) 1px 3px 5px",
         ),
         rx.image(
-            src=rx.get_upload_url(UploadState.image_relative_path),
+            src=rx.cond(
+                UploadState.image_in_bucket,
+                UploadState.image_bucket_url,
+                rx.get_upload_url(UploadState.image_relative_path),
+            ),
             height="15em",
         ),
         # ensure circle_x is positioned relative to the box
@@ -151,12 +307,25 @@ def uploaded_image_view() -> rx.Component:
 
 def image_upload_component() -> rx.Component:
     """A component for selecting an image, uploading it, and displaying a preview."""
-    return rx.cond(
-        UploadState.image_relative_path,
-        uploaded_image_view(),  # Upload complete
+    return rx.fragment(
+        rx.script(src="/upload_resize.js"),
         rx.cond(
-            UploadProgressState.is_uploading,
-            rx.progress(value=UploadProgressState.upload_progress, flex_grow="1"),
-            upload_form(),
+            UploadState.image_relative_path,
+            uploaded_image_view(),  # Upload complete
+            rx.cond(
+                UploadProgressState.is_uploading,
+                rx.cond(
+                    UploadProgressState.is_direct,
+                    rx.progress(flex_grow="1"),
+                    rx.progress(
+                        value=UploadProgressState.upload_progress, flex_grow="1"
+                    ),
+                ),
+                rx.cond(
+                    UploadState.direct_upload_enabled,
+                    direct_upload_form(),
+                    upload_form(),
+                ),
+            ),
         ),
     )
@@ -0,0 +1,139 @@
+"""Search box and results for finding entries."""
+
+from typing import Any
+
+import reflex as rx
+
+from .. import metrics, search, shards
+from ..models import Entry
+from ..state import FeedEntry, State
+from .entry import entry_content
+
+
+class SearchState(State):
+    """Ranked, paginated full-text search over entries."""
+
+    search_query: str = ""
+    search_all_topics: bool = False
+    search_results: list[FeedEntry] = []
+    search_page: int = 0
+    search_has_more: bool = False
+
+    @rx.event
+    @metrics.instrument
+    async def handle_search(self, form_data: dict[str, Any]):
+        """Start a new search from the search form."""
+        self.search_query = form_data.get("search_query", "").strip()
+        # Searching across all topics is reserved for admins.
+        self.search_all_topics = self.is_admin and bool(form_data.get("all_topics"))
+        self.search_page = 0
+        await self._run_search()
+
+    @rx.event
+    @metrics.instrument
+    async def change_page(self, delta: int):
+        self.search_page = max(0, self.search_page + delta)
+        await self._run_search()
+
+    @rx.event
+    @metrics.instrument
+    def clear_search(self):
+        self._author_ids = {
+            view: ids for view, ids in self._author_ids.items() if view != "search"
+        }
+        self.search_query = ""
+        self.search_results = []
+        self.search_page = 0
+        self.search_has_more = False
+
+    async def _run_search(self):
+        if not self.search_query:
+            self.clear_search()
+            return
+        # Only the topics stored with the current one are searched, even with
+        # `search_all_topics`, see `rx_shout.shards`.
+        async with shards.topic_asession(self.topic_name) as asession:
+            # Fetch one extra id to find out whether there is a next page.
+            ids = await search.search_entry_ids(
+                asession,
+                self.search_query,
+                topic_id=self.topic.id if self.topic else None,
+                all_topics=self.search_all_topics,
+                limit=search.PAGE_SIZE + 1,
+                offset=self.search_page * search.PAGE_SIZE,
+            )
+            self.search_has_more = len(ids) > search.PAGE_SIZE
+            ids = ids[: search.PAGE_SIZE]
+            rank = {entry_id: ix for ix, entry_id in enumerate(ids)}
+            rows, _ = await self._load_feed(
+                asession, Entry.id.in_(ids), view="search"
+            )
+        self.search_results = sorted(rows, key=lambda row: rank[row.id])
+
+
+def search_form() -> rx.Component:
+    """The search input, with a global scope toggle for admins."""
+    return rx.form(
+        rx.hstack(
+            rx.input(
+                rx.input.slot(rx.icon("search", size=20)),
+                placeholder="Search posts...",
+                id="search_query",
+                width="100%",
+            ),
+            rx.cond(
+                State.is_admin,
+                rx.tooltip(
+                    rx.checkbox(name="all_topics"),
+                    content="Search all topics",
+                ),
+            ),
+            rx.cond(
+                SearchState.search_query,
+                rx.icon_button(
+                    rx.icon("x"),
+                    on_click=[SearchState.clear_search, rx.set_value("search_query", "")],
+                    color_scheme="gray",
+                    type="button",
+                ),
+            ),
+            align="center",
+            width="100%",
+        ),
+        on_submit=SearchState.handle_search,
+        width="100%",
+    )
+
+
+def search_result_view(e: FeedEntry) -> rx.Component:
+    return rx.card(entry_content(e), width="100%")
+
+
+def search_results() -> rx.Component:
+    """One page of search results with paging controls."""
+    return rx.vstack(
+        rx.cond(
+            SearchState.search_results,
+            rx.foreach(SearchState.search_results, search_result_view),
+            rx.text("No matching posts."),
+        ),
+        rx.hstack(
+            rx.button(
+                rx.icon("chevron-left"),
+                on_click=SearchState.change_page(-1),
+                disabled=SearchState.search_page == 0,
+                color_scheme="gray",
+            ),
+            rx.spacer(),
+            rx.button(
+                rx.icon("chevron-right"),
+                on_click=SearchState.change_page(1),
+                disabled=~SearchState.search_has_more,
+                color_scheme="gray",
+            ),
+            width="100%",
+        ),
+        gap="1em",
+        margin_y="2em",
+        width="100%",
+    )
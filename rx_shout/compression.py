@@ -0,0 +1,104 @@
+"""Compression of the serialized state stored in redis.
+
+Every substate of every client is pickled into its own redis key. Feeds
+pickle to tens of kilobytes of mostly repeated names and markup, which
+compress several times over. With ``STATE_COMPRESSION`` set to `zlib` (the
+default) or `zstd` (Python 3.14+), substates larger than
+``STATE_COMPRESSION_MIN_BYTES`` (default 1024) are compressed; `off` stores
+plain pickles as reflex does.
+
+Reflex unpickles every substate with `BaseState._deserialize`, which can't be
+overridden per state class. Instead, a compressed substate is stored as a
+tiny pickle that decompresses and unpickles the real one when it is loaded,
+so compressed and plain substates can be read with any setting.
+"""
+
+import io
+import os
+import pickle
+import zlib
+
+STATE_COMPRESSION = os.environ.get("STATE_COMPRESSION", "zlib")
+CODECS = ("off", "zlib", "zstd")
+STATE_COMPRESSION_MIN_BYTES = int(
+    os.environ.get("STATE_COMPRESSION_MIN_BYTES", "1024")
+)
+ZLIB_LEVEL = 6
+
+
+def _zstd():
+    # Only in the standard library since Python 3.14.
+    from compression import zstd
+
+    return zstd
+
+
+# Fail when the app starts rather than on the first large state.
+if STATE_COMPRESSION not in CODECS:
+    raise ValueError(f"STATE_COMPRESSION must be one of {', '.join(CODECS)}.")
+if STATE_COMPRESSION == "zstd":
+    try:
+        _zstd()
+    except ImportError:
+        raise ValueError("STATE_COMPRESSION=zstd requires Python 3.14.") from None
+
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return _zstd().compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return _zstd().decompress(data)
+    return zlib.decompress(data)
+
+
+def inflate(codec: str, data: bytes):
+    """Unpickle a compressed payload, called by pickle when loading one."""
+    return pickle.loads(_decompress(codec, data))
+
+
+class _Compressed:
+    __slots__ = ("codec", "data")
+
+    def __init__(self, codec: str, data: bytes):
+        self.codec = codec
+        self.data = data
+
+    def __reduce__(self):
+        return inflate, (self.codec, self.data)
+
+
+def compress(payload: bytes, codec: str = STATE_COMPRESSION) -> bytes:
+    """Compress a pickle, so that unpickling the result returns the same."""
+    if codec == "off" or len(payload) < STATE_COMPRESSION_MIN_BYTES:
+        return payload
+    compressed = pickle.dumps(
+        _Compressed(codec, _compress(codec, payload)),
+        protocol=pickle.HIGHEST_PROTOCOL,
+    )
+    return compressed if len(compressed) < len(payload) else payload
+
+
+class _RawSize(int):
+    pass
+
+
+class _SizeUnpickler(pickle.Unpickler):
+    """Decompresses payloads written by `compress`, refusing anything else."""
+
+    def find_class(self, module: str, name: str):
+        if (module, name) == (__name__, "inflate"):
+            return lambda codec, data: _RawSize(len(_decompress(codec, data)))
+        raise pickle.UnpicklingError(f"{module}.{name} is not loaded")
+
+
+def raw_size(payload: bytes) -> int:
+    """Size of the pickle before it was compressed, without unpickling it."""
+    try:
+        size = _SizeUnpickler(io.BytesIO(payload)).load()
+    except pickle.UnpicklingError:
+        return len(payload)
+    return int(size) if isinstance(size, _RawSize) else len(payload)
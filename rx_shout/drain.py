@@ -0,0 +1,36 @@
+"""Let in-flight writes finish when a backend worker is asked to stop.
+
+Writes that must not be lost (posting an entry, storing an upload) run through
+`shielded`, which keeps them running even if the websocket that triggered
+them goes away. On shutdown, the `lifespan` task flags the worker as draining
+so new writes are refused, then waits up to ``DRAIN_TIMEOUT`` seconds for the
+shielded writes to complete.
+"""
+
+import asyncio
+import contextlib
+import os
+from typing import Awaitable, TypeVar
+
+T = TypeVar("T")
+
+timeout = float(os.environ.get("DRAIN_TIMEOUT", "25"))
+draining = False
+_inflight: set[asyncio.Future] = set()
+
+
+async def shielded(aw: Awaitable[T]) -> T:
+    """Await `aw`, protecting it from cancellation of the caller."""
+    task = asyncio.ensure_future(aw)
+    _inflight.add(task)
+    task.add_done_callback(_inflight.discard)
+    return await asyncio.shield(task)
+
+
+@contextlib.asynccontextmanager
+async def lifespan():
+    global draining
+    yield
+    draining = True
+    if _inflight:
+        await asyncio.wait(list(_inflight), timeout=timeout)
@@ -0,0 +1,209 @@
+"""Cached verification of Google ID tokens.
+
+`GoogleAuthState.tokeninfo` verifies the ID token every time it is computed,
+which happens on nearly every event through `token_is_valid`, `is_admin` and
+`_is_valid_user`. `install` swaps in a verifier that remembers the claims of
+each valid token (by hash) until the token's `exp`, so repeat checks are a
+dict lookup.
+
+Google's signing keys are kept in memory and persisted to
+``GOOGLE_CERTS_CACHE`` (default `data/google_certs.json`). The `lifespan` task
+loads them before the worker serves clients, fetching them if there is no
+cache. Afterwards they are refreshed in a background thread every
+``GOOGLE_CERTS_REFRESH_SECONDS``, so verification rarely waits on the network
+inside the event loop. Only a token signed with an unknown key, as happens
+when Google rotates its keys, waits for a refresh: the one in flight, or a new
+one at most once a minute, after which the token is checked again. If the key
+endpoint (``GOOGLE_CERTS_URL``) is unreachable, the last known keys stay in
+use.
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+CERTS_URL = os.environ.get(
+    "GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs"
+)
+CERTS_CACHE = Path(os.environ.get("GOOGLE_CERTS_CACHE", "data/google_certs.json"))
+CERTS_REFRESH_SECONDS = float(os.environ.get("GOOGLE_CERTS_REFRESH_SECONDS", "3600"))
+ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+MAX_CACHED_TOKENS = 10_000
+
+
+class KeySet:
+    """Google's token signing certificates, keyed by key id."""
+
+    def __init__(self, url: str, cache_path: Path):
+        self.url = url
+        self.cache_path = cache_path
+        self.certs: dict[str, str] = {}
+        self.fetched_at = 0.0
+        self._retry_at = 0.0
+        self._unknown_key_retry_at = 0.0
+        self._refreshing = threading.Lock()
+
+    def get(self) -> dict[str, str]:
+        """The known certificates, refreshed in the background when stale."""
+        if not self.certs:
+            self._load_cache()
+        if not self.certs or time.time() - self.fetched_at > CERTS_REFRESH_SECONDS:
+            self.refresh_in_background()
+        return self.certs
+
+    def refresh_in_background(self) -> None:
+        """Start a refresh in a thread, at most once a minute."""
+        now = time.time()
+        if now > self._retry_at and not self._refreshing.locked():
+            self._retry_at = now + 60
+            threading.Thread(target=self._refresh_quietly, daemon=True).start()
+
+    def refresh(self) -> None:
+        """Fetch the current certificates and persist them, blocking."""
+        with self._refreshing:
+            self._fetch()
+
+    def refresh_for_unknown_key(self, certs: dict[str, str]) -> bool:
+        """Refresh for a token signed with a key that is not in `certs`.
+
+        Waits for a refresh in flight, or else fetches, at most once a minute.
+        Returns whether the certificates are newer than `certs`.
+        """
+        if not self._refreshing.acquire(timeout=5):
+            return False
+        try:
+            now = time.time()
+            if self.certs is certs and now > self._unknown_key_retry_at:
+                self._unknown_key_retry_at = now + 60
+                try:
+                    self._fetch()
+                except Exception as exc:
+                    logger.warning("Could not refresh Google certs: %r", exc)
+            return self.certs is not certs
+        finally:
+            self._refreshing.release()
+
+    async def arefresh(self) -> None:
+        """Fetch the current certificates and persist them."""
+        async with httpx.AsyncClient(timeout=5) as client:
+            response = await client.get(self.url)
+        response.raise_for_status()
+        self._store(response.json())
+
+    def _fetch(self) -> None:
+        response = httpx.get(self.url, timeout=5)
+        response.raise_for_status()
+        self._store(response.json())
+
+    def _store(self, certs: dict[str, str]) -> None:
+        self.certs = certs
+        self.fetched_at = time.time()
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_path.with_suffix(".tmp")
+            tmp_path.write_text(
+                json.dumps({"fetched_at": self.fetched_at, "certs": self.certs})
+            )
+            tmp_path.replace(self.cache_path)
+        except OSError as exc:
+            logger.warning("Could not persist Google certs: %r", exc)
+
+    def _refresh_quietly(self) -> None:
+        try:
+            self.refresh()
+        except Exception as exc:
+            logger.warning("Using cached Google certs, refresh failed: %r", exc)
+
+    def _load_cache(self) -> None:
+        try:
+            cached = json.loads(self.cache_path.read_text())
+        except (OSError, ValueError):
+            return
+        self.certs = cached["certs"]
+        self.fetched_at = cached["fetched_at"]
+
+
+keyset = KeySet(CERTS_URL, CERTS_CACHE)
+_verified: dict[str, dict] = {}
+
+
+@contextlib.asynccontextmanager
+async def lifespan():
+    keyset._load_cache()
+    if not keyset.certs:
+        try:
+            await keyset.arefresh()
+        except Exception as exc:
+            logger.warning("Could not fetch Google certs: %r", exc)
+    yield
+
+
+def verify_oauth2_token(id_token, request=None, audience=None, clock_skew_in_seconds=0):
+    """Drop-in replacement for `google.oauth2.id_token.verify_oauth2_token`."""
+    from google.auth import exceptions, jwt
+
+    if isinstance(id_token, str):
+        id_token = id_token.encode()
+    key = hashlib.sha256(id_token + f"|{audience}".encode()).hexdigest()
+    claims = _verified.get(key)
+    if claims is not None:
+        if claims["exp"] + clock_skew_in_seconds > time.time():
+            return claims
+        del _verified[key]
+
+    certs = keyset.get()
+    try:
+        claims = jwt.decode(
+            id_token,
+            certs=certs,
+            audience=audience,
+            clock_skew_in_seconds=clock_skew_in_seconds,
+        )
+    except ValueError as exc:
+        # Signed with a key we have not seen yet, Google may have rotated
+        # keys. Check again with the refreshed ones.
+        if "Certificate for key id" not in str(exc):
+            raise
+        if not keyset.refresh_for_unknown_key(certs):
+            raise
+        claims = jwt.decode(
+            id_token,
+            certs=keyset.certs,
+            audience=audience,
+            clock_skew_in_seconds=clock_skew_in_seconds,
+        )
+    if claims["iss"] not in ISSUERS:
+        raise exceptions.GoogleAuthError(
+            f"Wrong issuer. 'iss' should be one of the following: {ISSUERS}"
+        )
+
+    if len(_verified) >= MAX_CACHED_TOKENS:
+        now = time.time()
+        for cached_key, cached in list(_verified.items()):
+            if cached["exp"] <= now:
+                del _verified[cached_key]
+        while len(_verified) >= MAX_CACHED_TOKENS:
+            del _verified[next(iter(_verified))]
+    _verified[key] = claims
+    return claims
+
+
+def install() -> None:
+    """Use the cached verifier for `reflex_google_auth`."""
+    import reflex_google_auth  # noqa: F401
+
+    for name, module in list(sys.modules.items()):
+        if name.startswith("reflex_google_auth") and hasattr(
+            module, "verify_oauth2_token"
+        ):
+            module.verify_oauth2_token = verify_oauth2_token
@@ -0,0 +1,273 @@
+"""Dimensions and blurred placeholders of uploaded images.
+
+The feed reserves the space of each image from its stored dimensions, and
+shows a blurred preview, encoded as a short BlurHash string, until the image
+is loaded (see `assets/placeholder.js`).
+
+Dimensions are read from the image header, placeholders are only computed
+when Pillow is installed. Fill them in for existing entries with:
+
+    python -m rx_shout.imageinfo
+"""
+
+import argparse
+import dataclasses
+import importlib.util
+import io
+import logging
+import math
+import struct
+
+import httpx
+import reflex as rx
+import sqlalchemy
+from sqlalchemy.engine import Connection
+
+from . import storage
+from .models import Entry
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+# Bytes holding the dimensions of nearly all images, unless a JPEG has large
+# metadata before its frame header.
+HEADER_BYTES = 16 * 1024
+# Placeholders need the whole image, dimensions only its header.
+has_placeholders = importlib.util.find_spec("PIL") is not None
+# Horizontal and vertical detail of the placeholder, 28 characters in total.
+PLACEHOLDER_COMPONENTS = (4, 3)
+_BASE83 = (
+    "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+)
+# JPEG start of frame markers, which carry the dimensions.
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class ImageInfo:
+    width: int
+    height: int
+    placeholder: str = ""
+
+
+def _jpeg_orientation(exif: bytes) -> int:
+    """The EXIF orientation tag, 1 (upright) if it is missing."""
+    if not exif.startswith(b"Exif\0\0") or len(exif) < 14:
+        return 1
+    tiff = exif[6:]
+    endian = "<" if tiff[:2] == b"II" else ">"
+    (offset,) = struct.unpack(endian + "I", tiff[4:8])
+    if offset + 2 > len(tiff):
+        return 1
+    (count,) = struct.unpack(endian + "H", tiff[offset : offset + 2])
+    for n in range(count):
+        entry = tiff[offset + 2 + n * 12 : offset + 14 + n * 12]
+        if len(entry) < 12:
+            break
+        tag, _, _ = struct.unpack(endian + "HHI", entry[:8])
+        if tag == 0x0112:
+            return struct.unpack(endian + "H", entry[8:10])[0]
+    return 1
+
+
+def image_size(data: bytes) -> tuple[int, int] | None:
+    """Width and height of a PNG, GIF, WebP or JPEG image, as displayed."""
+    if data.startswith(b"\x89PNG\r\n\x1a\n") and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        return struct.unpack("<HH", data[6:10])
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", data[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            (bits,) = struct.unpack("<I", data[21:25])
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            return (
+                int.from_bytes(data[24:27], "little") + 1,
+                int.from_bytes(data[27:30], "little") + 1,
+            )
+        return None
+    if data[:2] != b"\xff\xd8":
+        return None
+    orientation = 1
+    ix = 2
+    while ix + 4 <= len(data):
+        if data[ix] != 0xFF:
+            return None
+        marker = data[ix + 1]
+        if marker == 0xFF:
+            # Fill byte before the marker.
+            ix += 1
+            continue
+        (length,) = struct.unpack(">H", data[ix + 2 : ix + 4])
+        if marker == 0xE1:
+            orientation = _jpeg_orientation(data[ix + 4 : ix + 2 + length])
+        elif marker in _JPEG_SOF and ix + 9 <= len(data):
+            height, width = struct.unpack(">HH", data[ix + 5 : ix + 9])
+            # Orientations 5 to 8 are rotated by 90 degrees when displayed.
+            return (height, width) if orientation >= 5 else (width, height)
+        ix += 2 + length
+    return None
+
+
+def _encode83(value: int, length: int) -> str:
+    return "".join(
+        _BASE83[value // 83 ** (length - n - 1) % 83] for n in range(length)
+    )
+
+
+def _to_linear(value: int) -> float:
+    value /= 255
+    return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+
+
+def _to_srgb(value: float) -> int:
+    value = min(max(value, 0), 1)
+    if value <= 0.0031308:
+        return round(value * 12.92 * 255)
+    return round((1.055 * value ** (1 / 2.4) - 0.055) * 255)
+
+
+def placeholder(data: bytes) -> str:
+    """A BlurHash of the image, empty if Pillow is not installed."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return ""
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        # A few hundred pixels are plenty for a handful of components.
+        image.thumbnail((32, 32))
+        width, height = image.size
+        raw = image.tobytes()
+    pixels = [tuple(map(_to_linear, raw[ix : ix + 3])) for ix in range(0, len(raw), 3)]
+    nx, ny = PLACEHOLDER_COMPONENTS
+    factors = []
+    for j in range(ny):
+        for i in range(nx):
+            norm = 1 if i == 0 and j == 0 else 2
+            total = [0.0, 0.0, 0.0]
+            for y in range(height):
+                cos_y = math.cos(math.pi * j * y / height)
+                for x in range(width):
+                    basis = norm * math.cos(math.pi * i * x / width) * cos_y
+                    pixel = pixels[y * width + x]
+                    for c in range(3):
+                        total[c] += basis * pixel[c]
+            factors.append([value / (width * height) for value in total])
+    dc, ac = factors[0], factors[1:]
+    max_ac = max((abs(value) for factor in ac for value in factor), default=0)
+    quantized_max = min(82, max(0, math.floor(max_ac * 166 - 0.5)))
+    max_value = (quantized_max + 1) / 166
+
+    def quantize(value: float) -> int:
+        scaled = math.copysign(abs(value / max_value) ** 0.5, value)
+        return min(18, max(0, math.floor(scaled * 9 + 9.5)))
+
+    return (
+        _encode83((nx - 1) + (ny - 1) * 9, 1)
+        + _encode83(quantized_max, 1)
+        + _encode83(
+            (_to_srgb(dc[0]) << 16) + (_to_srgb(dc[1]) << 8) + _to_srgb(dc[2]), 4
+        )
+        + "".join(
+            _encode83(
+                quantize(r) * 19 * 19 + quantize(g) * 19 + quantize(b), 2
+            )
+            for r, g, b in ac
+        )
+    )
+
+
+def inspect(data: bytes) -> ImageInfo | None:
+    """Dimensions and placeholder of the image, None if it can't be read."""
+    size = image_size(data)
+    if size is None or not all(size):
+        return None
+    try:
+        preview = placeholder(data)
+    except Exception as exc:
+        logger.warning("Could not compute image placeholder: %r", exc)
+        preview = ""
+    return ImageInfo(width=size[0], height=size[1], placeholder=preview)
+
+
+def _read_image(image: str) -> bytes:
+    """The bytes of a stored `Entry.image`."""
+    if image.startswith("http"):
+        response = httpx.get(image, timeout=10, follow_redirects=True)
+        response.raise_for_status()
+        return response.content
+    return storage.upload_path(image).read_bytes()
+
+
+def backfill(conn: Connection, batch_size: int = BATCH_SIZE) -> int:
+    """Store the dimensions of all entries with an image but none stored.
+
+    Each batch is committed as it is done. Returns the number of entries
+    updated.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sqlalchemy.select(Entry.id, Entry.image)
+            .where(
+                Entry.id > last_id,
+                Entry.image != None,  # noqa: E711
+                Entry.image != "",
+                Entry.image_width == None,  # noqa: E711
+            )
+            .order_by(Entry.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return updated
+        values = []
+        for entry_id, image in rows:
+            try:
+                info = inspect(_read_image(image))
+            except (httpx.HTTPError, OSError) as exc:
+                logger.warning("Could not read image of entry %s: %r", entry_id, exc)
+                continue
+            if info is not None:
+                values.append(
+                    {
+                        "entry_id": entry_id,
+                        "new_width": info.width,
+                        "new_height": info.height,
+                        "new_placeholder": info.placeholder or None,
+                    }
+                )
+        if values:
+            conn.execute(
+                sqlalchemy.update(Entry.__table__)
+                .where(Entry.__table__.c.id == sqlalchemy.bindparam("entry_id"))
+                .values(
+                    image_width=sqlalchemy.bindparam("new_width"),
+                    image_height=sqlalchemy.bindparam("new_height"),
+                    image_placeholder=sqlalchemy.bindparam("new_placeholder"),
+                ),
+                values,
+            )
+        conn.commit()
+        updated += len(values)
+        last_id = rows[-1][0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", help="Defaults to the app's database.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    with rx.model.get_engine(args.db_url).connect() as conn:
+        count = backfill(conn, batch_size=args.batch_size)
+    print(f"Stored the image dimensions of {count} entries")
+
+
+if __name__ == "__main__":
+    main()
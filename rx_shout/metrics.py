@@ -0,0 +1,294 @@
+"""Latency and database instrumentation for event handlers.
+
+Metrics are kept in process memory and rendered in the Prometheus text format
+by the `/metrics` backend endpoint (see `api.py`). Each backend worker reports
+its own numbers.
+
+Set ``METRICS_LOG=1`` to also emit one structured (JSON) log line per handled
+event, and ``METRICS_STATE_DELTA=1`` to measure the serialized size of the
+state delta produced by each handler (this serializes the delta an extra time,
+so it is off by default).
+"""
+
+from __future__ import annotations
+
+import bisect
+import contextlib
+import contextvars
+import dataclasses
+import functools
+import inspect
+import json
+import logging
+import os
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+log_events = os.environ.get("METRICS_LOG", "") not in ("", "0")
+measure_state_delta = os.environ.get("METRICS_STATE_DELTA", "") not in ("", "0")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """A labelled Prometheus-style histogram."""
+
+    def __init__(self, name: str, doc: str, buckets: tuple, label: str | None = None):
+        self.name = name
+        self.doc = doc
+        self.buckets = buckets
+        self.label = label
+        self._series: dict[str, list] = {}
+
+    def observe(self, value: float, label_value: str = "") -> None:
+        series = self._series.setdefault(
+            label_value, [[0] * (len(self.buckets) + 1), 0.0]
+        )
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    @contextlib.contextmanager
+    def time(self, label_value: str = ""):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, label_value)
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.doc}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for label_value, (counts, total) in sorted(self._series.items()):
+            labels = f'{self.label}="{label_value}",' if self.label else ""
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(
+                    f'{self.name}_bucket{{{labels}le="{bound}"}} {cumulative}'
+                )
+            labels = f"{{{labels.rstrip(',')}}}" if labels else ""
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Counter:
+    """A labelled Prometheus-style counter."""
+
+    def __init__(self, name: str, doc: str, label: str | None = None):
+        self.name = name
+        self.doc = doc
+        self.label = label
+        self._series: dict[str, float] = {}
+
+    def inc(self, amount: float = 1, label_value: str = "") -> None:
+        self._series[label_value] = self._series.get(label_value, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.doc}",
+            f"# TYPE {self.name} counter",
+        ]
+        for label_value, value in sorted(self._series.items()):
+            labels = f'{{{self.label}="{label_value}"}}' if self.label else ""
+            lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+handler_seconds = Histogram(
+    "rx_shout_handler_seconds",
+    "Wall time spent in each event handler.",
+    LATENCY_BUCKETS,
+    label="handler",
+)
+handler_db_queries = Histogram(
+    "rx_shout_handler_db_queries",
+    "Database queries issued per event handler invocation.",
+    COUNT_BUCKETS,
+    label="handler",
+)
+handler_db_seconds = Counter(
+    "rx_shout_handler_db_seconds_total",
+    "Time spent waiting on database queries per event handler.",
+    label="handler",
+)
+handler_errors = Counter(
+    "rx_shout_handler_errors_total",
+    "Event handler invocations that raised an exception.",
+    label="handler",
+)
+state_delta_bytes = Histogram(
+    "rx_shout_state_delta_bytes",
+    "Serialized size of the state delta produced by each event handler.",
+    BYTES_BUCKETS,
+    label="handler",
+)
+db_query_seconds = Histogram(
+    "rx_shout_db_query_seconds",
+    "Duration of individual database queries.",
+    LATENCY_BUCKETS,
+)
+s3_upload_seconds = Histogram(
+    "rx_shout_s3_upload_seconds",
+    "Time spent uploading images to S3-compatible storage.",
+    LATENCY_BUCKETS,
+)
+
+METRICS = [
+    handler_seconds,
+    handler_db_queries,
+    handler_db_seconds,
+    handler_errors,
+    state_delta_bytes,
+    db_query_seconds,
+    s3_upload_seconds,
+]
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+@dataclasses.dataclass(slots=True)
+class Sample:
+    """Measurements for a single event handler invocation."""
+
+    handler: str
+    queries: int = 0
+    db_seconds: float = 0.0
+    delta_bytes: int = 0
+    error: str | None = None
+
+
+_current_sample: contextvars.ContextVar[Sample | None] = contextvars.ContextVar(
+    "rx_shout_metrics_sample", default=None
+)
+
+
+def current_handler() -> str | None:
+    """Name of the event handler being measured, if any."""
+    sample = _current_sample.get()
+    return sample.handler if sample is not None else None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's context, which is dropped even if it fails.
+    if context is not None:
+        context.rx_shout_query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "rx_shout_query_start", None)
+    if start is None:
+        # The statement started before the listener was registered.
+        return
+    elapsed = time.perf_counter() - start
+    db_query_seconds.observe(elapsed)
+    if (sample := _current_sample.get()) is not None:
+        sample.queries += 1
+        sample.db_seconds += elapsed
+
+
+def _sample_delta(sample: Sample, state) -> None:
+    if not measure_state_delta:
+        return
+    from reflex.istate.proxy import StateProxy
+    from reflex.utils.format import json_dumps
+
+    # A background task's updates are sent as it leaves `async with self`.
+    if isinstance(state, StateProxy):
+        return
+
+    sample.delta_bytes += len(json_dumps(state.get_delta()))
+
+
+@contextlib.contextmanager
+def _measure(handler: str):
+    sample = Sample(handler=handler)
+    token = _current_sample.set(sample)
+    start = time.perf_counter()
+    try:
+        yield sample
+    except Exception as exc:
+        sample.error = type(exc).__name__
+        handler_errors.inc(label_value=handler)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        with contextlib.suppress(ValueError):
+            # An abandoned generator may be finalized in another context.
+            _current_sample.reset(token)
+        handler_seconds.observe(elapsed, handler)
+        handler_db_queries.observe(sample.queries, handler)
+        handler_db_seconds.inc(sample.db_seconds, handler)
+        if measure_state_delta:
+            state_delta_bytes.observe(sample.delta_bytes, handler)
+        if log_events:
+            logger.info(
+                json.dumps(
+                    {
+                        "event": "handler",
+                        "seconds": round(elapsed, 6),
+                        **dataclasses.asdict(sample),
+                    }
+                )
+            )
+
+
+def instrument(fn):
+    """Record wall time, database usage and delta size of an event handler.
+
+    Apply below `@rx.event` so that reflex sees the wrapped signature.
+    """
+    name = fn.__qualname__
+
+    if inspect.isasyncgenfunction(fn):
+
+        @functools.wraps(fn)
+        async def wrapper(self, *args, **kwargs):
+            with _measure(name) as sample:
+                async for update in fn(self, *args, **kwargs):
+                    _sample_delta(sample, self)
+                    yield update
+                _sample_delta(sample, self)
+
+    elif inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def wrapper(self, *args, **kwargs):
+            with _measure(name) as sample:
+                result = await fn(self, *args, **kwargs)
+                _sample_delta(sample, self)
+                return result
+
+    elif inspect.isgeneratorfunction(fn):
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            with _measure(name) as sample:
+                for update in fn(self, *args, **kwargs):
+                    _sample_delta(sample, self)
+                    yield update
+                _sample_delta(sample, self)
+
+    else:
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            with _measure(name) as sample:
+                result = fn(self, *args, **kwargs)
+                _sample_delta(sample, self)
+                return result
+
+    return wrapper
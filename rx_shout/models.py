@@ -3,21 +3,59 @@
 from typing import List, Optional
 import datetime
 
-from sqlmodel import Field, DateTime, Column, func, Relationship, SQLModel
+import sqlalchemy
+from sqlmodel import Field, DateTime, Column, func, Index, Relationship, SQLModel
 
 import reflex as rx
 
 
 class Entry(SQLModel, table=True):
+    __table_args__ = (
+        # The hot feed of a topic, see `rx_shout.ranking`.
+        Index("ix_entry_topic_id_hot_score", "topic_id", "hot_score"),
+        # The posts of a user, see `rx_shout.activity`; read newest first by
+        # scanning it backwards.
+        Index("ix_entry_author_id_ts", "author_id", "ts"),
+        # The moderation queue, only flagged entries are indexed.
+        Index(
+            "ix_entry_flagged",
+            "hidden",
+            "flags",
+            "last_flagged_at",
+            postgresql_where=sqlalchemy.text("flags > 0"),
+            sqlite_where=sqlalchemy.text("flags > 0"),
+        ),
+    )
+
     id: int = Field(default=None, primary_key=True)
     ts: datetime.datetime = Field(
         sa_column=Column(DateTime(timezone=True), server_default=func.now()),
     )
-    author_id: int = Field(nullable=False, foreign_key="author.user_id", index=True)
+    author_id: int = Field(nullable=False, foreign_key="author.user_id")
     topic_id: int = Field(nullable=True, foreign_key="topic.id", index=True)
     text: str = Field(nullable=False)
     image: str = Field(nullable=True)
+    # Reserve space for the image and show a preview, see `rx_shout.imageinfo`.
+    image_width: Optional[int] = Field(default=None, nullable=True)
+    image_height: Optional[int] = Field(default=None, nullable=True)
+    image_placeholder: Optional[str] = Field(default=None, nullable=True)
+    # Video transcoded from an animated GIF image, see `rx_shout.video`.
+    video: Optional[str] = Field(default=None, nullable=True)
     hidden: bool = Field(default=False)
+    # Maintained along with the "like" reactions, see `rx_shout.ranking`.
+    likes: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    hot_score: float = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    # Maintained along with the "flag" reactions, for the moderation queue.
+    flags: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    last_flagged_at: Optional[datetime.datetime] = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=True), nullable=True),
+    )
+    # When the entry was hidden, hidden entries are purged by `rx_shout.retention`.
+    hidden_at: Optional[datetime.datetime] = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=True), nullable=True, index=True),
+    )
 
     author: Optional["Author"] = Relationship(
         back_populates="entries",
@@ -57,6 +95,9 @@ class Author(SQLModel, table=True):
     )
     name: str = Field(nullable=False)
     picture: str = Field(nullable=False)
+    # Cached copy of the picture, see `rx_shout.avatars`. Empty if caching
+    # `picture` failed.
+    avatar: str = Field(nullable=True)
 
     user_info: Optional[UserInfo] = Relationship(back_populates="author")
     entries: List[Entry] = Relationship(
@@ -65,10 +106,35 @@ class Author(SQLModel, table=True):
 
 
 class EntryFlags(SQLModel, table=True):
+    __table_args__ = (
+        # Each user reacts at most once of each type to an entry.
+        Index(
+            "ix_entryflags_user_id_entry_id_type",
+            "user_id",
+            "entry_id",
+            "type",
+            unique=True,
+        ),
+        # The reactions of a user, latest first, see `rx_shout.activity`.
+        Index(
+            "ix_entryflags_user_id_type_ts",
+            "user_id",
+            "type",
+            "ts",
+            "id",
+        ),
+    )
+
     id: int = Field(default=None, primary_key=True)
-    user_id: int = Field(nullable=False, foreign_key="userinfo.id", index=True)
+    user_id: int = Field(nullable=False, foreign_key="userinfo.id")
     entry_id: int = Field(nullable=False, foreign_key="entry.id", index=True)
     type: str = Field(nullable=False)
+    # Set on insert rather than by the database: SQLite can't add a column
+    # defaulting to the current time.
+    ts: Optional[datetime.datetime] = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=True), default=func.now()),
+    )
 
     user_info: UserInfo = Relationship(back_populates="entry_flags")
     entry: Entry = Relationship(back_populates="entry_flags")
@@ -79,5 +145,21 @@ class Topic(SQLModel, table=True):
     name: str = Field(nullable=False, unique=True, index=True)
     description: str = ""
     locked: bool = Field(default=False)
+    # Set when the entries were moved to cold storage by `rx_shout.retention`.
+    archived_at: Optional[datetime.datetime] = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=True), nullable=True),
+    )
 
     entries: List[Entry] = Relationship(back_populates="topic")
+
+
+# Counts of the visible entries of a topic, see `rx_shout.summary`.
+class TopicSummary(SQLModel, table=True):
+    topic_id: int = Field(foreign_key="topic.id", primary_key=True)
+    entries: int = Field(default=0)
+    likes: int = Field(default=0)
+    last_activity_at: Optional[datetime.datetime] = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=True), nullable=True),
+    )
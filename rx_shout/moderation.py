@@ -0,0 +1,106 @@
+"""Flag counts, automatic hiding and the admins' moderation queue.
+
+Like the like count (see `rx_shout.ranking`), the number of flags of an entry
+and the time it was last flagged are stored in the `entry` table and updated
+in the transaction that adds or removes a flag. The queue of flagged entries
+is read from a partial index that only covers entries with flags.
+
+Entries are hidden automatically once they have ``AUTO_HIDE_FLAG_THRESHOLD``
+flags (default 5, 0 disables it), until an admin restores them.
+"""
+
+import datetime
+import os
+
+import sqlalchemy
+from sqlmodel import delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import summary
+from .models import Entry, EntryFlags
+
+AUTO_HIDE_FLAG_THRESHOLD = int(os.environ.get("AUTO_HIDE_FLAG_THRESHOLD", "5"))
+PAGE_SIZE = 25
+# Must match the predicate of the `ix_entry_flagged` partial index.
+IS_FLAGGED = Entry.flags > sqlalchemy.literal_column("0")
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+async def update_flags(asession: AsyncSession, entry_id: int, delta: int) -> bool:
+    """Adjust the flag count of an entry, without committing.
+
+    Returns whether the entry was hidden because it has too many flags.
+    """
+    values = {"flags": Entry.flags + delta}
+    if delta > 0:
+        values["last_flagged_at"] = _now()
+    flags = (
+        await asession.execute(
+            sqlalchemy.update(Entry)
+            .where(Entry.id == entry_id)
+            .values(**values)
+            .returning(Entry.flags)
+        )
+    ).scalar_one_or_none()
+    if (
+        delta > 0
+        and AUTO_HIDE_FLAG_THRESHOLD
+        and flags is not None
+        and flags >= AUTO_HIDE_FLAG_THRESHOLD
+    ):
+        return bool(await set_hidden(asession, Entry.id == entry_id, hidden=True))
+    return False
+
+
+async def set_hidden(
+    asession: AsyncSession, *criteria: sqlalchemy.ColumnElement, hidden: bool
+) -> int:
+    """Hide or restore all matching entries in one statement, without committing.
+
+    Returns the number of entries that changed.
+    """
+    rows = (
+        await asession.execute(
+            sqlalchemy.update(Entry)
+            .where(*criteria, Entry.hidden == (not hidden))
+            .values(hidden=hidden, hidden_at=_now() if hidden else None)
+            .returning(Entry.topic_id, Entry.likes)
+        )
+    ).all()
+    await summary.add_many(
+        asession, summary.count_changes(rows, sign=-1 if hidden else 1)
+    )
+    return len(rows)
+
+
+async def dismiss_flags(asession: AsyncSession, entry_id: int) -> None:
+    """Remove all flags from an entry, without committing."""
+    await asession.exec(
+        delete(EntryFlags).where(
+            EntryFlags.entry_id == entry_id,
+            EntryFlags.type == "flag",
+        )
+    )
+    await asession.execute(
+        sqlalchemy.update(Entry).where(Entry.id == entry_id).values(flags=0)
+    )
+
+
+async def flagged_entry_ids(
+    asession: AsyncSession,
+    hidden: bool = False,
+    limit: int = PAGE_SIZE,
+    offset: int = 0,
+) -> list[int]:
+    """Ids of the flagged entries, most flagged and recently flagged first."""
+    result = await asession.execute(
+        sqlalchemy.select(Entry.id)
+        .where(IS_FLAGGED, Entry.hidden == hidden)
+        .order_by(Entry.flags.desc(), Entry.last_flagged_at.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+    return list(result.scalars())
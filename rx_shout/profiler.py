@@ -0,0 +1,87 @@
+"""A sampling profiler for the live backend worker.
+
+While a profile runs, a background thread reads the stack of every other
+thread with `sys._current_frames` every ``PROFILE_INTERVAL_MS`` milliseconds
+(default 10) and counts identical stacks, leaving out threads that are
+waiting on a lock or for I/O. Nothing is installed in the
+interpreter, so there is no overhead while no profile runs, and little while
+one does. Profiles last at most ``PROFILE_MAX_SECONDS`` (default 60), and
+only one runs at a time per worker.
+
+The result is in the collapsed stack format (one `root;...;leaf count` line
+per stack) read by flamegraph.pl, speedscope and similar tools. Admins start
+a profile of the worker serving them at `/profile`.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "10"))
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "60"))
+
+# Innermost frames of threads that are waiting, not running.
+_IDLE_LEAVES = {
+    # Thread pool and aiosqlite threads waiting for work on a SimpleQueue.
+    "concurrent.futures.thread._worker",
+    "aiosqlite.core._connection_worker_thread",
+    "threading.Condition.wait",
+    "threading.Thread._wait_for_tstate_lock",
+    "selectors.EpollSelector.select",
+    "selectors.KqueueSelector.select",
+    "selectors.PollSelector.select",
+    "selectors.SelectSelector.select",
+}
+_running = threading.Lock()
+
+
+class ProfileRunningError(RuntimeError):
+    pass
+
+
+def _collapse(frame) -> list[str]:
+    """`module.function` of the frames of a stack, outermost first."""
+    labels = []
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "?")
+        labels.append(f"{module}.{frame.f_code.co_qualname}")
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def profile(
+    seconds: float, interval_ms: float = PROFILE_INTERVAL_MS, idle: bool = False
+) -> str:
+    """Sample the stacks of all other threads, blocking for `seconds`.
+
+    Unless `idle` is set, threads waiting on a lock, condition or selector are
+    left out. Returns the samples in the collapsed stack format.
+    """
+    seconds = min(seconds, PROFILE_MAX_SECONDS)
+    if not _running.acquire(blocking=False):
+        raise ProfileRunningError("A profile is already running in this worker.")
+    try:
+        own = threading.get_ident()
+        stacks = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                labels = _collapse(frame)
+                if idle or labels[-1] not in _IDLE_LEAVES:
+                    thread = names.get(ident, str(ident)).replace(" ", "_")
+                    stacks[";".join([thread, *labels])] += 1
+            # Don't keep the frames, and their locals, alive while sleeping.
+            del frames, frame
+            time.sleep(interval_ms / 1000)
+    finally:
+        _running.release()
+    return "".join(
+        f"{stack} {count}\n" for stack, count in stacks.most_common()
+    )
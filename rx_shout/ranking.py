@@ -0,0 +1,125 @@
+"""The "hot" ranking of entries by likes, decaying with age.
+
+    score = log10(max(likes, 1)) + seconds since EPOCH / HOT_DECAY_SECONDS
+
+Every ``HOT_DECAY_SECONDS`` (default 45000, 12.5 hours) an entry needs ten
+times as many likes to rank as high as a newer one. Since the age is measured
+from a fixed epoch, scores never have to be updated as time passes: the like
+count and score of an entry are stored in the `entry` table and updated
+together when it is liked or unliked, so the hot feed is read from the
+`(topic_id, hot_score)` index like the chronological one.
+
+Counts can drift if reactions are removed by hand, recompute them with:
+
+    python -m rx_shout.ranking
+"""
+
+import argparse
+import datetime
+import math
+import os
+
+import reflex as rx
+import sqlalchemy
+from sqlalchemy.engine import Connection
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import summary
+from .models import Entry, EntryFlags
+
+HOT_DECAY_SECONDS = float(os.environ.get("HOT_DECAY_SECONDS", "45000"))
+EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+BATCH_SIZE = 1000
+
+
+def hot_score(likes: int, ts: datetime.datetime) -> float:
+    if ts.tzinfo is None:
+        # SQLite does not keep the timezone, timestamps are stored in UTC.
+        ts = ts.replace(tzinfo=datetime.timezone.utc)
+    return (
+        math.log10(max(likes, 1))
+        + (ts - EPOCH).total_seconds() / HOT_DECAY_SECONDS
+    )
+
+
+async def update_likes(asession: AsyncSession, entry_id: int, delta: int) -> None:
+    """Adjust the like count and hot score of an entry, without committing."""
+    row = (
+        await asession.execute(
+            sqlalchemy.update(Entry)
+            .where(Entry.id == entry_id)
+            .values(likes=Entry.likes + delta)
+            .returning(Entry.likes, Entry.ts, Entry.topic_id, Entry.hidden)
+        )
+    ).first()
+    if row is not None:
+        await asession.execute(
+            sqlalchemy.update(Entry)
+            .where(Entry.id == entry_id)
+            .values(hot_score=hot_score(row.likes, row.ts))
+        )
+        if not row.hidden:
+            await summary.add(asession, row.topic_id, likes=delta)
+
+
+def recompute(
+    conn: Connection,
+    *criteria: sqlalchemy.ColumnElement,
+    batch_size: int = BATCH_SIZE,
+    commit: bool = False,
+) -> int:
+    """Recount the likes and scores of the matching entries.
+
+    With `commit`, each batch is committed as it is done.
+    """
+    likes = (
+        sqlalchemy.select(sqlalchemy.func.count(EntryFlags.id))
+        .where(EntryFlags.entry_id == Entry.id, EntryFlags.type == "like")
+        .scalar_subquery()
+    )
+    updated = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sqlalchemy.select(Entry.id, Entry.ts, likes)
+            .where(Entry.id > last_id, *criteria)
+            .order_by(Entry.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return updated
+        conn.execute(
+            sqlalchemy.update(Entry.__table__)
+            .where(Entry.__table__.c.id == sqlalchemy.bindparam("entry_id"))
+            .values(
+                likes=sqlalchemy.bindparam("new_likes"),
+                hot_score=sqlalchemy.bindparam("new_score"),
+            ),
+            [
+                {
+                    "entry_id": id_,
+                    "new_likes": count,
+                    "new_score": hot_score(count, ts),
+                }
+                for id_, ts, count in rows
+            ],
+        )
+        if commit:
+            conn.commit()
+        updated += len(rows)
+        last_id = rows[-1][0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", help="Defaults to the app's database.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    with rx.model.get_engine(args.db_url).connect() as conn:
+        count = recompute(conn, batch_size=args.batch_size, commit=True)
+    print(f"Recomputed {count} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Token bucket rate limiting for posts, reactions and uploads.
+
+Limits are configured per action with environment variables of the form
+``RATE_LIMIT_<ACTION>=<burst>/<seconds>``, for example ``RATE_LIMIT_POST=5/60``
+allows a burst of 5 posts, refilling at 5 tokens per minute. Set a limit to
+``off`` to disable it.
+
+When ``REFLEX_REDIS_URL`` is set, buckets are kept in redis so that every
+backend worker shares them; otherwise they are kept in process memory.
+"""
+
+import os
+import time
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class Limit:
+    burst: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        """Tokens refilled per second."""
+        return self.burst / self.period
+
+
+DEFAULT_LIMITS = {
+    "post": "5/60",
+    "react": "30/60",
+    "upload": "5/60",
+}
+
+
+def _parse_limit(value: str) -> Limit | None:
+    if value.strip().lower() in ("", "0", "off", "none"):
+        return None
+    burst, _, period = value.partition("/")
+    return Limit(burst=int(burst), period=float(period or 1))
+
+
+limits: dict[str, Limit | None] = {
+    action: _parse_limit(os.environ.get(f"RATE_LIMIT_{action.upper()}", default))
+    for action, default in DEFAULT_LIMITS.items()
+}
+redis_url = os.environ.get("REFLEX_REDIS_URL")
+
+# Atomically refill every bucket and take one token from each, only if all of
+# them have one; returns 1 if the tokens were taken.
+_TOKEN_BUCKET_LUA = """
+local burst = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local tokens = {}
+local granted = 1
+for i, key in ipairs(KEYS) do
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local ts = tonumber(bucket[2]) or now
+    tokens[i] = math.min(burst, (tonumber(bucket[1]) or burst) + (now - ts) * rate)
+    if tokens[i] < 1 then
+        granted = 0
+    end
+end
+for i, key in ipairs(KEYS) do
+    redis.call('HSET', key, 'tokens', tostring(tokens[i] - granted), 'ts', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(burst / rate) + 1)
+end
+return granted
+"""
+
+# key -> (tokens, last update, time at which the bucket is full again)
+_buckets: dict[str, tuple[float, float, float]] = {}
+_redis = None
+_script = None
+
+
+def _take_memory(keys: list[str], limit: Limit) -> bool:
+    now = time.monotonic()
+    tokens = {}
+    for key in keys:
+        bucket_tokens, ts, _ = _buckets.get(key, (limit.burst, now, now))
+        tokens[key] = min(limit.burst, bucket_tokens + (now - ts) * limit.rate)
+    granted = all(value >= 1 for value in tokens.values())
+    for key, value in tokens.items():
+        if granted:
+            value -= 1
+        _buckets[key] = (value, now, now + (limit.burst - value) / limit.rate)
+    if len(_buckets) > 100_000:
+        # Drop buckets that have fully refilled; they are equivalent to absent.
+        for k, (_, _, full_at) in list(_buckets.items()):
+            if full_at <= now:
+                del _buckets[k]
+    return granted
+
+
+async def _take_redis(keys: list[str], limit: Limit) -> bool:
+    global _redis, _script
+    if _script is None:
+        import redis.asyncio
+
+        _redis = redis.asyncio.from_url(redis_url)
+        _script = _redis.register_script(_TOKEN_BUCKET_LUA)
+    return bool(await _script(keys=keys, args=[limit.burst, limit.rate]))
+
+
+async def hit(action: str, *keys: str) -> bool:
+    """Take a token for `action` from the bucket of every key.
+
+    Returns False, without taking any token, if any of the buckets is empty.
+    """
+    limit = limits.get(action)
+    if limit is None:
+        return True
+    bucket_keys = [f"rx_shout:ratelimit:{action}:{key}" for key in keys]
+    if redis_url:
+        return await _take_redis(bucket_keys, limit)
+    return _take_memory(bucket_keys, limit)
@@ -0,0 +1,237 @@
+"""Purge hidden entries and archive inactive topics.
+
+    # Apply both policies once, e.g. from a daily cron job.
+    python -m rx_shout.retention
+
+    # Only report what would be removed.
+    python -m rx_shout.retention --dry-run
+
+Deleting an entry only hides it. Hidden entries are removed for good, with
+their reactions and images, ``RETENTION_HIDDEN_DAYS`` days (default 30) after
+they were hidden.
+
+Topics without new entries for ``RETENTION_INACTIVE_MONTHS`` months (default
+0, never) are exported as gzipped NDJSON to ``ARCHIVE_DIR`` (default
+`data/archive`), together with their locally stored images, and their entries
+are removed. The topic itself is kept, marked as archived, so no new entries
+can be posted to it. Archives can be loaded again with `rx_shout.transfer`.
+
+Rows are deleted ``RETENTION_BATCH_SIZE`` entries (default 500) at a time,
+each batch in its own short transaction, sleeping ``RETENTION_PAUSE`` seconds
+(default 0.5) in between, so the live feed is never blocked for long.
+"""
+
+import argparse
+import datetime
+import logging
+import os
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import reflex as rx
+import sqlalchemy
+from sqlalchemy.engine import Engine
+
+from . import s3, storage, summary, transfer
+from .models import Entry, EntryFlags, Topic
+
+logger = logging.getLogger(__name__)
+
+HIDDEN_DAYS = int(os.environ.get("RETENTION_HIDDEN_DAYS", "30"))
+INACTIVE_MONTHS = int(os.environ.get("RETENTION_INACTIVE_MONTHS", "0"))
+BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", "500"))
+PAUSE = float(os.environ.get("RETENTION_PAUSE", "0.5"))
+ARCHIVE_DIR = Path(os.environ.get("ARCHIVE_DIR", "data/archive"))
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _remove_image(image: str) -> None:
+    if image.startswith("http"):
+        if s3.endpoint_url:
+            s3.delete_object(image.removeprefix(s3.public_url("")))
+        return
+    storage.upload_path(image).unlink(missing_ok=True)
+
+
+def _batches(
+    engine: Engine, criteria: sqlalchemy.ColumnElement, batch_size: int
+) -> Iterator[list[int]]:
+    """Ids of the matching entries, one batch at a time, until none are left.
+
+    Each batch must be deleted before the next one is read.
+    """
+    while True:
+        with engine.connect() as conn:
+            ids = list(
+                conn.execute(
+                    sqlalchemy.select(Entry.id)
+                    .where(criteria)
+                    .order_by(Entry.id)
+                    .limit(batch_size)
+                ).scalars()
+            )
+        if not ids:
+            return
+        yield ids
+
+
+def delete_entries(
+    engine: Engine,
+    criteria: sqlalchemy.ColumnElement,
+    keep_bucket_images: bool = False,
+    batch_size: int = BATCH_SIZE,
+    pause: float = PAUSE,
+) -> int:
+    """Delete the matching entries with their reactions and images.
+
+    Returns the number of deleted entries.
+    """
+    deleted = 0
+    for ids in _batches(engine, criteria, batch_size):
+        if deleted:
+            time.sleep(pause)
+        with engine.begin() as conn:
+            conn.execute(
+                sqlalchemy.delete(EntryFlags).where(EntryFlags.entry_id.in_(ids))
+            )
+            rows = conn.execute(
+                sqlalchemy.delete(Entry)
+                .where(Entry.id.in_(ids))
+                .returning(Entry.image, Entry.video)
+            ).all()
+            images = [image for row in rows for image in row if image]
+        # Only remove the files once the rows referencing them are gone.
+        for image in images:
+            if keep_bucket_images and image.startswith("http"):
+                continue
+            try:
+                _remove_image(image)
+            except Exception:
+                logger.exception("Could not remove image %s", image)
+        deleted += len(ids)
+    return deleted
+
+
+def hidden_criteria(days: int = HIDDEN_DAYS) -> sqlalchemy.ColumnElement:
+    """Hidden entries that are past their retention period.
+
+    Compares `hidden_at` itself so the range scan uses its index; the
+    migration adding it set it on the entries hidden before.
+    """
+    cutoff = _now() - datetime.timedelta(days=days)
+    return sqlalchemy.and_(
+        Entry.hidden == True,  # noqa: E712
+        Entry.hidden_at < cutoff,
+    )
+
+
+def inactive_topics(engine: Engine, months: int = INACTIVE_MONTHS) -> list[str]:
+    """Names of the unarchived topics whose newest entry is too old."""
+    cutoff = _now() - datetime.timedelta(days=30 * months)
+    with engine.connect() as conn:
+        return list(
+            conn.execute(
+                sqlalchemy.select(Topic.name)
+                .join(Entry, Entry.topic_id == Topic.id)
+                .where(Topic.archived_at == None)  # noqa: E711
+                .group_by(Topic.id, Topic.name)
+                .having(sqlalchemy.func.max(Entry.ts) < cutoff)
+                .order_by(Topic.name)
+            ).scalars()
+        )
+
+
+def archive_topic(
+    engine: Engine,
+    topic_name: str,
+    archive_dir: Path = ARCHIVE_DIR,
+    batch_size: int = BATCH_SIZE,
+    pause: float = PAUSE,
+) -> Path:
+    """Move the entries of the topic to an archive, returning its directory."""
+    with engine.begin() as conn:
+        # Closing the topic first keeps new entries out of the export.
+        topic_id = conn.execute(
+            sqlalchemy.update(Topic)
+            .where(Topic.name == topic_name, Topic.archived_at == None)  # noqa: E711
+            .values(archived_at=_now())
+            .returning(Topic.id)
+        ).scalar_one()
+    dest = archive_dir / (
+        f"{topic_name.strip('/').replace('/', '_') or topic_id}"
+        f"-{_now():%Y%m%d%H%M%S}"
+    )
+    try:
+        transfer.export_topic(
+            engine, topic_name, dest, file_format="ndjson.gz", images=True
+        )
+    except Exception:
+        with engine.begin() as conn:
+            conn.execute(
+                sqlalchemy.update(Topic)
+                .where(Topic.id == topic_id)
+                .values(archived_at=None)
+            )
+        raise
+    # Local images were copied to the archive, the archive refers to images in
+    # the bucket by their url.
+    delete_entries(
+        engine,
+        Entry.topic_id == topic_id,
+        keep_bucket_images=True,
+        batch_size=batch_size,
+        pause=pause,
+    )
+    with engine.begin() as conn:
+        summary.refresh(conn, [topic_id])
+    return dest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", help="Defaults to the app's database.")
+    parser.add_argument("--hidden-days", type=int, default=HIDDEN_DAYS)
+    parser.add_argument("--inactive-months", type=int, default=INACTIVE_MONTHS)
+    parser.add_argument("--archive-dir", type=Path, default=ARCHIVE_DIR)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=PAUSE)
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Report without removing anything."
+    )
+    args = parser.parse_args()
+
+    engine = rx.model.get_engine(args.db_url)
+    if args.hidden_days:
+        criteria = hidden_criteria(args.hidden_days)
+        if args.dry_run:
+            with engine.connect() as conn:
+                count = conn.execute(
+                    sqlalchemy.select(sqlalchemy.func.count(Entry.id)).where(criteria)
+                ).scalar_one()
+            print(f"Would purge {count} hidden entries")
+        else:
+            count = delete_entries(
+                engine, criteria, batch_size=args.batch_size, pause=args.pause
+            )
+            print(f"Purged {count} hidden entries")
+    if args.inactive_months:
+        for topic_name in inactive_topics(engine, args.inactive_months):
+            if args.dry_run:
+                print(f"Would archive {topic_name}")
+                continue
+            dest = archive_topic(
+                engine,
+                topic_name,
+                args.archive_dir,
+                batch_size=args.batch_size,
+                pause=args.pause,
+            )
+            print(f"Archived {topic_name} to {dest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,12 +5,23 @@ import sys
 import reflex as rx
 import reflex_google_auth
 
+from . import drain, google_token
+from .api import api
+from .components.activity import ActivityState, activity_page
+from .components.admin import (
+    ModerationState,
+    SlowQueryState,
+    moderation_page,
+    profile_page,
+    slow_queries_page,
+)
 from .components.entry import entry_view
 from .components.google_auth import (
     auth_error_callout,
     google_auth_button,
 )
 from .components.form import submission_form
+from .components.search import SearchState, search_form, search_results
 from .state import State
 
 
@@ -20,6 +31,14 @@ def index() -> rx.Component:
             rx.icon("sun", size=16),
             rx.color_mode.switch(size="1"),
             rx.icon("moon", size=16),
+            rx.cond(
+                reflex_google_auth.GoogleAuthState.token_is_valid,
+                rx.link(rx.icon("history", size=16), href="/activity"),
+            ),
+            rx.cond(
+                State.is_admin,
+                rx.link(rx.icon("shield", size=16), href="/moderation"),
+            ),
             margin="8px",
             float="right",
         ),
@@ -41,14 +60,26 @@ def index() -> rx.Component:
                     ),
                     width="100%",
                 ),
-                rx.vstack(
-                    rx.foreach(
-                        State.entries,
-                        entry_view,
+                search_form(),
+                rx.cond(
+                    SearchState.search_query,
+                    search_results(),
+                    rx.vstack(
+                        rx.segmented_control.root(
+                            rx.segmented_control.item("New", value="new"),
+                            rx.segmented_control.item("Hot", value="hot"),
+                            value=State.sort,
+                            on_change=State.set_sort,
+                            margin_top="1em",
+                        ),
+                        rx.foreach(
+                            State.entries,
+                            entry_view,
+                        ),
+                        gap="2em",
+                        margin_y="2em",
+                        width="100%",
                     ),
-                    gap="2em",
-                    margin_y="2em",
-                    width="100%",
                 ),
                 rx.hstack(
                     rx.text(f"Python v{sys.version}"),
@@ -62,7 +93,13 @@ def index() -> rx.Component:
     )
 
 
-app = rx.App()
+app = rx.App(
+    api_transformer=api,
+    # Blurred image previews, needed before the feed is first rendered.
+    head_components=[rx.script(src="/placeholder.js")],
+)
+app.register_lifespan_task(drain.lifespan)
+app.register_lifespan_task(google_token.lifespan)
 app.add_page(
     index,
     title=rx.cond(
@@ -77,4 +114,22 @@ app.add_page(
     description="A shoutbox-like app for posting text and images.",
     on_load=State.load_entries,
 )
-rx.Model.migrate()
+app.add_page(
+    moderation_page,
+    route="/moderation",
+    title="rx_shout | Moderation",
+    on_load=ModerationState.load_queue,
+)
+app.add_page(
+    activity_page,
+    route="/activity",
+    title="rx_shout | Activity",
+    on_load=ActivityState.load_activity,
+)
+app.add_page(
+    slow_queries_page,
+    route="/slow-queries",
+    title="rx_shout | Slow Queries",
+    on_load=SlowQueryState.load_slow_queries,
+)
+app.add_page(profile_page, route="/profile", title="rx_shout | Profile")
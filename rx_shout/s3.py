@@ -1,8 +1,7 @@
 import os
 from urllib.parse import urljoin
 
-import boto3
-import reflex as rx
+from . import metrics, storage
 
 
 endpoint_url = os.environ.get("S3_ENDPOINT_URL")
@@ -10,12 +9,20 @@ access_key_id = os.environ.get("S3_ACCESS_KEY_ID")
 secret_access_key = os.environ.get("S3_SECRET_ACCESS_KEY")
 bucket_name = os.environ.get("S3_BUCKET_NAME")
 bucket_access_url = os.environ.get("S3_BUCKET_ACCESS_URL")
+# Let browsers upload straight to the bucket using presigned POSTs.
+direct_upload = bool(endpoint_url) and os.environ.get(
+    "S3_DIRECT_UPLOAD", ""
+) not in ("", "0")
+presigned_post_expires = int(os.environ.get("S3_PRESIGNED_POST_EXPIRES", "300"))
 _client = None
 
 
 def get_client():
     global _client
-    if endpoint_url:
+    if _client is None and endpoint_url:
+        # boto3 is slow to import, only pay for it when S3 is actually used.
+        import boto3
+
         _client = boto3.client(
             "s3",
             endpoint_url=endpoint_url,
@@ -25,19 +32,64 @@ def get_client():
     return _client
 
 
-def upload_image(filename: str, delete_original: bool = False) -> str:
+def upload_image(
+    filename: str, delete_original: bool = False, extra_args: dict | None = None
+) -> str:
     if bucket_access_url is None:
         raise RuntimeError("Set S3_BUCKET_ACCESS_URL environment variable")
     client = get_client()
     if client is None:
         raise RuntimeError("Set S3_ENDPOINT_URL environment variable")
-    image_file = rx.get_upload_dir() / filename
-    with image_file.open("rb") as fh:
+    image_file = storage.upload_path(filename)
+    with image_file.open("rb") as fh, metrics.s3_upload_seconds.time():
         client.upload_fileobj(
             fh,
             bucket_name,
             filename,
+            ExtraArgs=extra_args,
         )
     if delete_original:
         image_file.unlink()
     return urljoin(bucket_access_url, filename)
+
+
+def public_url(key: str) -> str:
+    return urljoin(bucket_access_url, key)
+
+
+def presigned_post(key: str, content_type: str, max_size: int) -> dict:
+    """A short-lived POST policy allowing the upload of exactly one object."""
+    return get_client().generate_presigned_post(
+        bucket_name,
+        key,
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", 1, max_size],
+        ],
+        ExpiresIn=presigned_post_expires,
+    )
+
+
+def object_size(key: str) -> int | None:
+    """Size of the object in the bucket, or None if it does not exist."""
+    from botocore.exceptions import ClientError
+
+    try:
+        head = get_client().head_object(Bucket=bucket_name, Key=key)
+    except ClientError as exc:
+        if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+            return None
+        raise
+    return head["ContentLength"]
+
+
+def delete_object(key: str) -> None:
+    get_client().delete_object(Bucket=bucket_name, Key=key)
+
+
+def read_object(key: str, max_bytes: int | None = None) -> bytes:
+    """The object, or only its first `max_bytes` bytes with a ranged GET."""
+    kwargs = {"Range": f"bytes=0-{max_bytes - 1}"} if max_bytes else {}
+    response = get_client().get_object(Bucket=bucket_name, Key=key, **kwargs)
+    return response["Body"].read()
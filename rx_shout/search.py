@@ -0,0 +1,81 @@
+"""Ranked full-text search over entries.
+
+Queries only touch the search index created by the `entry full text search`
+migration: a GIN-indexed `tsvector` column on postgres and an FTS5 table kept
+in sync by triggers on SQLite. Matching rows are then fetched from `entry`
+by primary key, so a search never scans the entry table.
+
+The models don't declare the index, so `include_object` hides it from
+alembic's autogenerate, which would otherwise drop it.
+"""
+
+import sqlalchemy
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+PAGE_SIZE = 20
+
+_POSTGRES_QUERY = """
+SELECT entry.id
+FROM entry, websearch_to_tsquery('simple', :query) AS query
+WHERE entry.search_vector @@ query AND NOT entry.hidden {scope}
+ORDER BY ts_rank(entry.search_vector, query) DESC, entry.id DESC
+LIMIT :limit OFFSET :offset
+"""
+
+_SQLITE_QUERY = """
+SELECT entry.id
+FROM entry_fts JOIN entry ON entry.id = entry_fts.rowid
+WHERE entry_fts MATCH :query AND NOT entry.hidden {scope}
+ORDER BY bm25(entry_fts), entry.id DESC
+LIMIT :limit OFFSET :offset
+"""
+
+
+def include_object(obj, name, type_, reflected, compare_to) -> bool:
+    """Whether alembic's autogenerate compares the object to the models."""
+    if type_ == "table":
+        return not name.startswith("entry_fts")
+    if type_ in ("column", "index"):
+        return name not in ("search_vector", "ix_entry_search_vector")
+    return True
+
+
+def _fts5_query(query: str) -> str:
+    """Match all words of the query literally, ignoring FTS5 syntax."""
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in query.split())
+
+
+async def search_entry_ids(
+    asession: AsyncSession,
+    query: str,
+    topic_id: int | None = None,
+    all_topics: bool = False,
+    limit: int = PAGE_SIZE,
+    offset: int = 0,
+) -> list[int]:
+    """Ids of visible entries matching the query, best match first.
+
+    Results are limited to the given topic (`None` being the topic-less feed)
+    unless `all_topics` is set.
+    """
+    if not query.strip():
+        return []
+    params = {"limit": limit, "offset": offset}
+    if all_topics:
+        scope = ""
+    elif topic_id is None:
+        scope = "AND entry.topic_id IS NULL"
+    else:
+        scope = "AND entry.topic_id = :topic_id"
+        params["topic_id"] = topic_id
+    dialect = asession.bind.dialect.name
+    if dialect == "postgresql":
+        statement = _POSTGRES_QUERY.format(scope=scope)
+        params["query"] = query
+    elif dialect == "sqlite":
+        statement = _SQLITE_QUERY.format(scope=scope)
+        params["query"] = _fts5_query(query)
+    else:
+        raise NotImplementedError(f"Full-text search is not supported on {dialect}")
+    result = await asession.execute(sqlalchemy.text(statement), params)
+    return [row[0] for row in result.all()]
@@ -0,0 +1,163 @@
+"""Optional sharding of topics across several databases.
+
+Set ``SHARD_DB_URLS`` to a comma separated list of database urls to store
+each topic, with its entries, reactions and summary, in one of them. A topic
+is assigned to the shard at index `crc32(name) % len(SHARD_DB_URLS)`, so the
+same name always lands on the same shard, in every worker. Async urls are
+derived from the sync ones (`sqlite://` becomes `sqlite+aiosqlite://`,
+`postgresql://` becomes `postgresql+psycopg://`), or can be listed in the
+same order in ``SHARD_ASYNC_DB_URLS``.
+
+Users and authors stay in the app's database (``REFLEX_DB_URL``), which can
+also be one of the shards. Because entries and reactions reference them with
+foreign keys, the rows of a user are copied to a shard before they post or
+react there; the copies are never read, so they are not kept up to date.
+
+Without ``SHARD_DB_URLS`` there is a single shard, the app's database. The
+mapping depends on the number of shards: move topics with
+`rx_shout.transfer` before adding one. Every shard has the full schema,
+migrate them all, and list their urls for the other maintenance jobs, with:
+
+    python -m rx_shout.shards migrate
+    python -m rx_shout.shards urls
+    python -m rx_shout.shards which /blog/post-1
+"""
+
+import argparse
+import contextlib
+import os
+import zlib
+
+import reflex as rx
+import sqlalchemy
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .models import Author, UserInfo
+
+SHARD_DB_URLS = [
+    url.strip() for url in os.environ.get("SHARD_DB_URLS", "").split(",") if url.strip()
+]
+# Drivers used with the async urls derived from sync ones.
+_ASYNC_SCHEMES = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+psycopg"}
+
+
+def _async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return f"{_ASYNC_SCHEMES.get(scheme, scheme)}{sep}{rest}"
+
+
+SHARD_ASYNC_DB_URLS = [
+    url.strip()
+    for url in os.environ.get("SHARD_ASYNC_DB_URLS", "").split(",")
+    if url.strip()
+] or [_async_url(url) for url in SHARD_DB_URLS]
+if len(SHARD_ASYNC_DB_URLS) != len(SHARD_DB_URLS):
+    raise ValueError("SHARD_ASYNC_DB_URLS must list one url per SHARD_DB_URLS.")
+
+enabled = bool(SHARD_DB_URLS)
+COUNT = len(SHARD_DB_URLS) or 1
+
+# (shard, user id) of the users already copied to a shard by this worker.
+_copied_users: set[tuple[int, int]] = set()
+
+
+def shard_for(topic_name: str) -> int:
+    """Index of the shard storing the topic."""
+    return zlib.crc32(topic_name.encode()) % COUNT
+
+
+def asession(shard: int = 0) -> AsyncSession:
+    """A session on the given shard."""
+    if not enabled:
+        return rx.asession()
+    return rx.asession(SHARD_ASYNC_DB_URLS[shard])
+
+
+def topic_asession(topic_name: str) -> AsyncSession:
+    """A session on the shard storing the topic."""
+    return asession(shard_for(topic_name))
+
+
+@contextlib.asynccontextmanager
+async def users_asession(asession: AsyncSession):
+    """A session on the app's database, reusing `asession` when not sharded."""
+    if not enabled:
+        yield asession
+        return
+    async with rx.asession() as users:
+        yield users
+
+
+async def ensure_user(asession: AsyncSession, shard: int, user_id: int) -> None:
+    """Copy the user and their author row to the shard, and commit."""
+    if not enabled or (shard, user_id) in _copied_users:
+        return
+    async with rx.asession() as users:
+        row = (
+            await users.execute(
+                sqlalchemy.select(UserInfo, Author)
+                .join(Author, Author.user_id == UserInfo.id)
+                .where(UserInfo.id == user_id)
+            )
+        ).first()
+    if row is None:
+        return
+    user, author = row
+    insert = (
+        postgresql.insert
+        if asession.bind.dialect.name == "postgresql"
+        else sqlite.insert
+    )
+    await asession.execute(
+        insert(UserInfo)
+        .values(
+            id=user.id, ext_id=user.ext_id, email=user.email, enabled=user.enabled
+        )
+        .on_conflict_do_nothing()
+    )
+    await asession.execute(
+        insert(Author)
+        .values(user_id=author.user_id, name=author.name, picture=author.picture)
+        .on_conflict_do_nothing()
+    )
+    await asession.commit()
+    _copied_users.add((shard, user_id))
+
+
+def migrate(url: str) -> None:
+    """Upgrade the database to the latest schema."""
+    # Alembic is only needed by this command, not when the app starts.
+    import alembic.command
+    import alembic.config
+
+    config = alembic.config.Config("alembic.ini")
+    # The config file interpolates %, as in escaped passwords.
+    config.set_main_option("sqlalchemy.url", url.replace("%", "%%"))
+    alembic.command.upgrade(config, "head")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrate", help="Upgrade every shard to the latest schema.")
+    subparsers.add_parser("urls", help="Print the url of every shard.")
+    which_parser = subparsers.add_parser("which", help="Print the shard of topics.")
+    which_parser.add_argument("topics", nargs="+")
+    args = parser.parse_args()
+
+    if not enabled:
+        parser.error("Set SHARD_DB_URLS to use shards.")
+    if args.command == "migrate":
+        for shard, url in enumerate(SHARD_DB_URLS):
+            print(f"Migrating shard {shard}")
+            migrate(url)
+    elif args.command == "urls":
+        print("\n".join(SHARD_DB_URLS))
+    else:
+        for topic in args.topics:
+            print(f"{shard_for(topic)}\t{topic}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Record slow database queries together with their query plans.
+
+Set ``SLOW_QUERY_MS`` to a threshold in milliseconds (default 0, off) to
+record every query that takes longer: its statement, redacted parameters,
+duration, the event handler that issued it (see `rx_shout.metrics`) and the
+plan from `EXPLAIN QUERY PLAN` on SQLite or `EXPLAIN` on Postgres. With
+``SLOW_QUERY_ANALYZE=1`` Postgres plans of SELECT statements are taken with
+`EXPLAIN (ANALYZE, BUFFERS)`, which runs the query a second time.
+
+Plans are taken on a separate connection in a background thread, at most
+once per statement every ``SLOW_QUERY_EXPLAIN_INTERVAL`` seconds (default
+60). The last ``SLOW_QUERY_LOG_SIZE`` queries (default 100) are kept in
+memory, per backend worker, and shown to admins at `/slow-queries`.
+"""
+
+import collections
+import dataclasses
+import datetime
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import reflex as rx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+from . import metrics, shards
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "0"))
+SLOW_QUERY_ANALYZE = os.environ.get("SLOW_QUERY_ANALYZE", "") not in ("", "0")
+SLOW_QUERY_EXPLAIN_INTERVAL = float(
+    os.environ.get("SLOW_QUERY_EXPLAIN_INTERVAL", "60")
+)
+SLOW_QUERY_LOG_SIZE = int(os.environ.get("SLOW_QUERY_LOG_SIZE", "100"))
+# Statements that have a plan, and can be explained without side effects.
+_EXPLAINABLE = ("select", "with", "insert", "update", "delete")
+_PENDING = "(explaining...)"
+# Statements whose last plan is kept. `IN` lists render a statement per length,
+# so the least recently seen ones are dropped.
+MAX_PLANS = 1000
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class SlowQuery:
+    ts: str
+    duration_ms: float
+    statement: str
+    parameters: str
+    handler: str = ""
+    plan: str = ""
+
+
+_log: collections.deque[SlowQuery] = collections.deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_lock = threading.Lock()
+# Last plan and when it was taken, by statement, least recently seen first.
+_plans: collections.OrderedDict[str, tuple[float, str]] = collections.OrderedDict()
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slowlog")
+
+
+def _redact_value(value) -> str:
+    if value is None or isinstance(value, (bool, int, float, datetime.datetime)):
+        return repr(value)
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__} len={len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact(parameters, executemany: bool = False) -> str:
+    """Numbers and timestamps of the parameters; text only by its length."""
+    if executemany:
+        return f"<{len(parameters)} parameter sets>"
+    if isinstance(parameters, dict):
+        return ", ".join(
+            f"{name}={_redact_value(value)}" for name, value in parameters.items()
+        )
+    return ", ".join(_redact_value(value) for value in parameters or ())
+
+
+def _explain_statement(dialect_name: str, statement: str) -> str:
+    if dialect_name == "sqlite":
+        return f"EXPLAIN QUERY PLAN {statement}"
+    if SLOW_QUERY_ANALYZE and statement.lstrip()[:6].lower() == "select":
+        return f"EXPLAIN (ANALYZE, BUFFERS) {statement}"
+    return f"EXPLAIN {statement}"
+
+
+def _format_plan(dialect_name: str, rows: list) -> str:
+    if dialect_name != "sqlite":
+        return "\n".join(row[0] for row in rows)
+    # (id, parent, notused, detail), children follow their parent.
+    depth = {0: -1}
+    lines = []
+    for id_, parent, _, detail in rows:
+        depth[id_] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[id_] + detail)
+    return "\n".join(lines)
+
+
+def _explain(engine: Engine, record: SlowQuery, statement: str, parameters) -> None:
+    dialect_name = engine.dialect.name
+    try:
+        with engine.connect() as conn:
+            rows = conn.exec_driver_sql(
+                _explain_statement(dialect_name, statement), parameters
+            ).all()
+            # Never keep the side effects of an analyzed statement.
+            conn.rollback()
+        plan = _format_plan(dialect_name, rows)
+    except Exception as exc:
+        logger.warning("Could not explain slow query: %r", exc)
+        plan = f"EXPLAIN failed: {exc!r}"
+    with _lock:
+        _set_plan(statement, plan)
+        # Including the queries recorded while the plan was being taken.
+        for other in _log:
+            if other.statement == statement and other.plan == _PENDING:
+                other.plan = plan
+
+
+def _set_plan(statement: str, plan: str) -> None:
+    """Remember the plan of the statement, with `_lock` held."""
+    _plans[statement] = (time.monotonic(), plan)
+    _plans.move_to_end(statement)
+    while len(_plans) > MAX_PLANS:
+        _plans.popitem(last=False)
+
+
+def _explain_engine(conn) -> Engine:
+    """A synchronous engine for the database of the connection."""
+    if not conn.dialect.is_async:
+        return conn.engine
+    # Async engines can't be used from the explaining thread, use the sync
+    # url of the same shard (see `rx_shout.shards`), or the app's database.
+    for shard, url in enumerate(shards.SHARD_ASYNC_DB_URLS):
+        if make_url(url) == conn.engine.url:
+            return rx.model.get_engine(shards.SHARD_DB_URLS[shard])
+    return rx.model.get_engine()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's context, which is dropped even if it fails.
+    if context is not None:
+        context.rx_shout_slowlog_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "rx_shout_slowlog_start", None)
+    if start is None:
+        # The listener was added while the statement was executing.
+        return
+    duration_ms = (time.perf_counter() - start) * 1000
+    if duration_ms < SLOW_QUERY_MS or statement.startswith("EXPLAIN"):
+        return
+    record = SlowQuery(
+        ts=datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        duration_ms=round(duration_ms, 1),
+        statement=statement,
+        parameters=redact(parameters, executemany),
+        handler=metrics.current_handler() or "",
+    )
+    explain = not executemany and statement.lstrip().lower().startswith(_EXPLAINABLE)
+    with _lock:
+        _log.append(record)
+        last = _plans.get(statement)
+        if last is not None:
+            _plans.move_to_end(statement)
+        if last is not None and (
+            last[1] == _PENDING
+            or time.monotonic() - last[0] < SLOW_QUERY_EXPLAIN_INTERVAL
+        ):
+            record.plan = last[1]
+            explain = False
+        elif explain:
+            _set_plan(statement, _PENDING)
+            record.plan = _PENDING
+    if explain:
+        _executor.submit(_explain, _explain_engine(conn), record, statement, parameters)
+
+
+def recent() -> list[SlowQuery]:
+    """The recorded queries, most recent first."""
+    with _lock:
+        return [dataclasses.replace(record) for record in reversed(_log)]
+
+
+def clear() -> None:
+    with _lock:
+        _log.clear()
+        _plans.clear()
+
+
+if SLOW_QUERY_MS > 0:
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
@@ -2,22 +2,51 @@
 
 from __future__ import annotations
 import dataclasses
+import datetime
 import functools
 from typing import Any
 
 import reflex as rx
 import reflex_google_auth
+from reflex.state import _override_base_method
 import sqlalchemy
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlmodel import delete, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from . import s3
+from . import (
+    avatars,
+    compression,
+    drain,
+    google_token,
+    imageinfo,
+    metrics,
+    moderation,
+    ranking,
+    ratelimit,
+    s3,
+    shards,
+    storage,
+    summary,
+    video,
+)
 from .models import Author, Entry, EntryFlags, Topic, UserInfo
 
 
+google_token.install()
+
 # The ID the will be used by the upload component.
 UPLOAD_ID = "upload_image"
 
+RATE_LIMITED_MESSAGE = "You're doing that too often, try again in a moment."
+DRAINING_MESSAGE = "The server is restarting, try again in a moment."
+
+# Orderings of the feed, selected by `State.sort`.
+FEED_ORDER = {
+    "new": (Entry.ts.desc(),),
+    "hot": (Entry.hot_score.desc(), Entry.ts.desc()),
+}
+
 
 @dataclasses.dataclass(kw_only=True, slots=True)
 class LoadingState:
@@ -30,9 +59,98 @@ class LoadingState:
     deleting: int | None = None
 
 
+@dataclasses.dataclass(kw_only=True, slots=True)
+class FeedAuthor:
+    """An author as displayed in the feed, sent once for all their entries."""
+
+    name: str
+    picture: str
+    avatar: str = ""
+    enabled: bool = True
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class FeedReactions:
+    """The reaction counts of an entry, and whether the user reacted to it."""
+
+    likes: int = 0
+    flags: int = 0
+    liked: bool = False
+    flagged: bool = False
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class FeedEntry:
+    """An entry as displayed in the feed, its reactions are kept apart."""
+
+    id: int
+    ts: str
+    text: str
+    image: str | None = None
+    image_width: int | None = None
+    image_height: int | None = None
+    image_placeholder: str = ""
+    video: str = ""
+    author_id: int
+
+
+async def _save_entry(
+    entry: Entry,
+    image_relative_path: str,
+    image_in_bucket: bool = False,
+    video_relative_path: str = "",
+    topic_name: str = "",
+) -> None:
+    """Store the image and video (if any) and insert the entry."""
+    if video_relative_path:
+        # Transcoded videos are always stored locally first.
+        if s3.endpoint_url:
+            entry.video = await rx._x.run_in_thread(
+                functools.partial(
+                    s3.upload_image,
+                    video_relative_path,
+                    delete_original=True,
+                    extra_args={"ContentType": video.VIDEO_CONTENT_TYPE},
+                )
+            )
+        else:
+            entry.video = video_relative_path
+    if image_relative_path:
+        if image_in_bucket:
+            entry.image = s3.public_url(image_relative_path)
+        elif s3.endpoint_url:
+            entry.image = await rx._x.run_in_thread(
+                functools.partial(
+                    s3.upload_image,
+                    image_relative_path,
+                    delete_original=True,
+                )
+            )
+        else:
+            entry.image = image_relative_path
+    shard = shards.shard_for(topic_name)
+    async with shards.asession(shard) as asession:
+        await shards.ensure_user(asession, shard, entry.author_id)
+        asession.add(entry)
+        await summary.add(
+            asession,
+            entry.topic_id,
+            entries=1,
+            posted_at=datetime.datetime.now(datetime.timezone.utc),
+        )
+        await asession.commit()
+
+
 class UserInfoState(reflex_google_auth.GoogleAuthState):
     auth_error: str = ""
 
+    @_override_base_method
+    def _serialize(self) -> bytes:
+        # Applies to this state and the app's states derived from it, see
+        # `rx_shout.compression`. The root state, `GoogleAuthState` and
+        # `UploadProgressState` hold a few small fields and are stored plain.
+        return compression.compress(super()._serialize())
+
     @rx.var(cache=True)
     def user_info(self) -> UserInfo:
         if not self.tokeninfo:
@@ -64,6 +182,7 @@ class UserInfoState(reflex_google_auth.GoogleAuthState):
             return user
 
     @rx.event
+    @metrics.instrument
     async def set_enabled(self, user_id: int, enable: bool = False):
         """Ban or unban a user."""
         if not self.is_admin:
@@ -76,7 +195,11 @@ class UserInfoState(reflex_google_auth.GoogleAuthState):
                 user.enabled = enable
             asession.add(user)
             await asession.commit()
-        return State.load_entries
+        feed = await self.get_state(State)
+        if user_id in feed.authors:
+            feed.authors[user_id] = dataclasses.replace(
+                feed.authors[user_id], enabled=enable
+            )
 
     @rx.var(cache=True)
     def is_admin(self) -> bool:
@@ -94,66 +217,162 @@ class UserInfoState(reflex_google_auth.GoogleAuthState):
             self.auth_error = "Sign in with Google to post."
         return False
 
+    def _client_ip(self) -> str:
+        """The IP of the client, as seen by the reverse proxy (if any)."""
+        forwarded_for = self.router.headers.raw_headers.get("x-forwarded-for", "")
+        # Caddy appends the address it received the request from; earlier
+        # entries come from the client and can be forged.
+        return forwarded_for.split(",")[-1].strip() or self.router.session.client_ip
+
+    async def _is_rate_limited(self, action: str) -> bool:
+        """Take a token for the action, keyed by both user and client IP."""
+        return not await ratelimit.hit(
+            action,
+            f"user:{self.user_info.id}",
+            f"ip:{self._client_ip()}",
+        )
+
 
 class State(UserInfoState):
     """The base state for the App."""
 
-    entries: list[Entry]
+    entries: list[FeedEntry]
+    # Reactions to the entries in the feed, by entry id. Reacting to an entry
+    # only resends this, not the entries.
+    reactions: dict[int, FeedReactions] = {}
+    # Authors of the entries in the feed and search results, by user id.
+    authors: dict[int, FeedAuthor] = {}
+    # User ids of the authors shown by each view (feed, search, ...), so
+    # reloading one view drops only the authors no other view shows.
+    _author_ids: dict[str, set[int]] = {}
     topic: Topic | None
-    entry_flag_counts: dict[int, dict[str, int]]
-    user_entry_flags: dict[int, dict[str, bool]]
     form_error: str = ""
     image_relative_path: str
+    # The image was uploaded directly to the S3 bucket by the browser.
+    image_in_bucket: bool = False
+    # Dimensions and placeholder of the uploaded image.
+    _image_info: imageinfo.ImageInfo | None = None
+    # Video transcoded from the uploaded image, if it is an animated GIF.
+    _video_relative_path: str = ""
     loading: LoadingState = LoadingState()
+    # Key of `FEED_ORDER`.
+    sort: str = "new"
 
     @rx.event
+    @metrics.instrument
     def set_form_error(self, error: str):
         self.form_error = error
 
     @rx.event
+    @metrics.instrument
+    def set_sort(self, sort: str | list[str]):
+        # The segmented control can also report multiple selected items.
+        if isinstance(sort, str) and sort in FEED_ORDER and sort != self.sort:
+            self.sort = sort
+            return State.load_entries
+
+    @rx.event
+    @metrics.instrument
     def reload_after_login(self):
         self.reset()
         self._is_valid_user()
-        return State.load_entries()
+        return [State.load_entries(), State.refresh_avatar()]
 
     @rx.event
+    @metrics.instrument
+    async def refresh_avatar(self):
+        """Cache the user's avatar if it is missing or their picture changed."""
+        if not self._is_valid_user() or not self.tokeninfo.get("picture"):
+            return
+        picture = self.tokeninfo["picture"]
+        async with rx.asession() as asession:
+            author = (
+                await asession.exec(
+                    select(Author).where(Author.user_id == self.user_info.id)
+                )
+            ).one_or_none()
+        # An empty avatar records that caching this picture failed.
+        if author is None or (author.picture == picture and author.avatar is not None):
+            return
+        avatar = await rx._x.run_in_thread(
+            functools.partial(avatars.fetch_avatar, author.user_id, picture)
+        )
+        async with rx.asession() as asession:
+            await asession.execute(
+                sqlalchemy.update(Author)
+                .where(Author.user_id == author.user_id)
+                .values(picture=picture, avatar=avatar or "")
+            )
+            await asession.commit()
+        if author.avatar and author.avatar != avatar:
+            await rx._x.run_in_thread(
+                functools.partial(avatars.remove_avatar, author.avatar)
+            )
+
+    @rx.event
+    @metrics.instrument
     def logout_and_reset(self):
         self.logout()
         return self.reload_after_login()
 
     @rx.event
+    @metrics.instrument
     async def handle_submit(self, form_data: dict[str, Any]):
         """Handle form submission."""
         form_data.pop(UPLOAD_ID, None)
         if not self._is_valid_user():
             return
+        if await self._is_rate_limited("post"):
+            self.form_error = RATE_LIMITED_MESSAGE
+            return
         if not form_data.get("text") and not self.image_relative_path:
             self.form_error = "You have to at least write something or upload an image."
             return
+        if drain.draining:
+            self.form_error = DRAINING_MESSAGE
+            return
+        if self.topic and self.topic.archived_at:
+            self.form_error = "This topic has been archived."
+            return
+        if self.image_in_bucket:
+            # The browser uploaded the image itself, make sure it is really there.
+            size = await rx._x.run_in_thread(
+                functools.partial(s3.object_size, self.image_relative_path)
+            )
+            if size is None or size > storage.MAX_FILE_SIZE:
+                self.image_relative_path = ""
+                self.image_in_bucket = False
+                self._video_relative_path = ""
+                self.form_error = "The uploaded image is missing, please upload it again."
+                return
         self.loading.posting = True
         yield
         try:
-            async with rx.asession() as asession:
-                entry = Entry(**form_data)
-                entry.author_id = self.user_info.id
-                entry.topic_id = self.topic.id if self.topic else None
-                if self.image_relative_path:
-                    if s3.endpoint_url:
-                        entry.image = await rx._x.run_in_thread(
-                            functools.partial(
-                                s3.upload_image,
-                                self.image_relative_path,
-                                delete_original=True,
-                            )
-                        )
-                    else:
-                        entry.image = self.image_relative_path
-                    if not entry.text:
-                        entry.text = ""
-                asession.add(entry)
-                await asession.commit()
-                await asession.refresh(entry)
+            entry = Entry(**form_data)
+            entry.author_id = self.user_info.id
+            entry.topic_id = self.topic.id if self.topic else None
+            entry.hot_score = ranking.hot_score(
+                0, datetime.datetime.now(datetime.timezone.utc)
+            )
+            if self.image_relative_path and not entry.text:
+                entry.text = ""
+            if self.image_relative_path and self._image_info is not None:
+                entry.image_width = self._image_info.width
+                entry.image_height = self._image_info.height
+                entry.image_placeholder = self._image_info.placeholder or None
+            await drain.shielded(
+                _save_entry(
+                    entry,
+                    self.image_relative_path,
+                    self.image_in_bucket,
+                    self._video_relative_path,
+                    self.topic_name,
+                )
+            )
             self.image_relative_path = ""
+            self.image_in_bucket = False
+            self._image_info = None
+            self._video_relative_path = ""
             self.form_error = ""
             yield [rx.set_value("text", ""), rx.redirect(self.router.url)]
         finally:
@@ -186,162 +405,305 @@ class State(UserInfoState):
         return topic
 
     @rx.event
+    @metrics.instrument
     async def load_entries(self):
         """Load entries from the database."""
         self.loading.posts = True
         yield
         try:
-            if self.is_admin:
-                load_options = [
-                    sqlalchemy.orm.selectinload(Entry.author).options(
-                        sqlalchemy.orm.selectinload(Author.user_info)
-                    ),
-                ]
-            else:
-                load_options = [
-                    sqlalchemy.orm.selectinload(Entry.author),
-                ]
-            async with rx.asession() as asession:
+            async with shards.topic_asession(self.topic_name) as asession:
                 self.topic = await self._load_topic(asession)
-                self.entries = (
-                    await asession.exec(
-                        select(Entry)
-                        .where(
-                            Entry.hidden == False,  # noqa: E712
-                            Entry.topic_id == (self.topic.id if self.topic else None),
-                        )
-                        .options(*load_options)
-                        .order_by(Entry.ts.desc())
-                    )
-                ).all()
-                await self._load_entry_flag_counts(asession)
-                await self._load_user_entry_flags(asession)
+                self.entries, self.reactions = await self._load_feed(
+                    asession,
+                    Entry.hidden == False,  # noqa: E712
+                    Entry.topic_id == (self.topic.id if self.topic else None),
+                    order_by=FEED_ORDER[self.sort],
+                    view="feed",
+                )
         finally:
             self.loading.posts = False
             self.loading.liking = None
             self.loading.flagging = None
             self.loading.deleting = None
 
-    async def _load_entry_flag_counts(self, asession: AsyncSession):
-        self.entry_flag_counts = {
-            row[0]: {
-                "flag": row[1] if self.is_admin else 0,
-                "like": row[2],
-            }
-            for row in (
-                await asession.execute(
-                    sqlalchemy.text(
-                        "SELECT "
-                        "entry_id, "
-                        "COUNT(CASE type WHEN 'flag' THEN 1 ELSE NULL END) as flags, "
-                        "COUNT(CASE type WHEN 'like' THEN 1 ELSE NULL END) as likes "
-                        "FROM entryflags "
-                        "GROUP BY entry_id"
-                    ),
-                )
-            ).all()
+    async def _load_feed(
+        self,
+        asession: AsyncSession,
+        *criteria: Any,
+        order_by: tuple[Any, ...] = FEED_ORDER["new"],
+        view: str,
+        append: bool = False,
+    ) -> tuple[list[FeedEntry], dict[int, FeedReactions]]:
+        """Load feed rows matching the criteria, newest first by default.
+
+        Returns the rows and their reactions, by entry id. The authors of the
+        rows become the authors of the view, see `_load_authors`.
+        """
+        entries = (
+            await asession.exec(
+                select(Entry).where(*criteria).order_by(*order_by)
+            )
+        ).all()
+        own = await self._load_reactions(asession, *criteria)
+        async with shards.users_asession(asession) as users:
+            await self._load_authors(
+                users, {entry.author_id for entry in entries}, view, append
+            )
+        is_admin = self.is_admin
+        rows = [
+            FeedEntry(
+                id=entry.id,
+                ts=entry.ts.replace(microsecond=0).isoformat(),
+                text=entry.text,
+                image=entry.image,
+                image_width=entry.image_width,
+                image_height=entry.image_height,
+                image_placeholder=entry.image_placeholder or "",
+                video=entry.video or "",
+                author_id=entry.author_id,
+            )
+            for entry in entries
+        ]
+        reactions = {
+            entry.id: FeedReactions(
+                likes=entry.likes,
+                # Flag counts are only revealed to admins.
+                flags=entry.flags if is_admin else 0,
+                **own.get(entry.id, {}),
+            )
+            for entry in entries
+        }
+        return rows, reactions
+
+    async def _load_authors(
+        self,
+        asession: AsyncSession,
+        user_ids: set[int],
+        view: str,
+        append: bool = False,
+    ):
+        """Set the authors shown by the view, or add to them when appending.
+
+        `authors` keeps the authors of every view, those no view shows
+        anymore are dropped.
+        """
+        if append:
+            user_ids = user_ids | self._author_ids.get(view, set())
+        self._author_ids = {**self._author_ids, view: user_ids}
+        shown = set().union(*self._author_ids.values())
+        authors = {
+            user_id: author
+            for user_id, author in self.authors.items()
+            if user_id in shown
+        }
+        if not user_ids:
+            if len(authors) < len(self.authors):
+                self.authors = authors
+            return
+        # Whether an author is banned is only revealed to admins.
+        enabled = UserInfo.enabled if self.is_admin else sqlalchemy.true()
+        rows = (
+            await asession.exec(
+                select(Author, enabled)
+                .join(UserInfo, UserInfo.id == Author.user_id)
+                .where(Author.user_id.in_(user_ids))
+            )
+        ).all()
+        self.authors = authors | {
+            author.user_id: FeedAuthor(
+                name=author.name,
+                picture=author.picture,
+                avatar=author.avatar or "",
+                enabled=bool(enabled),
+            )
+            for author, enabled in rows
         }
 
-    async def _load_user_entry_flags(self, asession: AsyncSession):
-        if self.user_info.id:
-            self.user_entry_flags = {}
-            for row in (
-                await asession.execute(
-                    sqlalchemy.text(
-                        "SELECT entry_id, type "
-                        "FROM entryflags "
-                        "WHERE user_id = :user_id"
-                    ),
-                    {"user_id": self.user_info.id},
+    async def _load_reactions(
+        self, asession: AsyncSession, *criteria: Any
+    ) -> dict[int, dict[str, bool]]:
+        """Whether the current user liked or flagged the matching entries."""
+        user_id = self.user_info.id
+        if user_id < 0:
+            return {}
+        fields = {"like": "liked", "flag": "flagged"}
+        rows = await asession.execute(
+            sqlalchemy.select(EntryFlags.entry_id, EntryFlags.type)
+            .join(Entry, Entry.id == EntryFlags.entry_id)
+            .where(
+                EntryFlags.user_id == user_id,
+                EntryFlags.type.in_(fields),
+                *criteria,
+            )
+        )
+        reactions = {}
+        for entry_id, type_ in rows.all():
+            reactions.setdefault(entry_id, {})[fields[type_]] = True
+        return reactions
+
+    async def _refresh_reactions(self, asession: AsyncSession, entry_id: int):
+        """Update the reactions to a single entry in the feed.
+
+        The entry is removed from the feed if it was hidden.
+        """
+        counts = (
+            await asession.execute(
+                sqlalchemy.select(Entry.likes, Entry.flags, Entry.hidden).where(
+                    Entry.id == entry_id
                 )
-            ).all():
-                self.user_entry_flags.setdefault(row[0], {})[row[1]] = True
+            )
+        ).first()
+        if counts is None or counts.hidden:
+            self.entries = [row for row in self.entries if row.id != entry_id]
+            return
+        own = await self._load_reactions(asession, Entry.id == entry_id)
+        self.reactions[entry_id] = FeedReactions(
+            likes=counts.likes,
+            flags=counts.flags if self.is_admin else 0,
+            **own.get(entry_id, {}),
+        )
 
     @rx.event
+    @metrics.instrument
     async def delete_entry(self, entry_id: int):
         """Delete an entry from the database."""
         if not self.is_admin:
             return
         self.loading.deleting = entry_id
         yield
-        async with rx.asession() as asession:
-            entry = (
-                await asession.exec(select(Entry).where(Entry.id == entry_id))
-            ).first()
-            if entry:
-                entry.hidden = True
-            asession.add(entry)
-            await asession.commit()
-        yield State.load_entries
+        try:
+            async with shards.topic_asession(self.topic_name) as asession:
+                await moderation.set_hidden(asession, Entry.id == entry_id, hidden=True)
+                await asession.commit()
+            self.entries = [row for row in self.entries if row.id != entry_id]
+        finally:
+            self.loading.deleting = None
 
     async def _flag_entry(self, entry_id: int, type_: str):
         if not self._is_valid_user():
             return
-        async with rx.asession() as asession:
-            asession.add(
-                EntryFlags(user_id=self.user_info.id, entry_id=entry_id, type=type_)
+        shard = shards.shard_for(self.topic_name)
+        async with shards.asession(shard) as asession:
+            await shards.ensure_user(asession, shard, self.user_info.id)
+            # Each user reacts at most once, the counts are used for ranking.
+            insert = (
+                postgresql.insert
+                if asession.bind.dialect.name == "postgresql"
+                else sqlite.insert
             )
-            await asession.commit()
+            result = await asession.execute(
+                insert(EntryFlags)
+                .values(user_id=self.user_info.id, entry_id=entry_id, type=type_)
+                .on_conflict_do_nothing()
+            )
+            # Concurrent reactions of the same user insert one row at most.
+            if result.rowcount:
+                if type_ == "like":
+                    await ranking.update_likes(asession, entry_id, 1)
+                else:
+                    await moderation.update_flags(asession, entry_id, 1)
+                await asession.commit()
+            await self._refresh_reactions(asession, entry_id)
 
     @rx.event
+    @metrics.instrument
     async def like_entry(self, entry_id: int):
         """Like an entry."""
+        if not self._is_valid_user():
+            return
+        if await self._is_rate_limited("react"):
+            yield rx.toast(RATE_LIMITED_MESSAGE)
+            return
         self.loading.liking = entry_id
         yield
-        await self._flag_entry(entry_id, "like")
-        yield State.load_entries
+        try:
+            await self._flag_entry(entry_id, "like")
+        finally:
+            self.loading.liking = None
 
     @rx.event
+    @metrics.instrument
     async def flag_entry(self, entry_id: int):
         """Flag an entry."""
+        if not self._is_valid_user():
+            return
+        if await self._is_rate_limited("react"):
+            yield rx.toast(RATE_LIMITED_MESSAGE)
+            return
         self.loading.flagging = entry_id
         yield
-        await self._flag_entry(entry_id, "flag")
-        yield State.load_entries
+        try:
+            await self._flag_entry(entry_id, "flag")
+        finally:
+            self.loading.flagging = None
 
     @rx.event
+    @metrics.instrument
     async def unlike_entry(self, entry_id: int):
         """Unlike an entry."""
         if not self._is_valid_user():
             return
+        if await self._is_rate_limited("react"):
+            yield rx.toast(RATE_LIMITED_MESSAGE)
+            return
         self.loading.liking = entry_id
         yield
-        async with rx.asession() as asession:
-            await asession.exec(
-                delete(EntryFlags).where(
-                    EntryFlags.user_id == self.user_info.id,
-                    EntryFlags.entry_id == entry_id,
-                    EntryFlags.type == "like",
+        try:
+            async with shards.topic_asession(self.topic_name) as asession:
+                result = await asession.exec(
+                    delete(EntryFlags).where(
+                        EntryFlags.user_id == self.user_info.id,
+                        EntryFlags.entry_id == entry_id,
+                        EntryFlags.type == "like",
+                    )
                 )
-            )
-            await asession.commit()
-        yield State.load_entries
+                if result.rowcount:
+                    await ranking.update_likes(asession, entry_id, -result.rowcount)
+                await asession.commit()
+                await self._refresh_reactions(asession, entry_id)
+        finally:
+            self.loading.liking = None
 
     @rx.event
+    @metrics.instrument
     async def unflag_entry(self, entry_id: int):
         """Unflag an entry."""
         if not self._is_valid_user():
             return
+        if await self._is_rate_limited("react"):
+            yield rx.toast(RATE_LIMITED_MESSAGE)
+            return
         self.loading.flagging = entry_id
         yield
-        query = delete(EntryFlags).where(
-            EntryFlags.entry_id == entry_id,
-            EntryFlags.type == "flag",
-        )
-        if not self.is_admin:
-            # Only allow users to unflag their own flags.
-            query = query.where(EntryFlags.user_id == self.user_info.id)
-        async with rx.asession() as asession:
-            await asession.exec(query)
-            await asession.commit()
-        yield State.load_entries
+        try:
+            async with shards.topic_asession(self.topic_name) as asession:
+                if self.is_admin:
+                    await moderation.dismiss_flags(asession, entry_id)
+                else:
+                    # Only allow users to unflag their own flags.
+                    result = await asession.exec(
+                        delete(EntryFlags).where(
+                            EntryFlags.user_id == self.user_info.id,
+                            EntryFlags.entry_id == entry_id,
+                            EntryFlags.type == "flag",
+                        )
+                    )
+                    if result.rowcount:
+                        await moderation.update_flags(
+                            asession, entry_id, -result.rowcount
+                        )
+                await asession.commit()
+                await self._refresh_reactions(asession, entry_id)
+        finally:
+            self.loading.flagging = None
 
     @rx.event
+    @metrics.instrument
     async def edit_topic_description(self, description: str):
         """Edit the topic description."""
         if not self.is_admin or self.topic is None:
             return
-        async with rx.asession() as asession:
+        async with shards.topic_asession(self.topic_name) as asession:
             self.topic.description = description
             asession.add(self.topic)
             await asession.commit()
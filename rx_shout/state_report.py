@@ -0,0 +1,123 @@
+"""Report the size of the client state stored in redis, by substate.
+
+    python -m rx_shout.state_report [--redis-url redis://redis:6379]
+
+Each substate of each client is stored in its own key, `<token>_<state>`.
+For every substate the report shows how many sessions hold it, the bytes
+stored (after compression, see `rx_shout.compression`) and before
+compression, followed by the distribution of the total size per session and
+how soon the sessions expire. Keys are read with SCAN in batches, so it is
+safe to run against a live server.
+"""
+
+import argparse
+import os
+import statistics
+from collections import defaultdict
+
+import reflex as rx
+import redis
+
+from . import compression
+
+BATCH_SIZE = 500
+
+
+def _scan(client: redis.Redis, batch_size: int):
+    """Stored size, uncompressed size and TTL of every substate key."""
+    root = rx.State.get_full_name()
+    keys = []
+
+    def fetch():
+        pipeline = client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.get(key)
+            pipeline.ttl(key)
+        values = pipeline.execute()
+        for key, payload, ttl in zip(keys, values[::2], values[1::2]):
+            if payload is not None:
+                yield key, len(payload), compression.raw_size(payload), ttl
+        keys.clear()
+
+    for key in client.scan_iter(count=batch_size):
+        key = key.decode()
+        _, _, state_name = key.partition("_")
+        # Skip locks, rate limit buckets and other keys.
+        if not state_name.startswith(root):
+            continue
+        keys.append(key)
+        if len(keys) >= batch_size:
+            yield from fetch()
+    yield from fetch()
+
+
+def _format_bytes(n: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--redis-url",
+        default=os.environ.get("REFLEX_REDIS_URL"),
+        help="Defaults to REFLEX_REDIS_URL.",
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    if not args.redis_url:
+        parser.error("Set --redis-url or REFLEX_REDIS_URL.")
+
+    client = redis.Redis.from_url(args.redis_url)
+    # state name -> [sessions, stored bytes, uncompressed bytes, largest]
+    by_state = defaultdict(lambda: [0, 0, 0, 0])
+    sessions = defaultdict(int)
+    ttls = {}
+    for key, stored, raw, ttl in _scan(client, args.batch_size):
+        token, _, state_name = key.partition("_")
+        totals = by_state[state_name]
+        totals[0] += 1
+        totals[1] += stored
+        totals[2] += raw
+        totals[3] = max(totals[3], stored)
+        sessions[token] += stored
+        ttls[token] = max(ttls.get(token, -1), ttl)
+    if not sessions:
+        print("No client state stored.")
+        return
+
+    print(
+        f"{'substate':<60} {'sessions':>9} {'stored':>11} {'uncompressed':>13}"
+        f" {'mean':>10} {'max':>10}"
+    )
+    for state_name, (count, stored, raw, largest) in sorted(
+        by_state.items(), key=lambda item: -item[1][1]
+    ):
+        print(
+            f"{state_name.rpartition('.')[2]:<60} {count:>9} "
+            f"{_format_bytes(stored):>11} {_format_bytes(raw):>13} "
+            f"{_format_bytes(stored / count):>10} {_format_bytes(largest):>10}"
+        )
+    sizes = sorted(sessions.values())
+    print()
+    print(
+        f"{len(sizes)} sessions, {_format_bytes(sum(sizes))} stored: "
+        f"p50 {_format_bytes(statistics.median(sizes))}, "
+        f"p99 {_format_bytes(sizes[int(0.99 * (len(sizes) - 1))])}, "
+        f"max {_format_bytes(sizes[-1])} per session"
+    )
+    expiring = sorted(ttl for ttl in ttls.values() if ttl >= 0)
+    if expiring:
+        print(
+            f"Sessions expire in {expiring[0]}s to {expiring[-1]}s, "
+            f"median {statistics.median(expiring):.0f}s"
+        )
+    memory = client.info("memory")
+    print(f"Redis memory used: {memory['used_memory_human']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Layout of uploaded files within the upload directory.
+
+With the default ``UPLOAD_LAYOUT=sharded`` each upload is stored under two
+levels of hashed subdirectories (`ab/cd/abcd..._name.png`), which keeps
+directories small no matter how many files are uploaded. ``flat`` stores all
+uploads directly in the upload directory, as older versions did. Both
+layouts can be served side by side, since entries store the relative path.
+
+Browsers downscale images so neither side exceeds ``UPLOAD_MAX_DIMENSION``
+pixels (default 2048, 0 uploads the original) before uploading them.
+"""
+
+import os
+import uuid
+from pathlib import Path
+
+import reflex as rx
+
+UPLOAD_LAYOUT = os.environ.get("UPLOAD_LAYOUT", "sharded")
+MAX_FILE_SIZE = 5 * 1024**2  # 5 MB
+MAX_IMAGE_DIMENSION = int(os.environ.get("UPLOAD_MAX_DIMENSION", "2048"))
+ACCEPTED_IMAGE_TYPES = {
+    "image/png": [".png"],
+    "image/jpeg": [".jpg", ".jpeg"],
+    "image/gif": [".gif"],
+    "image/webp": [".webp"],
+}
+
+
+def new_upload_path(filename: str) -> str:
+    """A unique path, relative to the upload dir, for a new upload."""
+    # Never trust directory components sent by the client.
+    name = Path(filename).name
+    if UPLOAD_LAYOUT == "flat":
+        return f"{uuid.uuid4()}_{name}"
+    key = uuid.uuid4().hex
+    return f"{key[:2]}/{key[2:4]}/{key}_{name}"
+
+
+def upload_path(relative_path: str) -> Path:
+    """Absolute path of an uploaded file."""
+    return Path(rx.get_upload_dir()) / relative_path
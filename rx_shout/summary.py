@@ -0,0 +1,162 @@
+"""Per-topic entry counts, like totals and last activity.
+
+The `topicsummary` table holds one row per topic, counting its visible
+entries and their likes, and when the last entry was posted. It is updated
+with upserts in the same transactions that post, like, hide or restore
+entries, so reading the summaries of many topics is a single indexed query
+(see the `/api/topics/summary` endpoint in `api.py`).
+
+Bulk changes, like imports and archiving, recompute the rows of the topics
+they touch. Recompute all rows with:
+
+    python -m rx_shout.summary
+"""
+
+import argparse
+import datetime
+from collections import Counter
+
+import reflex as rx
+import sqlalchemy
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .models import Entry, Topic, TopicSummary
+
+BATCH_SIZE = 1000
+
+
+def _upsert(dialect_name: str, rows: list[dict], increment: bool):
+    """Insert summary rows, adding to (or replacing) existing ones."""
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    statement = insert(TopicSummary).values(rows)
+    excluded = statement.excluded
+    if increment:
+        set_ = {
+            "entries": TopicSummary.entries + excluded.entries,
+            "likes": TopicSummary.likes + excluded.likes,
+            "last_activity_at": sqlalchemy.func.coalesce(
+                excluded.last_activity_at, TopicSummary.last_activity_at
+            ),
+        }
+    else:
+        set_ = {
+            "entries": excluded.entries,
+            "likes": excluded.likes,
+            "last_activity_at": excluded.last_activity_at,
+        }
+    return statement.on_conflict_do_update(
+        index_elements=[TopicSummary.topic_id], set_=set_
+    )
+
+
+async def add(
+    asession: AsyncSession,
+    topic_id: int | None,
+    entries: int = 0,
+    likes: int = 0,
+    posted_at: datetime.datetime | None = None,
+) -> None:
+    """Adjust the summary of a topic, without committing."""
+    await add_many(asession, {topic_id: (entries, likes)}, posted_at=posted_at)
+
+
+async def add_many(
+    asession: AsyncSession,
+    changes: dict[int | None, tuple[int, int]],
+    posted_at: datetime.datetime | None = None,
+) -> None:
+    """Adjust the entry and like counts of several topics, without committing."""
+    rows = [
+        {
+            "topic_id": topic_id,
+            "entries": entries,
+            "likes": likes,
+            "last_activity_at": posted_at,
+        }
+        # Sorted, so concurrent transactions lock the rows in the same order.
+        for topic_id, (entries, likes) in sorted(
+            (topic_id, counts)
+            for topic_id, counts in changes.items()
+            # Entries outside of any topic are not summarized.
+            if topic_id is not None
+        )
+        if entries or likes or posted_at
+    ]
+    if rows:
+        conn = await asession.connection()
+        await asession.execute(_upsert(conn.dialect.name, rows, increment=True))
+
+
+def count_changes(
+    rows: list[tuple[int | None, int]], sign: int
+) -> dict[int | None, tuple[int, int]]:
+    """Changes for adding (`sign=1`) or removing (`sign=-1`) entries.
+
+    `rows` are the `(topic_id, likes)` of the entries.
+    """
+    entries, likes = Counter(), Counter()
+    for topic_id, entry_likes in rows:
+        entries[topic_id] += sign
+        likes[topic_id] += sign * entry_likes
+    return {topic_id: (entries[topic_id], likes[topic_id]) for topic_id in entries}
+
+
+def refresh(conn: Connection, topic_ids: list[int] | None = None) -> int:
+    """Recompute the summaries of the topics, or of all topics.
+
+    Returns the number of summaries written.
+    """
+    statement = (
+        sqlalchemy.select(
+            Entry.topic_id,
+            sqlalchemy.func.count(Entry.id),
+            sqlalchemy.func.coalesce(sqlalchemy.func.sum(Entry.likes), 0),
+            sqlalchemy.func.max(Entry.ts),
+        )
+        .where(
+            Entry.topic_id != None,  # noqa: E711
+            Entry.hidden == False,  # noqa: E712
+        )
+        .group_by(Entry.topic_id)
+    )
+    if topic_ids is None:
+        topic_ids = list(conn.execute(sqlalchemy.select(Topic.id)).scalars())
+    else:
+        statement = statement.where(Entry.topic_id.in_(topic_ids))
+    counts = dict.fromkeys(topic_ids, (0, 0, None))
+    counts.update(
+        (topic_id, (entries, likes, last_activity_at))
+        for topic_id, entries, likes, last_activity_at in conn.execute(statement)
+    )
+    rows = [
+        {
+            "topic_id": topic_id,
+            "entries": entries,
+            "likes": likes,
+            "last_activity_at": last_activity_at,
+        }
+        for topic_id, (entries, likes, last_activity_at) in sorted(counts.items())
+    ]
+    for start in range(0, len(rows), BATCH_SIZE):
+        conn.execute(
+            _upsert(
+                conn.dialect.name, rows[start : start + BATCH_SIZE], increment=False
+            )
+        )
+    return len(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", help="Defaults to the app's database.")
+    args = parser.parse_args()
+
+    with rx.model.get_engine(args.db_url).begin() as conn:
+        count = refresh(conn)
+    print(f"Recomputed {count} topic summaries")
+
+
+if __name__ == "__main__":
+    main()
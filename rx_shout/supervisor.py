@@ -0,0 +1,92 @@
+"""Run several backend worker processes and stop them gracefully.
+
+Each worker is a separate `reflex run --backend-only` process listening on
+its own port, starting at ``BACKEND_BASE_PORT`` (default 8000). Caddy balances
+over them with sticky sessions (see `Caddyfile`). Since state has to be shared
+between the workers, more than one worker requires ``REFLEX_REDIS_URL``.
+
+On SIGTERM (or SIGINT) every worker is asked to stop and given
+``DRAIN_TIMEOUT`` seconds, plus a small margin, to finish in-flight work
+before it is killed. Workers that exit unexpectedly are restarted.
+
+    BACKEND_WORKERS=4 python -m rx_shout.supervisor
+"""
+
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from .drain import timeout as drain_timeout
+
+workers = int(os.environ.get("BACKEND_WORKERS", "1"))
+base_port = int(os.environ.get("BACKEND_BASE_PORT", "8000"))
+
+logger = logging.getLogger(__name__)
+
+
+def spawn(port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            "reflex",
+            "run",
+            "--env",
+            "prod",
+            "--backend-only",
+            "--backend-port",
+            str(port),
+        ],
+        # Own process group, so the whole worker tree can be signalled.
+        start_new_session=True,
+    )
+
+
+def signal_worker(proc: subprocess.Popen, signum: int) -> None:
+    try:
+        os.killpg(proc.pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    if workers > 1 and not os.environ.get("REFLEX_REDIS_URL"):
+        sys.exit("BACKEND_WORKERS > 1 requires REFLEX_REDIS_URL to share state.")
+    procs = {base_port + n: spawn(base_port + n) for n in range(workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for proc in procs.values():
+            signal_worker(proc, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while not stopping:
+        for port, proc in procs.items():
+            if proc.poll() is not None and not stopping:
+                logger.warning(
+                    "Backend worker on port %s exited (%s), restarting",
+                    port,
+                    proc.returncode,
+                )
+                procs[port] = spawn(port)
+        time.sleep(1)
+
+    deadline = time.monotonic() + drain_timeout + 5
+    for proc in procs.values():
+        try:
+            proc.wait(timeout=max(0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            logger.warning(
+                "Killing backend worker %s, it did not drain in time", proc.pid
+            )
+            signal_worker(proc, signal.SIGKILL)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,480 @@
+"""Bulk export and import of topics.
+
+    # Write a topic to a directory, optionally with its uploaded images.
+    python -m rx_shout.transfer export /blog/post-1 backup/ --format parquet --images
+
+    # Load it into the configured database, optionally under a new name.
+    python -m rx_shout.transfer import backup/ --topic /blog/post-1-copy
+
+An export is a directory with `topic.json` and `users`, `entries` and `flags`
+files in NDJSON (the default), gzipped NDJSON or Parquet (requires pyarrow).
+Rows are read with server-side cursors and written in batches, so memory use
+does not grow with the size of the topic.
+
+Imports run in a single transaction. Users are matched to existing accounts
+by their Google id, entries get new ids, and rows are written with `COPY` on
+postgres and batched `executemany` on SQLite. Entries and flags are both
+sorted by entry id, so flags are remapped one batch of entries at a time.
+"""
+
+import argparse
+import gzip
+import json
+import shutil
+import sys
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from pathlib import Path
+
+import reflex as rx
+import sqlalchemy
+from sqlalchemy.engine import Connection, Engine
+
+from . import ranking, s3, storage, summary, video
+from .models import Author, Entry, EntryFlags, Topic, UserInfo
+
+BATCH_SIZE = 5000
+# The first user is the admin, imported users must never get this id.
+ADMIN_USER_ID = 1
+FORMATS = {"ndjson": ".ndjson", "ndjson.gz": ".ndjson.gz", "parquet": ".parquet"}
+# Columns of each exported file, with their Parquet types.
+COLUMNS = {
+    "users": {
+        "id": "int64",
+        "ext_id": "string",
+        "email": "string",
+        "enabled": "bool_",
+        "name": "string",
+        "picture": "string",
+    },
+    "entries": {
+        "id": "int64",
+        "ts": "string",
+        "author_id": "int64",
+        "text": "string",
+        "image": "string",
+        "image_width": "int64",
+        "image_height": "int64",
+        "image_placeholder": "string",
+        "video": "string",
+        "hidden": "bool_",
+    },
+    "flags": {
+        "user_id": "int64",
+        "entry_id": "int64",
+        "type": "string",
+        "ts": "string",
+    },
+}
+
+
+def _open_text(path: Path, mode: str):
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t")
+    return path.open(mode)
+
+
+class NdjsonWriter:
+    def __init__(self, path: Path, columns: dict[str, str]):
+        self.file = _open_text(path, "w")
+
+    def write(self, rows: list[dict]) -> None:
+        self.file.writelines(json.dumps(row) + "\n" for row in rows)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path: Path, columns: dict[str, str]):
+        # pyarrow is large and optional, only import it when it is used.
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema(
+            [(name, getattr(pa, type_)()) for name, type_ in columns.items()]
+        )
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows: list[dict]) -> None:
+        self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+def read_batches(path: Path, batch_size: int) -> Iterator[list[dict]]:
+    """Batches of rows from an NDJSON or Parquet file."""
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield batch.to_pylist()
+        return
+    with _open_text(path, "r") as file:
+        batch = []
+        for line in file:
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def _stream(
+    conn: Connection, statement: sqlalchemy.Select, batch_size: int
+) -> Iterator[list[dict]]:
+    """Rows of the statement in batches, using a server-side cursor."""
+    result = conn.execution_options(
+        stream_results=True, yield_per=batch_size
+    ).execute(statement)
+    for partition in result.mappings().partitions():
+        yield [dict(row) for row in partition]
+
+
+def export_topic(
+    engine: Engine,
+    topic_name: str,
+    dest: Path,
+    file_format: str = "ndjson",
+    images: bool = False,
+    batch_size: int = BATCH_SIZE,
+) -> dict[str, int]:
+    """Write the topic to the `dest` directory, returning the row counts."""
+    dest.mkdir(parents=True, exist_ok=True)
+    writer_cls = ParquetWriter if file_format == "parquet" else NdjsonWriter
+    counts = {}
+    with engine.connect() as conn:
+        topic = conn.execute(
+            sqlalchemy.select(Topic.__table__).where(Topic.name == topic_name)
+        ).mappings().one_or_none()
+        if topic is None:
+            raise LookupError(f"No topic named {topic_name!r}")
+        (dest / "topic.json").write_text(
+            json.dumps(
+                {
+                    "name": topic["name"],
+                    "description": topic["description"],
+                    "locked": topic["locked"],
+                }
+            )
+        )
+        in_topic = Entry.topic_id == topic["id"]
+        user_ids = sqlalchemy.union(
+            sqlalchemy.select(Entry.author_id).where(in_topic),
+            sqlalchemy.select(EntryFlags.user_id)
+            .join(Entry, Entry.id == EntryFlags.entry_id)
+            .where(in_topic),
+        )
+        statements = {
+            "users": sqlalchemy.select(
+                UserInfo.id,
+                UserInfo.ext_id,
+                UserInfo.email,
+                UserInfo.enabled,
+                Author.name,
+                Author.picture,
+            )
+            .outerjoin(Author, Author.user_id == UserInfo.id)
+            .where(UserInfo.id.in_(user_ids))
+            .order_by(UserInfo.id),
+            "entries": sqlalchemy.select(
+                *(getattr(Entry, column) for column in COLUMNS["entries"])
+            )
+            .where(in_topic)
+            .order_by(Entry.id),
+            "flags": sqlalchemy.select(
+                EntryFlags.user_id, EntryFlags.entry_id, EntryFlags.type, EntryFlags.ts
+            )
+            .join(Entry, Entry.id == EntryFlags.entry_id)
+            .where(in_topic)
+            .order_by(EntryFlags.entry_id, EntryFlags.id),
+        }
+        for name, statement in statements.items():
+            writer = writer_cls(dest / f"{name}{FORMATS[file_format]}", COLUMNS[name])
+            counts[name] = 0
+            try:
+                for rows in _stream(conn, statement, batch_size):
+                    if name == "flags":
+                        for row in rows:
+                            row["ts"] = row["ts"] and row["ts"].isoformat()
+                    if name == "entries":
+                        for row in rows:
+                            row["ts"] = row["ts"].isoformat()
+                            if images and row["image"]:
+                                _export_image(row["image"], dest)
+                            if images and row["video"]:
+                                _export_image(row["video"], dest)
+                    writer.write(rows)
+                    counts[name] += len(rows)
+            finally:
+                writer.close()
+    return counts
+
+
+def _export_image(image: str, dest: Path) -> None:
+    """Copy a locally stored image, images in the bucket keep their url."""
+    if image.startswith("http"):
+        return
+    source = storage.upload_path(image)
+    if source.exists():
+        target = dest / "images" / image
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source, target)
+
+
+def _reserve_ids(conn: Connection, table: str, n: int) -> list[int]:
+    """Allocate `n` unused primary keys for the table."""
+    if not n:
+        return []
+    if conn.dialect.name == "postgresql":
+        return list(
+            conn.execute(
+                sqlalchemy.text(
+                    "SELECT nextval(pg_get_serial_sequence(:table, 'id')) "
+                    "FROM generate_series(1, :n)"
+                ),
+                {"table": table, "n": n},
+            ).scalars()
+        )
+    # SQLite serializes writers, this transaction already holds the lock.
+    start = conn.execute(
+        sqlalchemy.text(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")
+    ).scalar_one()
+    return list(range(start, start + n))
+
+
+def _bulk_insert(
+    conn: Connection, table: sqlalchemy.Table, rows: list[dict]
+) -> None:
+    if not rows:
+        return
+    if conn.dialect.name == "postgresql":
+        columns = list(rows[0])
+        cursor = conn.connection.driver_connection.cursor()
+        with cursor.copy(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN"
+        ) as copy:
+            for row in rows:
+                copy.write_row([row[column] for column in columns])
+    else:
+        conn.execute(sqlalchemy.insert(table), rows)
+
+
+def _import_users(conn: Connection, batches: Iterable[list[dict]]) -> dict[int, int]:
+    """Create missing users, mapping exported user ids to local ones."""
+    user_ids = {}
+    for batch in batches:
+        local_ids = dict(
+            conn.execute(
+                sqlalchemy.select(UserInfo.ext_id, UserInfo.id).where(
+                    UserInfo.ext_id.in_([row["ext_id"] for row in batch])
+                )
+            ).all()
+        )
+        new = [row for row in batch if row["ext_id"] not in local_ids]
+        reserved = _reserve_ids(conn, UserInfo.__tablename__, len(new) + 1)
+        reserved = [id_ for id_ in reserved if id_ != ADMIN_USER_ID][: len(new)]
+        for row, id_ in zip(new, reserved):
+            local_ids[row["ext_id"]] = id_
+        _bulk_insert(
+            conn,
+            UserInfo.__table__,
+            [
+                {
+                    "id": local_ids[row["ext_id"]],
+                    "ext_id": row["ext_id"],
+                    "email": row["email"],
+                    "enabled": row["enabled"],
+                }
+                for row in new
+            ],
+        )
+        _bulk_insert(
+            conn,
+            Author.__table__,
+            [
+                {
+                    "user_id": local_ids[row["ext_id"]],
+                    "name": row["name"],
+                    "picture": row["picture"],
+                }
+                for row in new
+                if row["name"] is not None
+            ],
+        )
+        user_ids.update({row["id"]: local_ids[row["ext_id"]] for row in batch})
+    return user_ids
+
+
+def _import_image(image: str, source: Path, extra_args: dict | None = None) -> str:
+    """Store an exported image (or video), returning its new `Entry` value."""
+    if image.startswith("http") or not (source / "images" / image).exists():
+        return image
+    target = storage.upload_path(image)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(source / "images" / image, target)
+    if s3.endpoint_url:
+        return s3.upload_image(image, delete_original=True, extra_args=extra_args)
+    return image
+
+
+def import_topic(
+    engine: Engine,
+    source: Path,
+    topic_name: str | None = None,
+    images: bool = False,
+    batch_size: int = BATCH_SIZE,
+) -> dict[str, int]:
+    """Load an exported topic, returning the row counts."""
+    meta = json.loads((source / "topic.json").read_text())
+    topic_name = topic_name or meta["name"]
+    suffix = next(
+        (
+            suffix
+            for suffix in FORMATS.values()
+            if (source / f"entries{suffix}").exists()
+        ),
+        ".ndjson",
+    )
+    counts = {"users": 0, "entries": 0, "flags": 0}
+    with engine.begin() as conn:
+        if conn.execute(
+            sqlalchemy.select(Topic.id).where(Topic.name == topic_name)
+        ).first():
+            raise ValueError(f"Topic {topic_name!r} already exists")
+        topic_id = conn.execute(
+            sqlalchemy.insert(Topic)
+            .values(
+                name=topic_name,
+                description=meta["description"],
+                locked=meta["locked"],
+            )
+            .returning(Topic.id)
+        ).scalar_one()
+        user_ids = _import_users(
+            conn, read_batches(source / f"users{suffix}", batch_size)
+        )
+        counts["users"] = len(user_ids)
+
+        flags = (
+            row
+            for rows in read_batches(source / f"flags{suffix}", batch_size)
+            for row in rows
+        )
+        flag = next(flags, None)
+        for batch in read_batches(source / f"entries{suffix}", batch_size):
+            reserved = _reserve_ids(conn, Entry.__tablename__, len(batch))
+            entry_ids = {row["id"]: id_ for row, id_ in zip(batch, reserved)}
+            posted = {row["id"]: datetime.fromisoformat(row["ts"]) for row in batch}
+            _bulk_insert(
+                conn,
+                Entry.__table__,
+                [
+                    {
+                        "id": entry_ids[row["id"]],
+                        "ts": posted[row["id"]],
+                        "author_id": user_ids[row["author_id"]],
+                        "topic_id": topic_id,
+                        "text": row["text"],
+                        "image": (
+                            _import_image(row["image"], source)
+                            if images and row["image"]
+                            else row["image"]
+                        ),
+                        # Missing from exports of older versions.
+                        "image_width": row.get("image_width"),
+                        "image_height": row.get("image_height"),
+                        "image_placeholder": row.get("image_placeholder"),
+                        "video": (
+                            _import_image(
+                                row["video"],
+                                source,
+                                {"ContentType": video.VIDEO_CONTENT_TYPE},
+                            )
+                            if images and row.get("video")
+                            else row.get("video")
+                        ),
+                        "hidden": row["hidden"],
+                    }
+                    for row in batch
+                ],
+            )
+            counts["entries"] += len(batch)
+            # Flags are sorted by entry id, like the entries.
+            flag_rows = []
+            while flag is not None and flag["entry_id"] <= batch[-1]["id"]:
+                flag_rows.append(
+                    {
+                        "user_id": user_ids[flag["user_id"]],
+                        "entry_id": entry_ids[flag["entry_id"]],
+                        "type": flag["type"],
+                        # Missing from exports of older versions, date the
+                        # reaction to its entry as the migration did.
+                        "ts": (
+                            datetime.fromisoformat(flag["ts"])
+                            if flag.get("ts")
+                            else posted[flag["entry_id"]]
+                        ),
+                    }
+                )
+                if len(flag_rows) >= batch_size:
+                    _bulk_insert(conn, EntryFlags.__table__, flag_rows)
+                    counts["flags"] += len(flag_rows)
+                    flag_rows = []
+                flag = next(flags, None)
+            _bulk_insert(conn, EntryFlags.__table__, flag_rows)
+            counts["flags"] += len(flag_rows)
+        ranking.recompute(conn, Entry.topic_id == topic_id, batch_size=batch_size)
+        summary.refresh(conn, [topic_id])
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", help="Defaults to the app's database.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Write a topic to files.")
+    export_parser.add_argument("topic", help="Name of the topic to export.")
+    export_parser.add_argument("dest", type=Path, help="Directory to write.")
+    export_parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    export_parser.add_argument(
+        "--images", action="store_true", help="Include locally stored images."
+    )
+    import_parser = subparsers.add_parser("import", help="Load an exported topic.")
+    import_parser.add_argument("source", type=Path, help="Exported directory.")
+    import_parser.add_argument("--topic", help="Import under a different name.")
+    import_parser.add_argument(
+        "--images", action="store_true", help="Store the exported images."
+    )
+    args = parser.parse_args()
+
+    engine = rx.model.get_engine(args.db_url)
+    try:
+        if args.command == "export":
+            counts = export_topic(
+                engine,
+                args.topic,
+                args.dest,
+                file_format=args.format,
+                images=args.images,
+                batch_size=args.batch_size,
+            )
+        else:
+            counts = import_topic(
+                engine,
+                args.source,
+                topic_name=args.topic,
+                images=args.images,
+                batch_size=args.batch_size,
+            )
+    except (LookupError, ValueError) as exc:
+        sys.exit(str(exc))
+    print(", ".join(f"{count} {name}" for name, count in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Transcoding of animated GIF uploads to MP4 video.
+
+An animated GIF is several times larger than the same animation encoded as
+H.264. When an uploaded GIF has more than one frame, it is transcoded with
+ffmpeg and the video is stored next to the GIF, which is kept as the fallback
+for browsers that can't play the video.
+
+ffmpeg runs in a separate process; at most ``TRANSCODE_WORKERS`` (default 2)
+transcodes run at once per backend worker, each for at most
+``TRANSCODE_TIMEOUT`` seconds (default 60). Transcoding is enabled when the
+``FFMPEG`` executable (default `ffmpeg`) is found, set ``GIF_TRANSCODE=0`` to
+disable it.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from . import storage
+
+logger = logging.getLogger(__name__)
+
+FFMPEG = os.environ.get("FFMPEG", "ffmpeg")
+TRANSCODE_WORKERS = int(os.environ.get("TRANSCODE_WORKERS", "2"))
+TRANSCODE_TIMEOUT = float(os.environ.get("TRANSCODE_TIMEOUT", "60"))
+enabled = os.environ.get("GIF_TRANSCODE", "1") != "0" and bool(shutil.which(FFMPEG))
+VIDEO_SUFFIX = ".mp4"
+VIDEO_CONTENT_TYPE = "video/mp4"
+_FFMPEG_ARGS = [
+    "-hide_banner",
+    "-loglevel", "error",
+    "-an",
+    "-c:v", "libx264",
+    "-preset", "veryfast",
+    "-crf", "28",
+    # H.264 needs even dimensions, and most players only support 4:2:0.
+    "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2",
+    "-pix_fmt", "yuv420p",
+    # Start playing before the whole file is downloaded.
+    "-movflags", "+faststart",
+]
+# The threads only wait for ffmpeg, they bound the number of its processes.
+_executor = ThreadPoolExecutor(
+    max_workers=TRANSCODE_WORKERS, thread_name_prefix="transcode"
+)
+
+
+def _skip_sub_blocks(data: bytes, ix: int) -> int:
+    """Index after the data sub-blocks starting at `ix`."""
+    while ix < len(data) and data[ix]:
+        ix += data[ix] + 1
+    return ix + 1
+
+
+def is_animated_gif(data: bytes) -> bool:
+    """Whether the image is a GIF with more than one frame."""
+    if data[:6] not in (b"GIF87a", b"GIF89a") or len(data) < 13:
+        return False
+    ix = 13
+    if data[10] & 0x80:
+        # Global color table.
+        ix += 3 * 2 ** ((data[10] & 0x07) + 1)
+    frames = 0
+    while ix < len(data):
+        block = data[ix]
+        if block == 0x21:
+            # Extension: label, then sub-blocks.
+            ix = _skip_sub_blocks(data, ix + 2)
+        elif block == 0x2C:
+            frames += 1
+            if frames > 1:
+                return True
+            if ix + 10 > len(data):
+                return False
+            packed = data[ix + 9]
+            ix += 10
+            if packed & 0x80:
+                # Local color table.
+                ix += 3 * 2 ** ((packed & 0x07) + 1)
+            # LZW minimum code size, then the image data sub-blocks.
+            ix = _skip_sub_blocks(data, ix + 1)
+        else:
+            # Trailer or garbage.
+            return False
+    return False
+
+
+def video_path(relative_path: str) -> str:
+    """Relative path of the video transcoded from an uploaded GIF."""
+    return str(Path(relative_path).with_suffix(VIDEO_SUFFIX))
+
+
+def _transcode(data: bytes, target: Path) -> bool:
+    """Encode the GIF as video, unless that doesn't make it smaller."""
+    with tempfile.NamedTemporaryFile(suffix=".gif") as source:
+        source.write(data)
+        source.flush()
+        try:
+            subprocess.run(
+                [FFMPEG, "-y", "-i", source.name, *_FFMPEG_ARGS, str(target)],
+                check=True,
+                capture_output=True,
+                timeout=TRANSCODE_TIMEOUT,
+            )
+        except subprocess.CalledProcessError as exc:
+            logger.warning("Could not transcode GIF: %s", exc.stderr.decode().strip())
+            target.unlink(missing_ok=True)
+            return False
+        except (OSError, subprocess.TimeoutExpired) as exc:
+            logger.warning("Could not transcode GIF: %r", exc)
+            target.unlink(missing_ok=True)
+            return False
+    if target.stat().st_size >= len(data):
+        target.unlink()
+        return False
+    return True
+
+
+async def transcode(data: bytes, relative_path: str) -> str:
+    """Store a video of an animated GIF next to it in the upload dir.
+
+    Returns the relative path of the video, empty if the image is not an
+    animated GIF or it could not be transcoded.
+    """
+    if not enabled or not is_animated_gif(data):
+        return ""
+    path = video_path(relative_path)
+    target = storage.upload_path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    loop = asyncio.get_running_loop()
+    if await loop.run_in_executor(_executor, _transcode, data, target):
+        return path
+    return ""
@@ -4,4 +4,8 @@ config = rx.Config(
     app_name="rx_shout",
     db_url="sqlite:///reflex.db",
     plugins=[rx.plugins.SitemapPlugin()],
+    # Drop the state of clients idle for 10 minutes from redis, instead of the
+    # default hour; they are rehydrated on their next event. Override with
+    # REFLEX_REDIS_TOKEN_EXPIRATION.
+    redis_token_expiration=10 * 60,
 )
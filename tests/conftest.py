@@ -0,0 +1,76 @@
+"""Shared fixtures: a migrated database and in-process browser sessions.
+
+The environment is configured before the app is imported, as reflex and the
+app read it at import time.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from benchmarks.shoutbox import (
+    DirectClient,
+    RecordingNamespace,
+    configure_environment,
+    fake_google_tokens,
+)
+
+_data_dir = Path(tempfile.mkdtemp(prefix="rx_shout_tests_"))
+configure_environment(f"sqlite:///{_data_dir / 'app.db'}")
+os.environ["REFLEX_UPLOADED_FILES_DIR"] = str(_data_dir / "uploaded_files")
+os.environ["REFLEX_STATES_WORKDIR"] = str(_data_dir / "states")
+
+
+@pytest.fixture(scope="session")
+def app():
+    import reflex as rx
+
+    from rx_shout.models import Author, UserInfo
+    from rx_shout.rx_shout import app
+
+    rx.Model.migrate()
+    # The first user is the admin, make it the session of `client(user=1)`.
+    with rx.session() as session:
+        if session.get(UserInfo, 1) is None:
+            session.add(UserInfo(id=1, ext_id="bench:1", email="user1@example.com"))
+            session.add(
+                Author(user_id=1, name="User 1", picture="https://example.com/1.png")
+            )
+            session.commit()
+    fake_google_tokens()
+    if getattr(app, "_state_manager", None) is None:
+        app._enable_state()
+    return app
+
+
+@pytest.fixture
+async def client(app):
+    """Open browser sessions processed in-process by the app."""
+    from reflex_base.event.processor.base_state_processor import (
+        BaseStateEventProcessor,
+    )
+
+    namespace = RecordingNamespace()
+    processor = BaseStateEventProcessor(middleware=app).configure(
+        state_manager=app.state_manager, event_namespace=namespace
+    )
+    async with processor:
+        yield lambda topic="/tests", user=1: DirectClient(
+            processor, namespace, topic, user
+        )
+
+
+@pytest.fixture
+def get_state(app):
+    """Read the state of a session, as left by its last event."""
+    import reflex as rx
+
+    async def get_state(client: DirectClient, state_cls):
+        root = await app.state_manager.get_state(
+            rx.state._substate_key(client.token, state_cls)
+        )
+        return await root.get_state(state_cls)
+
+    return get_state
@@ -0,0 +1,68 @@
+"""The plain HTTP endpoints."""
+
+import uuid
+from urllib.parse import urlencode
+
+import httpx
+import pytest
+
+from benchmarks.shoutbox import handler_name
+from rx_shout import api
+from rx_shout.state import State
+
+
+def form(params: list[tuple[str, str]]) -> dict:
+    return {
+        "content": urlencode(params),
+        "headers": {"content-type": "application/x-www-form-urlencoded"},
+    }
+
+
+@pytest.fixture
+def http(app):
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=api.api), base_url="http://testserver"
+    )
+
+
+async def test_topic_summary(client, http):
+    topics = [f"/tests/{uuid.uuid4()}" for _ in range(2)]
+    for topic in topics:
+        session = client(topic, user=6)
+        await session.sign_in()
+        await session.emit(
+            handler_name(State, "handle_submit"), {"form_data": {"text": "hi"}}
+        )
+    params = [("topic", topic) for topic in [*topics, "/tests/missing"]]
+
+    response = await http.get("/api/topics/summary", params=params)
+    assert response.status_code == 200
+    summaries = response.json()["topics"]
+    assert sorted(summaries) == sorted(topics)
+    assert all(summary["entries"] == 1 for summary in summaries.values())
+    # The same parameters, posted as a form.
+    posted = await http.post("/api/topics/summary", data={"topic": params[0][1]})
+    assert posted.json()["topics"] == {topics[0]: summaries[topics[0]]}
+
+    cached = await http.get(
+        "/api/topics/summary",
+        params=params,
+        headers={"if-none-match": response.headers["etag"]},
+    )
+    assert cached.status_code == 304
+
+
+async def test_topic_summary_limits(http):
+    many = [("topic", f"/tests/{i}") for i in range(api.MAX_SUMMARY_TOPICS)]
+    assert (await http.get("/api/topics/summary")).status_code == 400
+    response = await http.get(
+        "/api/topics/summary", params=many[: api.MAX_SUMMARY_GET_TOPICS + 1]
+    )
+    assert response.status_code == 400
+    assert (await http.post("/api/topics/summary", **form(many))).status_code == 200
+    response = await http.post("/api/topics/summary", **form([*many, ("topic", "/x")]))
+    assert response.status_code == 400
+    response = await http.post(
+        "/api/topics/summary", **form([("topic", "x" * api.MAX_SUMMARY_BODY)])
+    )
+    assert response.status_code == 413
@@ -0,0 +1,126 @@
+"""Caching author avatars, against a local stand-in for the picture host."""
+
+import importlib.util
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pytest
+import reflex as rx
+from sqlmodel import select
+
+from benchmarks.shoutbox import PNG_BYTES as PNG
+from rx_shout import avatars, storage
+from rx_shout.models import Author
+from rx_shout.state import State
+
+# The real download, which `fake_google_tokens` replaces once the app is loaded.
+fetch_avatar = avatars.fetch_avatar
+EXTENSION = ".webp" if importlib.util.find_spec("PIL") else ".png"
+
+
+class PictureHost(ThreadingHTTPServer):
+    """Serves the pictures in `files`, keeping the paths it was asked for."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), PictureHandler)
+        self.files: dict[str, tuple[str, bytes]] = {}
+        self.requests: list[str] = []
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class PictureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path not in self.server.files:
+            self.send_error(404)
+            return
+        content_type, body = self.server.files[self.path]
+        self.send_response(200)
+        self.send_header("content-type", content_type)
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def picture_host(monkeypatch):
+    host = PictureHost()
+    thread = threading.Thread(target=host.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(avatars, "fetch_avatar", fetch_avatar)
+    # The pictures of the benchmark users are on example.com.
+    monkeypatch.setattr(
+        avatars, "_sized_url", lambda url: host.url + urlparse(url).path
+    )
+    yield host
+    host.shutdown()
+    host.server_close()
+
+
+def test_sized_url():
+    assert (
+        avatars._sized_url("https://lh3.googleusercontent.com/a/abc=s96-c")
+        == f"https://lh3.googleusercontent.com/a/abc=s{avatars.AVATAR_SIZE}-c"
+    )
+    url = "https://example.com/a.png"
+    assert avatars._sized_url(url) == url
+
+
+def test_fetch_avatar(picture_host, monkeypatch):
+    picture_host.files["/ok.png"] = ("image/png", PNG)
+    picture_host.files["/page.html"] = ("text/html", b"<html></html>")
+    picture_host.files["/huge.png"] = ("image/png", PNG * 10)
+
+    avatar = avatars.fetch_avatar(7, "https://example.com/ok.png")
+    assert avatar.startswith("avatars/7-") and avatar.endswith(EXTENSION)
+    assert storage.upload_path(avatar).is_file()
+    avatars.remove_avatar(avatar)
+    assert not storage.upload_path(avatar).exists()
+
+    monkeypatch.setattr(avatars, "MAX_PICTURE_BYTES", len(PNG) * 5)
+    for path in ("/page.html", "/huge.png", "/missing.png"):
+        assert avatars.fetch_avatar(7, f"https://example.com{path}") is None
+
+
+async def get_author(user_id: int) -> Author:
+    async with rx.asession() as asession:
+        return (
+            await asession.exec(select(Author).where(Author.user_id == user_id))
+        ).one()
+
+
+async def test_avatar_is_cached_once_at_sign_in(picture_host, client, get_state):
+    user = 1000 + uuid.uuid4().int % 10**6
+    picture_host.files[f"/avatar/{user}.png"] = ("image/png", PNG)
+    session = client(user=user)
+    await session.sign_in()
+    user_id = (await get_state(session, State)).user_info.id
+
+    author = await get_author(user_id)
+    assert author.avatar.endswith(EXTENSION)
+    assert storage.upload_path(author.avatar).is_file()
+    await client(user=user).sign_in()
+    assert picture_host.requests == [f"/avatar/{user}.png"]
+    assert (await get_author(user_id)).avatar == author.avatar
+
+
+async def test_failed_avatar_is_not_retried_at_sign_in(
+    picture_host, client, get_state
+):
+    user = 1000 + uuid.uuid4().int % 10**6
+    session = client(user=user)
+    await session.sign_in()
+    user_id = (await get_state(session, State)).user_info.id
+
+    assert (await get_author(user_id)).avatar == ""
+    await client(user=user).sign_in()
+    assert picture_host.requests == [f"/avatar/{user}.png"]
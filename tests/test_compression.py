@@ -0,0 +1,38 @@
+"""Compression of the state pickles stored in redis."""
+
+import os
+import pickle
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from rx_shout import compression
+
+
+def test_compress_round_trip():
+    payload = pickle.dumps({"names": ["User 1"] * 1000})
+    compressed = compression.compress(payload, "zlib")
+    assert len(compressed) < len(payload)
+    assert pickle.loads(compressed) == pickle.loads(payload)
+    assert compression.raw_size(compressed) == len(payload)
+    # Small payloads are stored plain.
+    small = pickle.dumps("User 1")
+    assert compression.compress(small, "zlib") == small
+    assert compression.raw_size(small) == len(small)
+
+
+@pytest.mark.parametrize(
+    "codec", ["gzip", *(["zstd"] if sys.version_info < (3, 14) else [])]
+)
+def test_unsupported_codec_fails_on_import(codec):
+    result = subprocess.run(
+        [sys.executable, "-c", "import rx_shout.compression"],
+        cwd=Path(__file__).parent.parent,
+        env={**os.environ, "STATE_COMPRESSION": codec},
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode != 0
+    assert "ValueError: STATE_COMPRESSION" in result.stderr
@@ -0,0 +1,82 @@
+"""Loading the feed of a topic and the authors shown with it."""
+
+import uuid
+
+from benchmarks.shoutbox import handler_name
+from rx_shout.components.search import SearchState
+from rx_shout.state import State, UserInfoState
+
+
+def open_topic(session, topic: str) -> None:
+    """Navigate the session to the topic, as following a link does."""
+    session.router_data["asPath"] = f"/?topic={topic}"
+    session.router_data["query"] = {"topic": topic}
+
+
+async def sign_in(client, get_state, topic: str, user: int):
+    """A signed in session on the topic, and the id of its user."""
+    session = client(topic, user=user)
+    await session.sign_in()
+    return session, (await get_state(session, State)).user_info.id
+
+
+async def post(session, text: str) -> None:
+    await session.emit(
+        handler_name(State, "handle_submit"), {"form_data": {"text": text}}
+    )
+
+
+async def test_load_entries_replaces_authors(client, get_state):
+    first, second = f"/tests/{uuid.uuid4()}", f"/tests/{uuid.uuid4()}"
+    alice, alice_id = await sign_in(client, get_state, first, user=2)
+    await post(alice, "hello")
+    bob, bob_id = await sign_in(client, get_state, second, user=3)
+    await post(bob, "hi")
+
+    await bob.emit(handler_name(State, "load_entries"))
+    assert set((await get_state(bob, State)).authors) == {bob_id}
+    open_topic(bob, first)
+    await bob.emit(handler_name(State, "load_entries"))
+    assert set((await get_state(bob, State)).authors) == {alice_id}
+
+
+async def test_load_entries_keeps_authors_of_search_results(client, get_state):
+    first, second = f"/tests/{uuid.uuid4()}", f"/tests/{uuid.uuid4()}"
+    word = uuid.uuid4().hex
+    alice, alice_id = await sign_in(client, get_state, first, user=2)
+    await post(alice, f"about {word}")
+    bob, bob_id = await sign_in(client, get_state, second, user=3)
+    await post(bob, "hi")
+
+    open_topic(bob, first)
+    await bob.emit(handler_name(State, "load_entries"))
+    await bob.emit(
+        handler_name(SearchState, "handle_search"),
+        {"form_data": {"search_query": word}},
+    )
+    assert len((await get_state(bob, SearchState)).search_results) == 1
+    open_topic(bob, second)
+    await bob.emit(handler_name(State, "load_entries"))
+    assert set((await get_state(bob, State)).authors) == {alice_id, bob_id}
+
+    await bob.emit(handler_name(SearchState, "clear_search"))
+    await bob.emit(handler_name(State, "load_entries"))
+    assert set((await get_state(bob, State)).authors) == {bob_id}
+
+
+async def test_ban_status_is_only_shown_to_admins(client, get_state):
+    topic = f"/tests/{uuid.uuid4()}"
+    user = 1000 + uuid.uuid4().int % 10**6
+    author, author_id = await sign_in(client, get_state, topic, user=user)
+    await post(author, "hello")
+    admin, _ = await sign_in(client, get_state, topic, user=1)
+    await admin.emit(
+        handler_name(UserInfoState, "set_enabled"),
+        {"user_id": author_id, "enable": False},
+    )
+
+    viewer = client(topic, user=2)
+    for session in (admin, viewer):
+        await session.emit(handler_name(State, "load_entries"))
+    assert not (await get_state(admin, State)).authors[author_id].enabled
+    assert (await get_state(viewer, State)).authors[author_id].enabled
@@ -0,0 +1,148 @@
+"""Verifying ID tokens, against a local stand-in for Google's key endpoint."""
+
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+
+from rx_shout import google_token
+
+AUDIENCE = "client-id.apps.googleusercontent.com"
+
+
+class SigningKey:
+    """An RSA key with the self-signed certificate Google would publish."""
+
+    def __init__(self, key_id: str):
+        self.key_id = key_id
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, key_id)])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256())
+        )
+        self.cert = cert.public_bytes(serialization.Encoding.PEM).decode()
+        self.signer = crypt.RSASigner.from_string(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            ),
+            key_id,
+        )
+
+    def token(self, sub: str) -> str:
+        now = int(time.time())
+        payload = {
+            "iss": "https://accounts.google.com",
+            "aud": AUDIENCE,
+            "sub": sub,
+            "iat": now,
+            "exp": now + 3600,
+        }
+        return jwt.encode(self.signer, payload).decode()
+
+
+@pytest.fixture(scope="module")
+def keys() -> tuple[SigningKey, SigningKey]:
+    return SigningKey("old"), SigningKey("new")
+
+
+class CertHost(ThreadingHTTPServer):
+    """Serves `certs` as Google's key endpoint does, or fails while `down`."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), CertHandler)
+        self.certs: dict[str, str] = {}
+        self.down = False
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/oauth2/v1/certs"
+
+
+class CertHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests += 1
+        if self.server.down:
+            self.send_error(503)
+            return
+        body = json.dumps(self.server.certs).encode()
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def cert_host(tmp_path, monkeypatch):
+    host = CertHost()
+    thread = threading.Thread(target=host.serve_forever, daemon=True)
+    thread.start()
+    keyset = google_token.KeySet(host.url, tmp_path / "google_certs.json")
+    monkeypatch.setattr(google_token, "keyset", keyset)
+    monkeypatch.setattr(google_token, "_verified", {})
+    yield host
+    host.shutdown()
+    host.server_close()
+
+
+def verify(token: str) -> dict:
+    return google_token.verify_oauth2_token(token, audience=AUDIENCE)
+
+
+def test_cold_start_fetches_the_keys(cert_host, keys):
+    old, _ = keys
+    cert_host.certs = {old.key_id: old.cert}
+
+    assert verify(old.token("a"))["sub"] == "a"
+    assert google_token.keyset.cache_path.is_file()
+
+
+def test_rotated_key_is_accepted(cert_host, keys):
+    old, new = keys
+    cert_host.certs = {old.key_id: old.cert}
+    google_token.keyset.refresh()
+    cert_host.certs = {old.key_id: old.cert, new.key_id: new.cert}
+
+    assert verify(new.token("b"))["sub"] == "b"
+    assert cert_host.requests == 2
+    assert verify(old.token("c"))["sub"] == "c"
+    assert cert_host.requests == 2
+
+
+def test_failed_refresh_keeps_the_known_keys(cert_host, keys):
+    old, new = keys
+    cert_host.certs = {old.key_id: old.cert}
+    google_token.keyset.refresh()
+    cert_host.down = True
+
+    with pytest.raises(ValueError, match="Certificate for key id"):
+        verify(new.token("d"))
+    assert cert_host.requests == 2
+    # Further tokens with the unknown key don't reach the endpoint again.
+    with pytest.raises(ValueError, match="Certificate for key id"):
+        verify(new.token("e"))
+    assert cert_host.requests == 2
+    assert verify(old.token("f"))["sub"] == "f"
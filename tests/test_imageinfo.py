@@ -0,0 +1,72 @@
+"""Image dimensions and placeholders, read from encoded images."""
+
+import io
+
+import pytest
+from PIL import Image
+
+from rx_shout import imageinfo
+
+
+def encode(format: str, size=(4, 2), mode="RGB", **params) -> bytes:
+    out = io.BytesIO()
+    Image.new(mode, size, (255, 0, 0)).save(out, format, **params)
+    return out.getvalue()
+
+
+def rotated_jpeg(orientation: int) -> bytes:
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    return encode("JPEG", exif=exif.tobytes())
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        pytest.param(encode("PNG"), id="png"),
+        pytest.param(encode("JPEG"), id="jpeg"),
+        pytest.param(encode("JPEG", progressive=True), id="jpeg-progressive"),
+        pytest.param(encode("GIF"), id="gif"),
+        pytest.param(encode("WEBP"), id="webp-lossy"),
+        pytest.param(encode("WEBP", lossless=True), id="webp-lossless"),
+        pytest.param(encode("WEBP", mode="RGBA"), id="webp-extended"),
+    ],
+)
+def test_image_size(data):
+    assert imageinfo.image_size(data) == (4, 2)
+    assert imageinfo.image_size(data[: imageinfo.HEADER_BYTES]) == (4, 2)
+
+
+def test_image_size_of_rotated_jpeg():
+    assert imageinfo.image_size(rotated_jpeg(3)) == (4, 2)
+    # Turned by 90 degrees when displayed.
+    assert imageinfo.image_size(rotated_jpeg(6)) == (2, 4)
+    assert imageinfo.image_size(rotated_jpeg(8)) == (2, 4)
+
+
+@pytest.mark.parametrize("data", [b"", b"not an image", encode("PNG")[:20]])
+def test_image_size_unknown(data):
+    assert imageinfo.image_size(data) is None
+    assert imageinfo.inspect(data) is None
+
+
+def test_placeholder():
+    # Red on the left, blue at the bottom.
+    image = Image.new("RGB", (8, 8))
+    for x in range(8):
+        for y in range(8):
+            image.putpixel((x, y), (255 * (x < 4), 0, 255 * (y >= 4)))
+    out = io.BytesIO()
+    image.save(out, "PNG")
+    # As encoded by the reference BlurHash implementation.
+    assert imageinfo.placeholder(out.getvalue()) == "L~LjfL|h,YSR#{wuo1a^fKfOfQfO"
+
+
+def test_inspect():
+    info = imageinfo.inspect(rotated_jpeg(6))
+    assert (info.width, info.height) == (2, 4)
+    assert len(info.placeholder) == 28
+
+    # Only the header was read, the size is known but there is no preview.
+    info = imageinfo.inspect(encode("PNG")[:24])
+    assert (info.width, info.height, info.placeholder) == (4, 2, "")
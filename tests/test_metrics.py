@@ -0,0 +1,17 @@
+"""Measuring the database queries of event handlers."""
+
+import pytest
+import sqlalchemy
+
+from rx_shout import metrics
+
+
+def test_failed_queries_leave_nothing_on_the_connection():
+    engine = sqlalchemy.create_engine("sqlite://")
+    with engine.connect() as conn:
+        with pytest.raises(sqlalchemy.exc.OperationalError):
+            conn.exec_driver_sql("SELECT * FROM missing")
+        with metrics._measure("test") as sample:
+            conn.exec_driver_sql("SELECT 1")
+        assert sample.queries == 1
+        assert not [key for key in conn.info if key.startswith("rx_shout")]
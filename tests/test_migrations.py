@@ -0,0 +1,33 @@
+"""The migrations against the models, as alembic's autogenerate sees them."""
+
+from pathlib import Path
+
+import pytest
+import sqlalchemy
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlmodel import SQLModel
+
+from rx_shout import search, shards
+
+ROOT = Path(__file__).parent.parent
+
+
+@pytest.fixture
+def migrated(tmp_path, monkeypatch):
+    """A SQLite database migrated to the latest schema."""
+    url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    monkeypatch.chdir(ROOT)
+    shards.migrate(url)
+    engine = sqlalchemy.create_engine(url)
+    yield engine
+    engine.dispose()
+
+
+def test_migrations_match_the_models(migrated):
+    with migrated.connect() as conn:
+        context = MigrationContext.configure(
+            conn, opts={"include_object": search.include_object}
+        )
+        diffs = compare_metadata(context, SQLModel.metadata)
+    assert diffs == []
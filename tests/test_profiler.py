@@ -0,0 +1,67 @@
+"""Sampling profiles of the worker, directly and from the admin page."""
+
+import base64
+import threading
+import uuid
+
+from benchmarks.shoutbox import handler_name
+from rx_shout import profiler
+from rx_shout.components.admin import ProfileState
+
+
+def spin(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profile_collapses_busy_stacks():
+    stop = threading.Event()
+    thread = threading.Thread(target=spin, args=(stop,), name="busy worker")
+    thread.start()
+    try:
+        stacks = profiler.profile(0.2, interval_ms=5)
+    finally:
+        stop.set()
+        thread.join()
+
+    lines = stacks.splitlines()
+    assert lines
+    for line in lines:
+        stack, _, count = line.rpartition(" ")
+        assert stack and int(count) > 0
+    busy = [line for line in lines if line.startswith("busy_worker;")]
+    assert busy and f"{__name__}.spin" in busy[0]
+
+
+def downloads(session) -> list:
+    return [event for event in session.events if event.name == "_download"]
+
+
+async def test_admin_downloads_a_profile(client, get_state, monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILE_MAX_SECONDS", 0.2)
+    session = client(user=1)
+    await session.sign_in()
+
+    stop = threading.Event()
+    thread = threading.Thread(target=spin, args=(stop,), name="busy worker")
+    thread.start()
+    try:
+        await session.emit(handler_name(ProfileState, "run_profile"))
+    finally:
+        stop.set()
+        thread.join()
+    [download] = downloads(session)
+    assert download.payload["filename"].endswith(".folded")
+    stacks = base64.b64decode(download.payload["url"].partition(",")[2]).decode()
+    assert f"{__name__}.spin" in stacks
+    assert not (await get_state(session, ProfileState)).profiling
+
+
+async def test_non_admin_gets_no_profile(client, get_state, monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILE_MAX_SECONDS", 0.1)
+    session = client(user=1000 + uuid.uuid4().int % 10**6)
+    await session.sign_in()
+
+    await session.emit(handler_name(ProfileState, "run_profile"))
+    assert not downloads(session)
+    assert not (await get_state(session, ProfileState)).profiling
@@ -0,0 +1,64 @@
+"""Liking and flagging entries."""
+
+import asyncio
+import uuid
+
+import reflex as rx
+import sqlalchemy
+
+from benchmarks.shoutbox import handler_name
+from rx_shout.models import Entry, EntryFlags
+from rx_shout.state import State
+
+
+async def test_reacting_twice_counts_once(client, get_state):
+    author = client(f"/tests/{uuid.uuid4()}", user=4)
+    await author.sign_in()
+    await author.emit(
+        handler_name(State, "handle_submit"), {"form_data": {"text": "like me"}}
+    )
+    (entry,) = (await get_state(author, State)).entries
+    # The same user in two tabs.
+    tabs = [client(author.router_data["query"]["topic"], user=5) for _ in range(2)]
+    for tab in tabs:
+        await tab.sign_in()
+    for name in ("like_entry", "like_entry", "flag_entry"):
+        event = handler_name(State, name)
+        await asyncio.gather(*(tab.emit(event, {"entry_id": entry.id}) for tab in tabs))
+
+    async with rx.asession() as asession:
+        likes, flags = (
+            await asession.execute(
+                sqlalchemy.select(Entry.likes, Entry.flags).where(Entry.id == entry.id)
+            )
+        ).one()
+        rows = (
+            await asession.execute(
+                sqlalchemy.select(sqlalchemy.func.count()).where(
+                    EntryFlags.entry_id == entry.id
+                )
+            )
+        ).scalar_one()
+    assert (likes, flags, rows) == (1, 1, 2)
+    reactions = (await get_state(tabs[0], State)).reactions[entry.id]
+    assert reactions.liked and reactions.flagged and reactions.likes == 1
+
+
+async def test_reacting_only_sends_the_reactions(client, get_state):
+    session = client(f"/tests/{uuid.uuid4()}", user=4)
+    await session.sign_in()
+    for n in range(3):
+        await session.emit(
+            handler_name(State, "handle_submit"), {"form_data": {"text": f"{n}"}}
+        )
+    entry = (await get_state(session, State)).entries[0]
+    session.deltas.clear()
+
+    await session.emit(handler_name(State, "like_entry"), {"entry_id": entry.id})
+    sent = {
+        var.removesuffix("_rx_state_")
+        for delta in session.deltas
+        for var in delta.get(State.get_full_name(), {})
+    }
+    assert sent == {"loading", "reactions"}
+    assert (await get_state(session, State)).reactions[entry.id].liked
@@ -0,0 +1,230 @@
+"""Direct uploads to the bucket, against moto's S3 server."""
+
+import base64
+import json
+
+import httpx
+import pytest
+
+from benchmarks.shoutbox import handler_name
+from rx_shout import s3
+
+BUCKET = "rx-shout-tests"
+# A 1x1 PNG.
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000001e221bc330000000049454e44ae426082"
+)
+
+
+@pytest.fixture(scope="module")
+def s3_server():
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def bucket(s3_server, monkeypatch):
+    monkeypatch.setattr(s3, "endpoint_url", s3_server)
+    monkeypatch.setattr(s3, "access_key_id", "testing")
+    monkeypatch.setattr(s3, "secret_access_key", "testing")
+    monkeypatch.setattr(s3, "bucket_name", BUCKET)
+    monkeypatch.setattr(s3, "bucket_access_url", f"{s3_server}/{BUCKET}/")
+    monkeypatch.setattr(s3, "direct_upload", True)
+    monkeypatch.setattr(s3, "_client", None)
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    client = s3.get_client()
+    client.create_bucket(Bucket=BUCKET)
+    yield client
+    for page in client.get_paginator("list_objects_v2").paginate(Bucket=BUCKET):
+        for obj in page.get("Contents", []):
+            client.delete_object(Bucket=BUCKET, Key=obj["Key"])
+    client.delete_bucket(Bucket=BUCKET)
+
+
+def post_object(post: dict, data: bytes) -> httpx.Response:
+    """Upload as the browser does, with the fields of the presigned POST."""
+    return httpx.post(post["url"], data=post["fields"], files={"file": data})
+
+
+def test_presigned_post_uploads_one_object(bucket):
+    post = s3.presigned_post("a/b/image.png", "image/png", 1024)
+    assert post["fields"]["key"] == "a/b/image.png"
+    assert post["fields"]["Content-Type"] == "image/png"
+    assert post_object(post, PNG).is_success
+    assert s3.object_size("a/b/image.png") == len(PNG)
+    assert s3.read_object("a/b/image.png") == PNG
+
+
+def test_presigned_post_limits_size_and_type(bucket):
+    # moto accepts any upload, the bucket's store checks the policy.
+    post = s3.presigned_post("image.png", "image/png", 1024)
+    policy = json.loads(base64.b64decode(post["fields"]["policy"]))
+    assert ["content-length-range", 1, 1024] in policy["conditions"]
+    assert {"Content-Type": "image/png"} in policy["conditions"]
+    assert {"key": "image.png"} in policy["conditions"]
+
+
+def test_object_size_of_missing_object(bucket):
+    assert s3.object_size("missing.png") is None
+
+
+def test_delete_object(bucket):
+    bucket.put_object(Bucket=BUCKET, Key="image.png", Body=PNG)
+    s3.delete_object("image.png")
+    assert s3.object_size("image.png") is None
+    # Deleting is idempotent.
+    s3.delete_object("image.png")
+
+
+def test_read_object_range(bucket):
+    bucket.put_object(Bucket=BUCKET, Key="image.png", Body=PNG)
+    assert s3.read_object("image.png", 8) == PNG[:8]
+    assert s3.read_object("image.png", 1024) == PNG
+
+
+def direct_upload_post(session) -> dict | None:
+    """The presigned POST passed to the browser's upload script."""
+    for event in session.events:
+        if event.name == "_call_script":
+            script = event.payload["javascript_code"]
+            return json.loads(script.removeprefix("rxShoutDirectUpload(")[:-1])
+    return None
+
+
+def toasted(session, message: str) -> bool:
+    return any(
+        event.name == "_call_function" and message in str(event.payload["function"])
+        for event in session.events
+    )
+
+
+async def test_direct_upload(bucket, client, get_state):
+    from rx_shout.components.image_upload import UploadState
+
+    session = client()
+    await session.sign_in()
+    post = await request_upload(session)
+    assert post is not None
+    assert post_object(post, PNG).is_success
+
+    await finish_upload(session)
+    state = await get_state(session, UploadState)
+    assert state.image_in_bucket
+    assert state.image_relative_path == post["fields"]["key"]
+    assert state.image_bucket_url == s3.public_url(post["fields"]["key"])
+
+    await session.emit(handler_name(UploadState, "delete_uploaded_image"))
+    assert s3.object_size(post["fields"]["key"]) is None
+    state = await get_state(session, UploadState)
+    assert not state.image_relative_path
+    assert not state.image_in_bucket
+
+
+
+async def request_upload(session, size: int = len(PNG)):
+    from rx_shout.components.image_upload import UploadState
+
+    await session.emit(
+        handler_name(UploadState, "request_direct_upload"),
+        {"file_info": {"name": "image.png", "type": "image/png", "size": size}},
+    )
+    return direct_upload_post(session)
+
+
+async def finish_upload(session, ok: bool = True):
+    from rx_shout.components.image_upload import UploadState
+
+    await session.emit(
+        handler_name(UploadState, "finish_direct_upload"), {"result": {"ok": ok}}
+    )
+
+
+async def test_direct_upload_of_oversized_file_is_refused(bucket, client):
+    from rx_shout.storage import MAX_FILE_SIZE
+
+    session = client()
+    await session.sign_in()
+    assert await request_upload(session, size=MAX_FILE_SIZE + 1) is None
+    assert toasted(session, "File size too large or invalid format")
+
+
+async def test_finish_direct_upload_of_oversized_object(bucket, client, get_state):
+    from rx_shout.components.image_upload import UploadState
+    from rx_shout.storage import MAX_FILE_SIZE
+
+    session = client()
+    await session.sign_in()
+    post = await request_upload(session)
+    # A store not enforcing the policy's content-length-range.
+    bucket.put_object(
+        Bucket=BUCKET, Key=post["fields"]["key"], Body=b"\0" * (MAX_FILE_SIZE + 1)
+    )
+    await finish_upload(session)
+    assert toasted(session, "Upload failed, please try again.")
+    state = await get_state(session, UploadState)
+    assert not state.image_relative_path
+    assert not state.image_in_bucket
+
+
+async def test_finish_direct_upload_of_missing_object(bucket, client, get_state):
+    from rx_shout.components.image_upload import UploadState
+
+    session = client()
+    await session.sign_in()
+    assert await request_upload(session) is not None
+    await finish_upload(session)
+    assert toasted(session, "Upload failed, please try again.")
+    state = await get_state(session, UploadState)
+    assert not state.image_relative_path
+    assert not state.image_in_bucket
+
+
+async def test_finish_direct_upload_after_failed_upload(bucket, client, get_state):
+    from rx_shout.components.image_upload import UploadState
+
+    session = client()
+    await session.sign_in()
+    await request_upload(session)
+    await finish_upload(session, ok=False)
+    assert toasted(session, "Upload failed, please try again.")
+    state = await get_state(session, UploadState)
+    assert not state.image_relative_path
+
+
+@pytest.mark.parametrize("has_placeholders", [False, True])
+async def test_finish_direct_upload_reads_header(
+    bucket, client, get_state, monkeypatch, has_placeholders
+):
+    from rx_shout import imageinfo
+    from rx_shout.components.image_upload import UploadState
+
+    monkeypatch.setattr(imageinfo, "has_placeholders", has_placeholders)
+    reads = []
+    read_object = s3.read_object
+
+    def recording_read_object(key, max_bytes=None):
+        data = read_object(key, max_bytes)
+        reads.append(len(data))
+        return data
+
+    monkeypatch.setattr(s3, "read_object", recording_read_object)
+    image = PNG + b"\0" * imageinfo.HEADER_BYTES
+    session = client()
+    await session.sign_in()
+    post = await request_upload(session, size=len(image))
+    assert post_object(post, image).is_success
+    await finish_upload(session)
+
+    state = await get_state(session, UploadState)
+    assert state.image_in_bucket
+    assert (state._image_info.width, state._image_info.height) == (1, 1)
+    if has_placeholders:
+        assert reads == [imageinfo.HEADER_BYTES, len(image)]
+    else:
+        assert reads == [imageinfo.HEADER_BYTES]
@@ -0,0 +1,179 @@
+"""Topics stored in two SQLite shards, users in the app's database."""
+
+import itertools
+import sqlite3
+import uuid
+from pathlib import Path
+
+import httpx
+import pytest
+import reflex as rx
+import sqlalchemy
+
+from benchmarks.shoutbox import handler_name
+from rx_shout import api, shards, slowlog
+from rx_shout.components.admin import ModerationState
+from rx_shout.models import Topic
+from rx_shout.state import State
+
+ROOT = Path(__file__).parent.parent
+
+
+@pytest.fixture
+def two_shards(tmp_path, monkeypatch):
+    """Paths of the shards' databases, which `SHARD_DB_URLS` lists."""
+    paths = [tmp_path / f"shard{shard}.db" for shard in range(2)]
+    urls = [f"sqlite:///{path}" for path in paths]
+    monkeypatch.chdir(ROOT)
+    for url in urls:
+        shards.migrate(url)
+    monkeypatch.setattr(shards, "SHARD_DB_URLS", urls)
+    monkeypatch.setattr(
+        shards, "SHARD_ASYNC_DB_URLS", [shards._async_url(url) for url in urls]
+    )
+    monkeypatch.setattr(shards, "enabled", True)
+    monkeypatch.setattr(shards, "COUNT", 2)
+    monkeypatch.setattr(shards, "_copied_users", set())
+    return paths
+
+
+@pytest.fixture
+def topics(two_shards) -> list[str]:
+    """A new topic on each shard, in shard order."""
+    names = (f"/tests/{uuid.uuid4()}" for _ in itertools.count())
+    found = {}
+    while len(found) < 2:
+        name = next(names)
+        found.setdefault(shards.shard_for(name), name)
+    return [found[0], found[1]]
+
+
+def query(path: Path, sql: str, *parameters) -> list[tuple]:
+    with sqlite3.connect(path) as conn:
+        return conn.execute(sql, parameters).fetchall()
+
+
+def test_shard_for(two_shards):
+    assert shards.shard_for("/blog/post-1") == shards.shard_for("/blog/post-1")
+    assert {shards.shard_for(f"/blog/post-{n}") for n in range(20)} == {0, 1}
+
+
+async def test_topics_across_shards(two_shards, topics, client, get_state):
+    user = 1000 + uuid.uuid4().int % 10**6
+    sessions = [client(topic, user=user) for topic in topics]
+    for n, session in enumerate(sessions):
+        await session.sign_in()
+        await session.emit(
+            handler_name(State, "handle_submit"),
+            {"form_data": {"text": f"post {n}"}},
+        )
+    user_id = (await get_state(sessions[0], State)).user_info.id
+
+    # Each post, and a copy of its author, is stored in its topic's shard.
+    for n, path in enumerate(two_shards):
+        assert query(path, "SELECT text, author_id FROM entry") == [
+            (f"post {n}", user_id)
+        ]
+        assert query(path, "SELECT id FROM userinfo") == [(user_id,)]
+        assert query(path, "SELECT user_id FROM author") == [(user_id,)]
+    async with rx.asession() as asession:
+        rows = await asession.execute(
+            sqlalchemy.select(Topic.id).where(Topic.name.in_(topics))
+        )
+        assert rows.all() == []
+    for n, session in enumerate(sessions):
+        await session.emit(handler_name(State, "load_entries"))
+        state = await get_state(session, State)
+        assert [entry.text for entry in state.entries] == [f"post {n}"]
+        assert set(state.authors) == {user_id}
+
+    # Likes are stored, and counted, in the shard of the entry.
+    liker = client(topics[1], user=user + 1)
+    await liker.sign_in()
+    await liker.emit(handler_name(State, "load_entries"))
+    (entry,) = (await get_state(liker, State)).entries
+    await liker.emit(handler_name(State, "like_entry"), {"entry_id": entry.id})
+    assert query(two_shards[1], "SELECT likes FROM entry") == [(1,)]
+    assert len(query(two_shards[1], "SELECT id FROM entryflags")) == 1
+    assert query(two_shards[0], "SELECT id FROM entryflags") == []
+    assert (await get_state(liker, State)).reactions[entry.id].liked
+    await liker.emit(handler_name(State, "unlike_entry"), {"entry_id": entry.id})
+    assert query(two_shards[1], "SELECT likes FROM entry") == [(0,)]
+    assert query(two_shards[1], "SELECT id FROM entryflags") == []
+
+    # The summaries of topics on both shards are returned together.
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=api.api), base_url="http://testserver"
+    ) as http:
+        response = await http.get(
+            "/api/topics/summary", params=[("topic", topic) for topic in topics]
+        )
+    summaries = response.json()["topics"]
+    assert {topic: summaries[topic]["entries"] for topic in topics} == {
+        topics[0]: 1,
+        topics[1]: 1,
+    }
+
+    # Banning the author hides their posts on every shard.
+    admin = client(topics[0], user=1)
+    await admin.sign_in()
+    await admin.emit(
+        handler_name(ModerationState, "ban_and_hide"), {"user_id": user_id}
+    )
+    for path in two_shards:
+        assert query(path, "SELECT hidden FROM entry") == [(1,)]
+
+
+async def test_slow_queries_are_explained_on_their_shard(two_shards):
+    for shard, url in enumerate(shards.SHARD_DB_URLS):
+        async with shards.asession(shard) as asession:
+            conn = await asession.connection()
+            engine = slowlog._explain_engine(conn.sync_connection)
+        assert not engine.dialect.is_async
+        assert engine.url == sqlalchemy.make_url(url)
+
+
+async def test_likes_are_merged_across_shards_by_time(
+    two_shards, topics, client, get_state
+):
+    from rx_shout.components.activity import ActivityState
+
+    user = 1000 + uuid.uuid4().int % 10**6
+    liker = client(topics[0], user=user)
+    await liker.sign_in()
+    liker_id = (await get_state(liker, State)).user_info.id
+    for shard, topic in enumerate(topics):
+        session = client(topic, user=user + 1)
+        await session.sign_in()
+        for n in range(2):
+            await session.emit(
+                handler_name(State, "handle_submit"),
+                {"form_data": {"text": f"shard {shard} post {n}"}},
+            )
+        liker.router_data["asPath"] = f"/?topic={topic}"
+        liker.router_data["query"] = {"topic": topic}
+        await liker.emit(handler_name(State, "load_entries"))
+        for entry in (await get_state(liker, State)).entries:
+            await liker.emit(
+                handler_name(State, "like_entry"), {"entry_id": entry.id}
+            )
+    # Liked alternately on either shard, the ids don't tell.
+    times = {
+        "shard 0 post 0": "2026-01-01 00:00:01",
+        "shard 1 post 0": "2026-01-01 00:00:02",
+        "shard 0 post 1": "2026-01-01 00:00:03",
+        "shard 1 post 1": "2026-01-01 00:00:04",
+    }
+    for path in two_shards:
+        with sqlite3.connect(path) as conn:
+            conn.executemany(
+                "UPDATE entryflags SET ts = ? WHERE user_id = ? AND entry_id = "
+                "(SELECT id FROM entry WHERE text = ?)",
+                [(ts, liker_id, text) for text, ts in times.items()],
+            )
+
+    await liker.emit(
+        handler_name(ActivityState, "set_activity_kind"), {"kind": "likes"}
+    )
+    activity = (await get_state(liker, ActivityState)).activity
+    assert [entry.text for entry in activity] == list(reversed(times))
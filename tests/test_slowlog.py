@@ -0,0 +1,25 @@
+"""Recording slow queries and their plans."""
+
+import collections
+from types import SimpleNamespace
+
+from rx_shout import slowlog
+
+
+def test_plans_are_capped(monkeypatch):
+    monkeypatch.setattr(slowlog, "MAX_PLANS", 2)
+    monkeypatch.setattr(slowlog, "_plans", collections.OrderedDict())
+    for n in range(3):
+        slowlog._set_plan(f"SELECT * FROM entry WHERE id IN ({n})", "SCAN entry")
+    slowlog._set_plan("SELECT * FROM entry WHERE id IN (1)", "SCAN entry")
+    assert list(slowlog._plans) == [
+        "SELECT * FROM entry WHERE id IN (2)",
+        "SELECT * FROM entry WHERE id IN (1)",
+    ]
+
+
+def test_after_cursor_execute_without_start(monkeypatch):
+    monkeypatch.setattr(slowlog, "SLOW_QUERY_MS", 0)
+    conn = SimpleNamespace(info={})
+    slowlog._after_cursor_execute(conn, None, "SELECT 1", (), None, False)
+    assert slowlog.recent() == []
@@ -0,0 +1,21 @@
+"""The import-time budget of the app, see `benchmarks.startup`."""
+
+import pytest
+
+from benchmarks import startup
+
+
+@pytest.fixture(scope="module")
+def profile():
+    return startup.profile_imports(startup.APP_MODULE)
+
+
+def test_optional_subsystems_are_imported_lazily(profile):
+    _, importers = profile
+    assert startup.eager_imports(importers) == []
+
+
+def test_startup_within_budget(profile):
+    timings, _ = profile
+    seconds = timings[startup.APP_MODULE][1] / 1e6
+    assert seconds <= startup.BUDGET_SECONDS